@@ -0,0 +1,271 @@
+"""
+CheckMoYan partner API: headless JSON over the same services and db.queries the Streamlit UI uses.
+
+A plain ASGI app (no web framework), so there is no websocket session or script rerun per call.
+Run it with any ASGI server:
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+Every endpoint except /healthz needs the API key of an active Pro user
+(python -m services.api_keys issue <email>), as `Authorization: Bearer <key>` or `X-API-Key: <key>`.
+
+    POST /v1/analyze        {"message": "...", "channel": "", "language": ""}  -> verdict JSON
+    POST /v1/analyze/bulk   {"messages": ["...", {"message": "...", ...}]}   -> NDJSON, one line per message as it finishes
+    GET  /v1/quota                                                          -> { plan, daily_limit, used_today, remaining }
+    GET  /v1/trending?limit=5                                               -> { categories: [{ category, count }] }
+
+OpenAI calls block, so analysis runs on a bounded thread pool and never stalls the event loop;
+it is queued on services.scheduler at the key owner's plan priority.
+Each analyzed message counts against the key owner's daily quota exactly like a check in the UI:
+reserved before the analysis is queued and given back if it is shed or fails.
+"""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from db.instrumentation import set_page
+from services.api_keys import authenticate
+
+API_WORKERS = int(os.environ.get("CHECKMOYAN_API_WORKERS", "8"))
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BULK_MESSAGES = 100
+
+logger = logging.getLogger("checkmoyan.api")
+
+_executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="api")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _openai_key() -> str:
+    """OPENAI_API_KEY from .streamlit/secrets.toml, else the environment."""
+    try:
+        import streamlit as st
+        key = st.secrets.get("OPENAI_API_KEY") or ""
+    except Exception:
+        key = ""
+    return (key or os.environ.get("OPENAI_API_KEY") or "").strip()
+
+
+def _check(email: str, item: dict, openai_key: str) -> dict:
+    """
+    Runs on the pool: reserve the check (usage.reserve_check), analyze, then record the scan
+    (no raw message). The check is given back if the analysis is shed or anything fails.
+    """
+    from services import scheduler
+    from services.usage import record_check, release_check, reserve_check
+
+    set_page("api")
+    reservation, reason = reserve_check(email)
+    if not reservation:
+        raise HTTPError(429, reason)
+    try:
+        result = scheduler.analyze(
+            item["message"],
+            channel=item.get("channel", ""),
+            language=item.get("language", ""),
+            api_key=openai_key,
+            priority=scheduler.priority_for(email),
+        )
+        record_check(
+            email=email,
+            verdict=result.get("verdict", "SUSPICIOUS"),
+            confidence=result.get("confidence", 0),
+            category=result.get("category", ""),
+            signals_json=json.dumps(result.get("reasons", [])[:3]),
+            msg_hash=result.get("msg_hash", ""),
+            metrics=result.pop("metrics", None),
+            red_flags=result.get("red_flags"),
+            reasons=result.get("reasons"),
+            count_usage=False,
+        )
+    except scheduler.Overloaded as e:
+        release_check(email, reservation)
+        raise HTTPError(503, str(e))
+    except Exception:
+        release_check(email, reservation)
+        raise
+    return result
+
+
+def _quota(email: str) -> dict:
+    from db.queries import get_user_plan
+    from services.usage import get_daily_limit, get_usage_today
+
+    set_page("api")
+    limit = get_daily_limit(email)
+    used = get_usage_today(email)
+    return {
+        "plan": get_user_plan(email).get("plan") or "free",
+        "daily_limit": limit,
+        "used_today": used,
+        "remaining": max(0, limit - used),
+    }
+
+
+def _trending(limit: int) -> dict:
+    from db.queries import get_trending_categories
+
+    set_page("api")
+    return {"categories": get_trending_categories(limit)}
+
+
+def _message_item(raw) -> dict:
+    """Accept "text" or {"message", "channel", "language"}; raise 400 on anything else."""
+    if isinstance(raw, str):
+        raw = {"message": raw}
+    if not isinstance(raw, dict) or not isinstance(raw.get("message"), str) or not raw["message"].strip():
+        raise HTTPError(400, "Each item needs a non-empty 'message' string.")
+    return {
+        "message": raw["message"].strip(),
+        "channel": str(raw.get("channel") or ""),
+        "language": str(raw.get("language") or ""),
+    }
+
+
+async def _run(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+async def _read_json(receive) -> dict:
+    body = b""
+    while True:
+        event = await receive()
+        body += event.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large.")
+        if not event.get("more_body"):
+            break
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "Body must be JSON.")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "Body must be a JSON object.")
+    return data
+
+
+async def _send_json(send, status: int, payload) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _stream_bulk(send, email: str, items: list, openai_key: str) -> None:
+    """
+    Send one NDJSON line per message as soon as it finishes (completion order, tagged by index).
+    Messages beyond the remaining daily quota are answered with a 429 line without analysis.
+    """
+    remaining = (await _run(_quota, email))["remaining"]
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/x-ndjson")],
+    })
+
+    async def one(index, item):
+        if index >= remaining:
+            return {"index": index, "error": "Daily check limit reached.", "status": 429}
+        try:
+            return {"index": index, "result": await _run(_check, email, item, openai_key)}
+        except HTTPError as e:
+            return {"index": index, "error": e.message, "status": e.status}
+        except Exception:
+            logger.exception("bulk analysis failed (message %d)", index)
+            return {"index": index, "error": "Internal error", "status": 500}
+
+    for done in asyncio.as_completed([one(i, item) for i, item in enumerate(items)]):
+        line = json.dumps(await done) + "\n"
+        await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _api_key_from(scope) -> str:
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    auth = headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        return auth[7:].strip()
+    return headers.get("x-api-key", "").strip()
+
+
+async def _handle(scope, receive, send) -> None:
+    method, path = scope["method"], scope["path"].rstrip("/") or "/"
+    if path == "/healthz":
+        await _send_json(send, 200, {"ok": True})
+        return
+
+    email = await _run(authenticate, _api_key_from(scope))
+    if not email:
+        raise HTTPError(401, "Missing or invalid API key (Pro plan required).")
+
+    if path == "/v1/quota" and method == "GET":
+        await _send_json(send, 200, await _run(_quota, email))
+    elif path == "/v1/trending" and method == "GET":
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        try:
+            limit = min(50, max(1, int(query.get("limit", ["5"])[0])))
+        except ValueError:
+            raise HTTPError(400, "limit must be an integer.")
+        await _send_json(send, 200, await _run(_trending, limit))
+    elif path == "/v1/analyze" and method == "POST":
+        item = _message_item(await _read_json(receive))
+        openai_key = _openai_key()
+        if not openai_key:
+            raise HTTPError(503, "Analysis is not configured on this server.")
+        await _send_json(send, 200, await _run(_check, email, item, openai_key))
+    elif path == "/v1/analyze/bulk" and method == "POST":
+        raw = (await _read_json(receive)).get("messages")
+        if not isinstance(raw, list) or not raw:
+            raise HTTPError(400, "'messages' must be a non-empty list.")
+        if len(raw) > MAX_BULK_MESSAGES:
+            raise HTTPError(400, f"At most {MAX_BULK_MESSAGES} messages per request.")
+        items = [_message_item(m) for m in raw]
+        openai_key = _openai_key()
+        if not openai_key:
+            raise HTTPError(503, "Analysis is not configured on this server.")
+        await _stream_bulk(send, email, items, openai_key)
+    elif path in ("/v1/quota", "/v1/trending", "/v1/analyze", "/v1/analyze/bulk"):
+        raise HTTPError(405, "Method not allowed.")
+    else:
+        raise HTTPError(404, "Not found.")
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        event = await receive()
+        if event["type"] == "lifespan.startup":
+            from db.schema import init_db
+            await _run(init_db)
+            await send({"type": "lifespan.startup.complete"})
+        elif event["type"] == "lifespan.shutdown":
+            _executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point."""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    try:
+        await _handle(scope, receive, send)
+    except HTTPError as e:
+        await _send_json(send, e.status, {"error": e.message})
+    except Exception:
+        logger.exception("%s %s failed", scope.get("method"), scope.get("path"))
+        await _send_json(send, 500, {"error": "Internal error"})
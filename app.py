@@ -2,8 +2,10 @@
 CheckMoYan — Is this a scam? Paste it. We'll explain it.
 Main entry: session_state-based routing, no sidebar. Top nav only.
 """
+import os
 import streamlit as st
 from db.schema import init_db
+from db.instrumentation import set_page as set_query_page
 from services.auth import get_email_from_session, is_admin_logged_in
 from components.nav import (
     get_current_page,
@@ -20,6 +22,19 @@ from components.nav import (
 # Initialize DB on startup
 init_db()
 
+# Landing stats/trending are served from a snapshot file; keep it fresh from a background thread
+# (once per process). Set CHECKMOYAN_SNAPSHOT_REFRESHER=0 when a separate worker runs
+# python -m services.public_stats instead.
+if os.environ.get("CHECKMOYAN_SNAPSHOT_REFRESHER", "1") != "0":
+    from services.public_stats import start_refresher
+    start_refresher()
+
+# Community alerts from new scans (incremental; safe to run on every replica).
+# Set CHECKMOYAN_ALERTS_JOB=0 when python -m services.community_alerts runs as a separate worker.
+if os.environ.get("CHECKMOYAN_ALERTS_JOB", "1") != "0":
+    from services.community_alerts import start_worker
+    start_worker()
+
 st.set_page_config(
     page_title="CheckMoYan — Scam Checker",
     page_icon="🛡️",
@@ -48,6 +63,7 @@ st.markdown("---")
 
 # Route to page content
 page = get_current_page()
+set_query_page(page)  # tag db.queries timings with the page that issued them
 
 if page == PAGE_HOME:
     from pages.landing import run
@@ -1,32 +1,37 @@
 """Landing page sections: scam-checker theme, hero, stats, sample demos, how-it-works, trending, trust."""
 import streamlit as st
-from db.queries import get_stats_today, get_trending_categories
+from services.public_stats import read_snapshot
 from components.nav import set_page, PAGE_SCAM_CHECKER, PAGE_PRICING, PAGE_COMMUNITY
 from components.theme import ALERT_RED, ALERT_AMBER, SAFE_GREEN, ACCENT_CYAN, BG_CARD, BORDER_ACCENT, BORDER_TECH, RADIUS, TEXT_MUTED, TEXT_PRIMARY
 
 # Realistic PH scam sample messages (clickable "Try this message" demos)
 SAMPLE_SCAM_MESSAGES = [
     {
+        "id": "gcash-phishing",
         "label": "GCash / e-wallet phishing",
         "icon": "📱",
         "text": "GCash: Your account will be suspended in 24hrs. Verify now: bit.ly/gcash-verify-now to avoid lockout. Do not share this code with anyone. OTP: 123456",
     },
     {
+        "id": "fake-job",
         "label": "Fake job offer",
         "icon": "💼",
         "text": "Hi! We're hiring for Work From Home Data Encoder. Earn 25k-40k/week. No experience needed. Pay 500 pesos registration fee to get started. Reply YES to receive link.",
     },
     {
+        "id": "loan",
         "label": "Loan scam",
         "icon": "💰",
         "text": "CONGRATULATIONS! You are approved for 50,000 pesos loan. No collateral. Send 1,500 processing fee to GCash 09XX XXX XXXX to release funds today. Limited slots!",
     },
     {
+        "id": "romance-investment",
         "label": "Romance / investment scam",
         "icon": "❤️",
         "text": "I'm Mark from UK, we met on FB. I have a crypto trading platform that doubles money in 2 weeks. I already made 2M. Join me, minimum 10k pesos. I will help you.",
     },
     {
+        "id": "sss-impersonation",
         "label": "SSS / gov't impersonation",
         "icon": "🏛️",
         "text": "SSS: You have unclaimed benefits worth 15,000 pesos. Claim before Dec 31. Click here to verify your membership: sss-claim.ph. Enter your SSS number and OTP sent to your phone.",
@@ -112,14 +117,12 @@ def sample_scams_section():
 
 
 def live_stats_section():
-    """Live stats cards from SQLite: checks today, scams detected, top category."""
-    try:
-        stats = get_stats_today()
-        analyzed = stats.get("messages_analyzed", 0)
-        scams = stats.get("scams_detected", 0)
-        top = stats.get("top_category", "GCash phishing")
-    except Exception:
-        analyzed, scams, top = 0, 0, "GCash phishing"
+    """Live stats cards from the public stats snapshot (no DB access): checks today, scams detected, top category."""
+    snapshot = read_snapshot() or {}
+    stats = snapshot.get("stats") or {}
+    analyzed = stats.get("messages_analyzed", 0)
+    scams = stats.get("scams_detected", 0)
+    top = stats.get("top_category", "GCash phishing")
 
     st.markdown(
         f"""
@@ -188,10 +191,11 @@ def three_step_section():
 
 
 def trending_section():
-    """Trending scams this week (cards)."""
-    try:
-        rows = get_trending_categories(5)
-    except Exception:
+    """Rising right now and trending scams this week (cards), from the public stats snapshot (no DB access)."""
+    snapshot = read_snapshot() or {}
+    rising = snapshot.get("rising") or []
+    rows = (snapshot.get("trending") or [])[:5]
+    if not rows:
         rows = [
             {"category": "GCash phishing", "count": 12},
             {"category": "Fake job offer", "count": 8},
@@ -210,11 +214,19 @@ def trending_section():
         """
         for r in rows
     )
+    rising_block = ""
+    if rising:
+        rising_block = (
+            f'<p style="color: {TEXT_MUTED}; margin: 0 0 0.5rem 0;">🔺 Rising right now: '
+            + ", ".join(f'<b style="color: {ALERT_RED};">{r["key"]}</b>' for r in rising)
+            + "</p>"
+        )
     st.markdown(
         f"""
         <div style="margin: 1.5rem 0;">
             <h3 style="color: {TEXT_PRIMARY}; margin-bottom: 0.75rem;">📢 Trending scams this week</h3>
             <div style="max-width: 400px; margin: 0 auto;">
+                {rising_block}
                 {items}
             </div>
         </div>
@@ -4,7 +4,6 @@ from .queries import (
     ensure_user,
     get_user_plan,
     set_user_plan,
-    record_usage,
     get_usage_today,
     insert_scan,
     get_stats_today,
@@ -13,6 +12,12 @@ from .queries import (
     list_upgrade_requests,
     update_upgrade_request,
     get_upgrade_request,
+    get_counters,
+    get_daily_scan_counts,
+    reconcile_counters,
+    iter_scans,
+    iter_usage,
+    list_community_alerts,
 )
 
 __all__ = [
@@ -21,7 +26,6 @@ __all__ = [
     "ensure_user",
     "get_user_plan",
     "set_user_plan",
-    "record_usage",
     "get_usage_today",
     "insert_scan",
     "get_stats_today",
@@ -30,4 +34,10 @@ __all__ = [
     "list_upgrade_requests",
     "update_upgrade_request",
     "get_upgrade_request",
+    "get_counters",
+    "get_daily_scan_counts",
+    "reconcile_counters",
+    "iter_scans",
+    "iter_usage",
+    "list_community_alerts",
 ]
@@ -60,18 +60,42 @@ def init_db():
             status TEXT NOT NULL DEFAULT 'pending',
             ts TEXT NOT NULL DEFAULT (datetime('now')),
             admin_notes TEXT,
-            approved_until TEXT
+            approved_until TEXT,
+            receipt_sha256 TEXT
         )
     """)
+    cur.execute("PRAGMA table_info(upgrade_requests)")
+    if "receipt_sha256" not in {r[1] for r in cur.fetchall()}:
+        cur.execute("ALTER TABLE upgrade_requests ADD COLUMN receipt_sha256 TEXT")
+    # Duplicate-receipt lookup (services.receipts hashes every upload)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_upgrade_requests_receipt ON upgrade_requests(receipt_sha256)")
+    # Admin queue pages through one status at a time, newest first
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_upgrade_requests_status_ts ON upgrade_requests(status, ts)")
 
     cur.execute("""
         CREATE TABLE IF NOT EXISTS community_alerts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             category TEXT NOT NULL,
             summary TEXT,
-            ts TEXT NOT NULL DEFAULT (datetime('now'))
+            ts TEXT NOT NULL DEFAULT (datetime('now')),
+            scan_count INTEGER NOT NULL DEFAULT 0,
+            baseline REAL,
+            window_start TEXT,
+            window_end TEXT
         )
     """)
+    cur.execute("PRAGMA table_info(community_alerts)")
+    alert_cols = {r[1] for r in cur.fetchall()}
+    for col, decl in (
+        ("scan_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("baseline", "REAL"),
+        ("window_start", "TEXT"),
+        ("window_end", "TEXT"),
+    ):
+        if col not in alert_cols:
+            cur.execute(f"ALTER TABLE community_alerts ADD COLUMN {col} {decl}")
+    # Community page lists the newest alerts (services.community_alerts refreshes ts on update)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_community_alerts_ts ON community_alerts(ts)")
 
     cur.execute("""
         CREATE TABLE IF NOT EXISTS app_settings (
@@ -80,10 +104,91 @@ def init_db():
         )
     """)
 
+    # Partner API keys (api.py): only the SHA-256 of each key is stored
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS api_keys (
+            key_hash TEXT PRIMARY KEY,
+            email TEXT NOT NULL,
+            label TEXT,
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            revoked_at TEXT
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_api_keys_email ON api_keys(email)")
+
+    # One row per OpenAI analysis (services.telemetry): tokens, latency, retries, source
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts TEXT NOT NULL DEFAULT (datetime('now')),
+            scan_id INTEGER,
+            model TEXT,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            completion_tokens INTEGER NOT NULL DEFAULT 0,
+            cached_tokens INTEGER NOT NULL DEFAULT 0,
+            latency_ms REAL NOT NULL DEFAULT 0,
+            retries INTEGER NOT NULL DEFAULT 0,
+            source TEXT NOT NULL DEFAULT 'llm'
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_analysis_metrics_ts ON analysis_metrics(ts)")
+
+    # Maintained counters and per-day rollups (Admin → Stats reads these, never COUNT(*) over scans/users)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS scan_daily (
+            date TEXT NOT NULL,
+            verdict TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, verdict)
+        )
+    """)
+
+    # Scans per hour and category, fed incrementally from new scans by services.community_alerts
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS category_hourly (
+            hour TEXT NOT NULL,
+            category TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, category)
+        )
+    """)
+
+    # Interned red flags and reasons, linked to scans (analytics group by signal_id, never parse signals_json)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS signals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            text TEXT NOT NULL,
+            UNIQUE (kind, key)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS scan_signals (
+            scan_id INTEGER NOT NULL,
+            signal_id INTEGER NOT NULL,
+            PRIMARY KEY (scan_id, signal_id)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_scan_signals_signal ON scan_signals(signal_id, scan_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_scans_ts ON scans(ts)")
+
     conn.commit()
     _seed_dummy_data(conn, cur)
     conn.commit()
+    cur.execute("SELECT COUNT(*) FROM counters")
+    backfill = cur.fetchone()[0] == 0
     conn.close()
+    if backfill:
+        from .queries_sqlite import reconcile_counters
+        reconcile_counters()
 
 
 def _seed_dummy_data(conn, cur):
@@ -0,0 +1,103 @@
+"""In-process TTL cache for db.queries read functions, with tag-based invalidation.
+
+    @cached(ttl=60, tags=("scans",))
+    def get_trending_categories(limit: int = 5) -> list: ...
+
+    invalidate("scans")   # from the matching write, e.g. insert_scan
+
+Works anywhere (Streamlit, CLI, workers): plain dicts and a lock, no st.cache_data. Each
+function keeps at most `maxsize` entries (least recently used evicted first). Invalidation is
+per process; writes made by another replica or process (a CLI, a worker) become visible here only
+when the TTL expires, so reads that grant access (get_api_key_owner) keep a TTL of seconds.
+Results are deep-copied on the way out so callers can't mutate a cached value.
+"""
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+_lock = threading.Lock()
+_caches = {}  # function name -> OrderedDict(key -> (expires_at, tags, value))
+_stats = {}  # function name -> {"hits", "misses", "evictions", "invalidations"}
+_generations = {}  # tag -> bumped on every invalidate, so a read racing a write isn't cached stale
+
+
+def cached(ttl: float, tags=(), maxsize: int = 256):
+    """
+    Cache a read function's result for ttl seconds.
+    tags: tuple of tag strings, or a callable(*args, **kwargs) returning them (e.g. per-key tags).
+    """
+    def decorator(fn):
+        name = fn.__name__
+        entries = _caches.setdefault(name, OrderedDict())
+        counters = _stats.setdefault(name, {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0})
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            entry_tags = frozenset(tags(*args, **kwargs) if callable(tags) else tags)
+            now = time.monotonic()
+            with _lock:
+                entry = entries.get(key)
+                if entry is not None and entry[0] > now:
+                    entries.move_to_end(key)
+                    counters["hits"] += 1
+                    return copy.deepcopy(entry[2])
+                counters["misses"] += 1
+                seen = {t: _generations.get(t, 0) for t in entry_tags}
+            value = fn(*args, **kwargs)
+            with _lock:
+                if any(_generations.get(t, 0) != g for t, g in seen.items()):
+                    return value  # invalidated while we were reading: don't cache
+                entries[key] = (time.monotonic() + ttl, entry_tags, value)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+                    counters["evictions"] += 1
+            return copy.deepcopy(value)
+
+        wrapper.cache_clear = lambda: clear(name)
+        return wrapper
+
+    return decorator
+
+
+def invalidate(*tags) -> int:
+    """Drop every cached entry carrying any of the tags. Returns how many were dropped."""
+    wanted = set(tags)
+    dropped = 0
+    with _lock:
+        for t in wanted:
+            _generations[t] = _generations.get(t, 0) + 1
+        for name, entries in _caches.items():
+            stale = [k for k, (_, entry_tags, _) in entries.items() if entry_tags & wanted]
+            for k in stale:
+                del entries[k]
+            if stale:
+                _stats[name]["invalidations"] += len(stale)
+                dropped += len(stale)
+    return dropped
+
+
+def clear(name: str = None) -> None:
+    """Empty one function's cache, or all of them."""
+    with _lock:
+        for n, entries in _caches.items():
+            if name is None or n == name:
+                entries.clear()
+
+
+def stats() -> list:
+    """Return per-function { function, hits, misses, hit_rate, size, evictions, invalidations }."""
+    with _lock:
+        out = []
+        for name, counters in _stats.items():
+            total = counters["hits"] + counters["misses"]
+            out.append({
+                "function": name,
+                **counters,
+                "hit_rate": round(counters["hits"] / total, 3) if total else 0.0,
+                "size": len(_caches[name]),
+            })
+    return sorted(out, key=lambda r: r["function"])
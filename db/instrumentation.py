@@ -0,0 +1,224 @@
+"""Per-query timing for the db.queries facade: latency histograms, row counts, errors, slow-query log.
+
+Every call that reaches a backend module (SQLite, Snowflake, DuckDB) is timed and recorded under
+(function, backend, page), including calls that raise (counted under errors). Calls answered from
+a cache in the facade never reach a backend, so they are not counted. Stats are per process;
+Admin → Performance shows them.
+
+Backend-call budgets in tests (one backend call may run several statements in one connection):
+
+    with count_backend_calls() as calls:
+        record_check(...)
+    assert calls.total <= 2, calls.by_function
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger("checkmoyan.db")
+
+# Histogram bucket upper bounds in milliseconds (last bucket is open-ended)
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+DEFAULT_SLOW_QUERY_MS = float(os.environ.get("CHECKMOYAN_SLOW_QUERY_MS", "250"))
+SLOW_LOG_SIZE = 200
+
+_lock = threading.Lock()
+_stats = {}  # (function, backend, page) -> dict
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+_thresholds = {}  # function -> ms; falls back to DEFAULT_SLOW_QUERY_MS
+_default_threshold = [DEFAULT_SLOW_QUERY_MS]
+_call_counters = []
+_page = contextvars.ContextVar("checkmoyan_page", default="")
+
+
+class BackendCalls:
+    """Counts backend calls made while active (see count_backend_calls)."""
+
+    def __init__(self):
+        self.total = 0
+        self.by_function = {}
+
+    def _add(self, function: str) -> None:
+        self.total += 1
+        self.by_function[function] = self.by_function.get(function, 0) + 1
+
+
+@contextmanager
+def count_backend_calls():
+    """Count backend function calls (from any thread) inside the block; not SQL statements."""
+    counter = BackendCalls()
+    with _lock:
+        _call_counters.append(counter)
+    try:
+        yield counter
+    finally:
+        with _lock:
+            _call_counters.remove(counter)
+
+
+def set_page(page: str) -> None:
+    """Tag subsequent queries in this context with the page that issued them."""
+    _page.set(page or "")
+
+
+def get_slow_threshold_ms(function: str = None) -> float:
+    return _thresholds.get(function, _default_threshold[0])
+
+
+def set_slow_threshold_ms(ms: float, function: str = None) -> None:
+    """Set the slow-query threshold for one function, or the default for all."""
+    if function:
+        _thresholds[function] = float(ms)
+    else:
+        _default_threshold[0] = float(ms)
+
+
+def _row_count(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple, set)):
+        return len(result)
+    return 1
+
+
+def record(function: str, backend: str, seconds: float, rows: int, error: str = None) -> None:
+    """Record one backend call; error is the exception type name if it raised."""
+    ms = seconds * 1000.0
+    page = _page.get() or "-"
+    key = (function, backend, page)
+    with _lock:
+        s = _stats.get(key)
+        if s is None:
+            s = _stats[key] = {"calls": 0, "errors": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * len(BUCKETS_MS)}
+        s["calls"] += 1
+        s["errors"] += error is not None
+        s["rows"] += rows
+        s["total_ms"] += ms
+        s["max_ms"] = max(s["max_ms"], ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                s["buckets"][i] += 1
+                break
+        for counter in _call_counters:
+            counter._add(function)
+        slow = ms >= get_slow_threshold_ms(function)
+        if slow:
+            _slow_log.append({
+                "ts": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                "function": function,
+                "backend": backend,
+                "page": page,
+                "ms": round(ms, 1),
+                "rows": rows,
+                "error": error or "",
+            })
+    if slow:
+        logger.warning("slow query %s on %s (%s): %.1f ms, %d rows%s", function, backend, page, ms, rows, f", {error}" if error else "")
+
+
+def _timed_iter(gen, function: str, backend: str):
+    """Time a generator result across its whole iteration; record once it is exhausted or closed."""
+    elapsed, rows, error = 0.0, 0, None
+    try:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                chunk = next(gen)
+            except StopIteration:
+                return
+            except BaseException as e:
+                error = type(e).__name__
+                raise
+            finally:
+                elapsed += time.perf_counter() - t0
+            rows += _row_count(chunk)
+            yield chunk
+    finally:
+        gen.close()
+        record(function, backend, elapsed, rows, error)
+
+
+class InstrumentedBackend:
+    """Proxy over a backend module: every function called through it is timed and recorded."""
+
+    def __init__(self, module):
+        self._module = module
+        self._name = module.__name__.rsplit(".", 1)[-1].replace("queries_", "")
+
+    def __getattr__(self, function):
+        fn = getattr(self._module, function)
+        if not callable(fn):
+            return fn
+        backend = self._name
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                record(function, backend, time.perf_counter() - t0, 0, type(e).__name__)
+                raise
+            if hasattr(result, "__next__") and hasattr(result, "close"):
+                return _timed_iter(result, function, backend)
+            record(function, backend, time.perf_counter() - t0, _row_count(result))
+            return result
+
+        return timed
+
+
+def _percentile(buckets: list, calls: int, q: float) -> float:
+    """Upper bound (ms) of the histogram bucket holding the q-quantile."""
+    if not calls:
+        return 0.0
+    target, seen = q * calls, 0
+    for bound, n in zip(BUCKETS_MS, buckets):
+        seen += n
+        if seen >= target:
+            return bound
+    return BUCKETS_MS[-1]
+
+
+def _bucket_labels() -> list:
+    return [f"<={b:g}ms" if b != float("inf") else f">{BUCKETS_MS[-2]:g}ms" for b in BUCKETS_MS]
+
+
+def snapshot() -> list:
+    """Return per (function, backend, page) stats, slowest total time first."""
+    with _lock:
+        items = [(k, dict(v, buckets=list(v["buckets"]))) for k, v in _stats.items()]
+    out = []
+    for (function, backend, page), s in items:
+        out.append({
+            "function": function,
+            "backend": backend,
+            "page": page,
+            "calls": s["calls"],
+            "errors": s["errors"],
+            "rows": s["rows"],
+            "avg_ms": round(s["total_ms"] / s["calls"], 2) if s["calls"] else 0.0,
+            "p50_ms": _percentile(s["buckets"], s["calls"], 0.50),
+            "p95_ms": _percentile(s["buckets"], s["calls"], 0.95),
+            "max_ms": round(s["max_ms"], 2),
+            "total_ms": round(s["total_ms"], 2),
+            "histogram": dict(zip(_bucket_labels(), s["buckets"])),
+        })
+    out.sort(key=lambda r: r["total_ms"], reverse=True)
+    return out
+
+
+def slow_queries() -> list:
+    """Most recent slow queries first."""
+    with _lock:
+        return list(reversed(_slow_log))
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+        _slow_log.clear()
@@ -1,36 +1,115 @@
 """CRUD for CheckMoYan. Uses Snowflake if [SNOWFLAKE] in secrets.toml, else SQLite."""
 import json
+import threading
+import time
+from collections import OrderedDict
 from . import schema
+from .cache import cached, invalidate
+from .instrumentation import InstrumentedBackend
+
+# Per-process plan cache: email -> (expires_at, plan dict or None), least recently used
+# evicted past PLAN_CACHE_SIZE. An entry means the users row exists, so ensure_user can skip
+# its write entirely; the plan itself is reused for PLAN_CACHE_TTL_SECONDS (plan changes made
+# on another replica show up here after at most that long).
+PLAN_CACHE_TTL_SECONDS = 60
+PLAN_CACHE_SIZE = 10000
+_plan_cache = OrderedDict()
+_plan_lock = threading.Lock()
+
+
+def _plan_get(key: str):
+    """The cache entry for key (marked recently used), or None."""
+    with _plan_lock:
+        entry = _plan_cache.get(key)
+        if entry is not None:
+            _plan_cache.move_to_end(key)
+        return entry
+
+
+def _plan_put(key: str, entry: tuple, only_if_known: bool = False) -> None:
+    with _plan_lock:
+        if only_if_known and key not in _plan_cache:
+            return
+        _plan_cache[key] = entry
+        _plan_cache.move_to_end(key)
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)  # evicted users just get ensure_user's idempotent write again
+
+
+_instrumented = {}
+
+
+def _instrument(module):
+    """Wrap a backend module so every call is timed (db.instrumentation)."""
+    proxy = _instrumented.get(module.__name__)
+    if proxy is None:
+        proxy = _instrumented[module.__name__] = InstrumentedBackend(module)
+    return proxy
 
 
 def _backend():
     if schema._use_snowflake():
         from . import queries_snowflake
-        return queries_snowflake
+        return _instrument(queries_snowflake)
     from . import queries_sqlite
-    return queries_sqlite
+    return _instrument(queries_sqlite)
+
+
+_duckdb_ok = None  # DuckDB side-car probed once per process: None = not yet, then True/False
+
+
+def _analytics_backend():
+    """Backend for heavy read-only queries: DuckDB side-car over the SQLite file if configured, else _backend()."""
+    global _duckdb_ok
+    if _duckdb_ok is not False and schema._use_duckdb():
+        from . import queries_duckdb
+        if _duckdb_ok is None:
+            try:
+                queries_duckdb.get_conn().close()
+                _duckdb_ok = True
+            except Exception:
+                _duckdb_ok = False  # duckdb missing or sqlite extension unavailable: stay on SQLite
+                return _backend()
+        return _instrument(queries_duckdb)
+    return _backend()
 
 
 def ensure_user(email: str) -> None:
-    return _backend().ensure_user(email)
+    key = email.strip().lower()
+    if _plan_get(key) is not None:
+        return
+    _backend().ensure_user(email)
+    if _plan_get(key) is None:
+        _plan_put(key, (0, None))
+    invalidate("users")
 
 
 def get_user_plan(email: str) -> dict:
-    return _backend().get_user_plan(email)
+    key = email.strip().lower()
+    expires_at, plan = _plan_get(key) or (0, None)
+    if plan is not None and expires_at > time.monotonic():
+        return dict(plan)
+    plan = _backend().get_user_plan(email)
+    _plan_put(key, (time.monotonic() + PLAN_CACHE_TTL_SECONDS, dict(plan)), only_if_known=True)
+    return plan
 
 
 def set_user_plan(email: str, plan: str, premium_until: str = None) -> None:
-    return _backend().set_user_plan(email, plan, premium_until)
-
-
-def record_usage(email: str) -> None:
-    return _backend().record_usage(email)
+    _backend().set_user_plan(email, plan, premium_until)
+    _plan_put(email.strip().lower(), (0, None), only_if_known=True)
 
 
 def get_usage_today(email: str) -> int:
     return _backend().get_usage_today(email)
 
 
+def add_usage(deltas: list) -> None:
+    """Batched usage increments [(email, date YYYY-MM-DD, count)]; ensures each user first."""
+    for email in {email for email, _, _ in deltas}:
+        ensure_user(email)
+    _backend().add_usage(deltas)
+
+
 def insert_scan(
     email: str,
     verdict: str,
@@ -38,16 +117,31 @@ def insert_scan(
     category: str,
     signals_json: str,
     msg_hash: str,
+    signals: list = None,
 ) -> int:
-    return _backend().insert_scan(email, verdict, confidence, category, signals_json, msg_hash)
+    """
+    Insert a scan; signals are [(kind, key, text)] to intern and link (services.signals.signal_entries).
+    Returns the new id, or None under Snowflake bulk ingest, where the row is only spooled and gets
+    its id at COPY INTO. Rows that point at the scan (insert_analysis_metrics) then store scan_id NULL.
+    """
+    sid = _backend().insert_scan(email, verdict, confidence, category, signals_json, msg_hash, signals)
+    invalidate("scans")
+    return sid
 
 
+@cached(ttl=30, tags=("scans",))
 def get_stats_today() -> dict:
-    return _backend().get_stats_today()
+    return _analytics_backend().get_stats_today()
 
 
+@cached(ttl=60, tags=("scans",))
 def get_trending_categories(limit: int = 5) -> list:
-    return _backend().get_trending_categories(limit)
+    return _analytics_backend().get_trending_categories(limit)
+
+
+@cached(ttl=60, tags=("scans",))
+def get_top_signals(kind: str = "red_flag", days: int = 7, limit: int = 10) -> list:
+    return _backend().get_top_signals(kind, days, limit)
 
 
 def insert_upgrade_request(
@@ -56,33 +150,184 @@ def insert_upgrade_request(
     method: str,
     ref: str = None,
     receipt_path: str = None,
+    receipt_sha256: str = None,
 ) -> int:
-    return _backend().insert_upgrade_request(email, plan, method, ref, receipt_path)
+    uid = _backend().insert_upgrade_request(email, plan, method, ref, receipt_path, receipt_sha256)
+    invalidate("upgrade_requests")
+    return uid
 
 
-def list_upgrade_requests(status: str = None) -> list:
-    return _backend().list_upgrade_requests(status)
+@cached(ttl=30, tags=("upgrade_requests",))
+def list_upgrade_requests(status: str = None, limit: int = None, offset: int = 0) -> list:
+    """Newest first. Pass limit/offset to fetch one page instead of every request."""
+    return _backend().list_upgrade_requests(status, limit, offset)
 
 
+@cached(ttl=30, tags=("upgrade_requests",))
 def get_upgrade_request(req_id: int) -> dict:
     return _backend().get_upgrade_request(req_id)
 
 
+def find_upgrade_request_by_receipt(receipt_sha256: str, email: str = None) -> dict:
+    """
+    Return the first upgrade request that used this receipt (by SHA-256), or None. With email,
+    only requests that should block email from submitting it: another email's, or its own
+    pending or approved one (re-submitting after a rejection is fine).
+    """
+    return _backend().find_upgrade_request_by_receipt(receipt_sha256, email)
+
+
 def update_upgrade_request(
     req_id: int,
     status: str,
     admin_notes: str = None,
     approved_until: str = None,
 ) -> None:
-    return _backend().update_upgrade_request(req_id, status, admin_notes, approved_until)
+    _backend().update_upgrade_request(req_id, status, admin_notes, approved_until)
+    invalidate("upgrade_requests")
+
+
+def decide_upgrade_requests(
+    req_ids: list,
+    status: str,
+    approved_until: str = None,
+    admin_notes: str = None,
+) -> list:
+    """
+    Approve or reject many pending requests in one transaction; approving also creates the
+    users and sets their plans. Requests no longer pending are skipped. Returns those changed.
+    """
+    decided = _backend().decide_upgrade_requests(list(req_ids), status, approved_until, admin_notes)
+    if status == "approved":
+        for r in decided:
+            _plan_put(r["email"].strip().lower(), (0, None))
+    invalidate("upgrade_requests", "users")
+    return decided
+
+
+@cached(ttl=30, tags=("scans", "users", "upgrade_requests"))
+def get_counters() -> dict:
+    return _backend().get_counters()
+
+
+@cached(ttl=60, tags=("scans",))
+def get_daily_scan_counts(days: int = 14) -> list:
+    return _analytics_backend().get_daily_scan_counts(days)
+
+
+def reconcile_counters() -> dict:
+    counters = _backend().reconcile_counters()
+    invalidate("scans", "users", "upgrade_requests")
+    return counters
+
+
+@cached(ttl=60, tags=("community_alerts",))
+def list_community_alerts(limit: int = 10) -> list:
+    return _backend().list_community_alerts(limit)
+
+
+def advance_category_hourly(watermark_key: str, before_ts: str, max_rows: int = 5000) -> dict:
+    """Fold new scans (after the watermark scan id) into category_hourly; see services.community_alerts."""
+    return _backend().advance_category_hourly(watermark_key, before_ts, max_rows)
+
+
+def get_category_hourly(since_hour: str) -> list:
+    return _backend().get_category_hourly(since_hour)
+
+
+def save_community_alert(
+    category: str,
+    summary: str,
+    scan_count: int,
+    baseline: float,
+    window_start: str,
+    window_end: str,
+) -> int:
+    aid = _backend().save_community_alert(category, summary, scan_count, baseline, window_start, window_end)
+    invalidate("community_alerts")
+    return aid
+
+
+def list_stored_categories() -> list:
+    return _backend().list_stored_categories()
+
+
+def rename_category(old: str, new: str) -> None:
+    """Relabel a category everywhere it is stored; see services.taxonomy."""
+    _backend().rename_category(old, new)
+    invalidate("scans", "community_alerts")
+
+
+def link_scan_signals(links: list, watermark_key: str, to_id: int) -> None:
+    """Link signals to existing scans and move the backfill watermark; see services.signals."""
+    _backend().link_scan_signals(links, watermark_key, to_id)
+    invalidate("scans", f"app_settings:{watermark_key}")
+
+
+def iter_scans(after_id: int = 0, chunk_size: int = 5000):
+    """Yield scans with id > after_id in chunks (keyset pagination; bounded memory)."""
+    return _analytics_backend().iter_scans(after_id, chunk_size)
+
+
+def iter_usage(after_date: str = "", chunk_size: int = 5000):
+    """Yield usage rows for complete days after after_date in chunks (bounded memory)."""
+    return _analytics_backend().iter_usage(after_date, chunk_size)
+
+
+def insert_analysis_metrics(
+    scan_id: int,
+    model: str,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached_tokens: int = 0,
+    latency_ms: float = 0.0,
+    retries: int = 0,
+    source: str = "llm",
+) -> None:
+    _backend().insert_analysis_metrics(
+        scan_id, model, prompt_tokens, completion_tokens, cached_tokens, latency_ms, retries, source
+    )
+    invalidate("analysis_metrics")
+
+
+@cached(ttl=300, tags=("analysis_metrics",))
+def get_analysis_metrics_daily(days: int = 14) -> list:
+    """[{ day, source, model, calls, *_tokens, retries, p50_ms, p95_ms, p99_ms }] for the last N days."""
+    return _backend().get_analysis_metrics_daily(days)
+
+
+def insert_api_key(email: str, key_hash: str, label: str = "") -> None:
+    _backend().insert_api_key(email, key_hash, label)
+    invalidate("api_keys")
+
+
+@cached(ttl=5, tags=("api_keys",))
+def get_api_key_owner(key_hash: str) -> str:
+    """
+    Email owning an unrevoked API key (by SHA-256), or None. Cached briefly, as every API request
+    asks: keys revoked from another process (the services.api_keys CLI) stop working within the TTL.
+    """
+    return _backend().get_api_key_owner(key_hash)
+
+
+def list_api_keys(email: str) -> list:
+    return _backend().list_api_keys(email)
+
+
+def revoke_api_keys(email: str) -> int:
+    n = _backend().revoke_api_keys(email)
+    invalidate("api_keys")
+    return n
 
 
+@cached(ttl=300, tags=lambda key: (f"app_settings:{key}",))
 def get_app_setting(key: str) -> str:
     return _backend().get_app_setting(key)
 
 
 def set_app_setting(key: str, value: str) -> None:
-    return _backend().set_app_setting(key, value)
+    _backend().set_app_setting(key, value)
+    invalidate(f"app_settings:{key}")
 
 
 PAYMENT_CONFIG_KEY = "payment_config"
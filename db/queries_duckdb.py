@@ -0,0 +1,123 @@
+"""Read-only analytics for CheckMoYan on DuckDB, attached to the SQLite file (ANALYTICS_BACKEND = "duckdb").
+
+Writes stay on SQLite (queries_sqlite). DuckDB's sqlite extension scans the live SQLite file on
+every query, so results are never stale, but aggregates run vectorized over columns instead of
+row-by-row in SQLite. Only the heavy reads live here: stats, trending, per-day rollups, exports.
+"""
+import threading
+from datetime import datetime, timedelta
+from ._sqlite_schema import DB_PATH
+
+_conn = None
+_conn_lock = threading.Lock()
+
+
+def get_conn():
+    """Return a DuckDB cursor on a shared in-memory database with the SQLite file attached as `app`."""
+    global _conn
+    with _conn_lock:
+        if _conn is None:
+            import duckdb
+            conn = duckdb.connect(database=":memory:")
+            conn.execute("INSTALL sqlite")
+            conn.execute("LOAD sqlite")
+            path = str(DB_PATH).replace("'", "''")
+            conn.execute(f"ATTACH '{path}' AS app (TYPE sqlite, READ_ONLY)")
+            _conn = conn
+    return _conn.cursor()  # per-call cursor: DuckDB connections are not shared across threads
+
+
+def _day_bounds(day: str) -> tuple:
+    """Return [day 00:00:00, next day 00:00:00) as strings; scans.ts is 'YYYY-MM-DD HH:MM:SS' text."""
+    start = datetime.strptime(day, "%Y-%m-%d")
+    return start.strftime("%Y-%m-%d %H:%M:%S"), (start + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def get_stats_today() -> dict:
+    start, end = _day_bounds(datetime.utcnow().strftime("%Y-%m-%d"))
+    cur = get_conn()
+    try:
+        messages_analyzed, scams_detected = cur.execute(
+            """SELECT COUNT(*), COUNT(*) FILTER (WHERE verdict = 'SCAM')
+               FROM app.scans WHERE ts >= ? AND ts < ?""",
+            [start, end],
+        ).fetchone()
+        row = cur.execute(
+            """SELECT category, COUNT(*) AS c FROM app.scans
+               WHERE ts >= ? AND ts < ? AND category != ''
+               GROUP BY category ORDER BY c DESC LIMIT 1""",
+            [start, end],
+        ).fetchone()
+    finally:
+        cur.close()
+    return {
+        "messages_analyzed": int(messages_analyzed or 0),
+        "scams_detected": int(scams_detected or 0),
+        "top_category": row[0] if row else "GCash phishing",
+    }
+
+
+def get_trending_categories(limit: int = 5) -> list:
+    since = (datetime.utcnow() - timedelta(days=7)).strftime("%Y-%m-%d")
+    cur = get_conn()
+    try:
+        rows = cur.execute(
+            """SELECT category, COUNT(*) AS count FROM app.scans
+               WHERE ts >= ? AND category != ''
+               GROUP BY category ORDER BY count DESC LIMIT ?""",
+            [since, limit],
+        ).fetchall()
+    finally:
+        cur.close()
+    return [{"category": r[0], "count": int(r[1])} for r in rows]
+
+
+def get_daily_scan_counts(days: int = 14) -> list:
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    cur = get_conn()
+    try:
+        rows = cur.execute(
+            "SELECT date, verdict, count FROM app.scan_daily WHERE date >= ? ORDER BY date, verdict",
+            [since],
+        ).fetchall()
+    finally:
+        cur.close()
+    return [{"date": r[0], "verdict": r[1], "count": int(r[2])} for r in rows]
+
+
+def iter_scans(after_id: int = 0, chunk_size: int = 5000):
+    """Yield lists of scan dicts with id > after_id, streamed from one ordered scan."""
+    cols = ("id", "email", "ts", "verdict", "confidence", "category", "signals_json", "msg_hash")
+    cur = get_conn()
+    try:
+        cur.execute(
+            f"SELECT {', '.join(cols)} FROM app.scans WHERE id > ? ORDER BY id",
+            [after_id],
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield [dict(zip(cols, r)) for r in rows]
+    finally:
+        cur.close()
+
+
+def iter_usage(after_date: str = "", chunk_size: int = 5000):
+    """Yield lists of usage dicts for complete days after after_date, in (date, email) order."""
+    cols = ("email", "date", "checks_count")
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    cur = get_conn()
+    try:
+        cur.execute(
+            """SELECT email, date, checks_count FROM app.usage
+               WHERE date > ? AND date < ? ORDER BY date, email""",
+            [after_date or "", today],
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield [dict(zip(cols, r)) for r in rows]
+    finally:
+        cur.close()
@@ -1,6 +1,8 @@
 """CRUD for CheckMoYan when using Snowflake. Uses %s placeholders and Snowflake SQL."""
-from datetime import datetime
-from .snowflake_schema import get_conn
+from datetime import datetime, timedelta
+from .snowflake_schema import get_conn, bulk_ingest_enabled
+
+UPGRADE_STATUSES = ("pending", "approved", "rejected")
 
 
 def _row_to_dict(row):
@@ -27,17 +29,30 @@ def _val(row, *keys):
     return next(iter(row.values()), None) if row else None
 
 
+def _bump(cur, name: str, delta: int = 1) -> None:
+    """Add delta to a maintained counter (same transaction as the row change)."""
+    cur.execute(
+        """MERGE INTO counters c
+           USING (SELECT %s AS name, %s AS delta) s ON c.name = s.name
+           WHEN MATCHED THEN UPDATE SET value = c.value + s.delta
+           WHEN NOT MATCHED THEN INSERT (name, value) VALUES (s.name, s.delta)""",
+        (name, delta),
+    )
+
+
 def ensure_user(email: str) -> None:
-    """Create user if not exists (plan=free)."""
+    """Create user if not exists (plan=free). MERGE, since Snowflake does not enforce PRIMARY KEY."""
     conn = get_conn()
     cur = conn.cursor()
-    try:
-        cur.execute(
-            "INSERT INTO users (email, plan) VALUES (%s, 'free')",
-            (email.strip().lower(),),
-        )
-    except Exception:
-        pass  # already exists
+    cur.execute("BEGIN")
+    cur.execute(
+        """MERGE INTO users u
+           USING (SELECT %s AS email) s ON u.email = s.email
+           WHEN NOT MATCHED THEN INSERT (email, plan) VALUES (s.email, 'free')""",
+        (email.strip().lower(),),
+    )
+    if cur.rowcount and cur.rowcount > 0:
+        _bump(cur, "users")
     conn.commit()
     cur.close()
     conn.close()
@@ -74,37 +89,80 @@ def set_user_plan(email: str, plan: str, premium_until: str = None) -> None:
     conn.close()
 
 
-def record_usage(email: str) -> None:
-    """Increment today's check count for user."""
-    ensure_user(email)
+def get_usage_today(email: str) -> int:
+    """Return number of checks used today by user."""
     today = datetime.utcnow().strftime("%Y-%m-%d")
     conn = get_conn()
     cur = conn.cursor()
     cur.execute(
-        """MERGE INTO usage u
-           USING (SELECT %s AS email, %s AS dt) s ON u.email = s.email AND u.date = s.dt
-           WHEN MATCHED THEN UPDATE SET checks_count = u.checks_count + 1
-           WHEN NOT MATCHED THEN INSERT (email, date, checks_count) VALUES (s.email, s.dt, 1)""",
+        "SELECT checks_count FROM usage WHERE email = %s AND date = %s",
         (email.strip().lower(), today),
     )
-    conn.commit()
+    row = cur.fetchone()
     cur.close()
     conn.close()
+    return _val(row, "checks_count", "CHECKS_COUNT") or 0
 
 
-def get_usage_today(email: str) -> int:
-    """Return number of checks used today by user."""
-    today = datetime.utcnow().strftime("%Y-%m-%d")
+def add_usage(deltas: list) -> None:
+    """Add [(email, date, count)] to usage in one MERGE (flush of services.usage_counters)."""
+    merged = {}
+    for email, date, count in deltas:
+        key = (email.strip().lower(), date)
+        merged[key] = merged.get(key, 0) + count  # MERGE needs unique source rows
+    if not merged:
+        return
+    values = ", ".join(["(%s, %s, %s)"] * len(merged))
+    params = [v for (email, date), count in merged.items() for v in (email, date, count)]
     conn = get_conn()
     cur = conn.cursor()
     cur.execute(
-        "SELECT checks_count FROM usage WHERE email = %s AND date = %s",
-        (email.strip().lower(), today),
+        f"""MERGE INTO usage u
+            USING (SELECT column1 AS email, column2 AS dt, column3 AS n FROM VALUES {values}) s
+            ON u.email = s.email AND u.date = s.dt
+            WHEN MATCHED THEN UPDATE SET checks_count = u.checks_count + s.n
+            WHEN NOT MATCHED THEN INSERT (email, date, checks_count) VALUES (s.email, s.dt, s.n)""",
+        params,
     )
-    row = cur.fetchone()
+    conn.commit()
     cur.close()
     conn.close()
-    return _val(row, "checks_count", "CHECKS_COUNT") or 0
+
+
+def _link_signals(cur, links: list) -> None:
+    """
+    Intern [(scan_id, [(kind, key, text)])] into signals (one MERGE) and link them in scan_signals
+    (one MERGE). Snowflake does not enforce UNIQUE (kind, key), so concurrent MERGEs can intern a
+    signal twice; links always go to the lowest id, so a duplicate is never linked or counted.
+    """
+    entries = {}
+    for _, signals in links:
+        for kind, key, text in signals:
+            entries.setdefault((kind, key), text)
+    if not entries:
+        return
+    values = ", ".join(["(%s, %s, %s)"] * len(entries))
+    cur.execute(
+        f"""MERGE INTO signals s
+            USING (SELECT column1 AS kind, column2 AS key, column3 AS text FROM VALUES {values}) v
+            ON s.kind = v.kind AND s.key = v.key
+            WHEN NOT MATCHED THEN INSERT (id, kind, key, text) VALUES (signals_seq.NEXTVAL, v.kind, v.key, v.text)""",
+        [x for (kind, key), text in entries.items() for x in (kind, key, text)],
+    )
+    pairs = {(scan_id, kind, key) for scan_id, signals in links for kind, key, _ in signals}
+    values = ", ".join(["(%s, %s, %s)"] * len(pairs))
+    cur.execute(
+        f"""MERGE INTO scan_signals t
+            USING (
+                SELECT v.scan_id, s.id AS signal_id
+                FROM (SELECT column1 AS scan_id, column2 AS kind, column3 AS key FROM VALUES {values}) v
+                JOIN (SELECT kind, key, MIN(id) AS id FROM signals GROUP BY kind, key) s
+                  ON s.kind = v.kind AND s.key = v.key
+            ) x
+            ON t.scan_id = x.scan_id AND t.signal_id = x.signal_id
+            WHEN NOT MATCHED THEN INSERT (scan_id, signal_id) VALUES (x.scan_id, x.signal_id)""",
+        [x for pair in pairs for x in pair],
+    )
 
 
 def insert_scan(
@@ -114,18 +172,36 @@ def insert_scan(
     category: str,
     signals_json: str,
     msg_hash: str,
+    signals: list = None,
 ) -> int:
-    """Insert a scan record; return id."""
+    """
+    Insert a scan record and link its signals; return id. In bulk ingest mode the row and its
+    signals are spooled for COPY INTO (the loader links them) and id is None.
+    """
+    if bulk_ingest_enabled():
+        from .snowflake_ingest import spool_scan
+        spool_scan(email, verdict, confidence, category, signals_json, msg_hash, signals)
+        return None
     conn = get_conn()
     cur = conn.cursor()
     cur.execute("SELECT scans_seq.NEXTVAL AS n")
     sid = _val(cur.fetchone(), "n", "NEXTVAL")
     sid = int(sid) if sid is not None else None
+    cur.execute("BEGIN")
     cur.execute(
         """INSERT INTO scans (id, email, verdict, confidence, category, signals_json, msg_hash)
            VALUES (%s, %s, %s, %s, %s, %s, %s)""",
         (sid, email.strip().lower(), verdict, confidence, category or "", signals_json, msg_hash or ""),
     )
+    _link_signals(cur, [(sid, signals or [])])
+    _bump(cur, "scans")
+    cur.execute(
+        """MERGE INTO scan_daily d
+           USING (SELECT %s::DATE AS dt, %s AS verdict) s ON d.date = s.dt AND d.verdict = s.verdict
+           WHEN MATCHED THEN UPDATE SET count = d.count + 1
+           WHEN NOT MATCHED THEN INSERT (date, verdict, count) VALUES (s.dt, s.verdict, 1)""",
+        (datetime.utcnow().strftime("%Y-%m-%d"), verdict),
+    )
     conn.commit()
     cur.close()
     conn.close()
@@ -174,12 +250,30 @@ def get_trending_categories(limit: int = 5) -> list:
     return [{"category": _val(r, "category", "CATEGORY"), "count": _val(r, "count", "COUNT") or 0} for r in rows]
 
 
+def get_top_signals(kind: str = "red_flag", days: int = 7, limit: int = 10) -> list:
+    """[{ text, count }]: the signals of kind linked to the most scans in the last days (pruned on scan_signals' scan_id)."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT s.text, COUNT(*) AS count FROM scan_signals ss JOIN signals s ON s.id = ss.signal_id
+           WHERE ss.scan_id >= (SELECT MIN(id) FROM scans WHERE ts >= DATEADD(day, -%s, CURRENT_TIMESTAMP()))
+             AND s.kind = %s
+           GROUP BY s.id, s.text ORDER BY count DESC LIMIT %s""",
+        (days, kind, limit),
+    )
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return [{"text": _val(r, "text", "TEXT"), "count": _val(r, "count", "COUNT") or 0} for r in rows]
+
+
 def insert_upgrade_request(
     email: str,
     plan: str,
     method: str,
     ref: str = None,
     receipt_path: str = None,
+    receipt_sha256: str = None,
 ) -> int:
     """Insert upgrade request; return id."""
     conn = get_conn()
@@ -187,33 +281,34 @@ def insert_upgrade_request(
     cur.execute("SELECT upgrade_requests_seq.NEXTVAL AS n")
     uid = _val(cur.fetchone(), "n", "NEXTVAL")
     uid = int(uid) if uid is not None else None
+    cur.execute("BEGIN")
     cur.execute(
-        """INSERT INTO upgrade_requests (id, email, plan, method, ref, receipt_path, status)
-           VALUES (%s, %s, %s, %s, %s, %s, 'pending')""",
-        (uid, email.strip().lower(), plan, method, ref or "", receipt_path or ""),
+        """INSERT INTO upgrade_requests (id, email, plan, method, ref, receipt_path, receipt_sha256, status)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, 'pending')""",
+        (uid, email.strip().lower(), plan, method, ref or "", receipt_path or "", receipt_sha256 or None),
     )
+    _bump(cur, "upgrade_requests")
+    _bump(cur, "upgrade_requests.pending")
     conn.commit()
     cur.close()
     conn.close()
     return uid
 
 
-def list_upgrade_requests(status: str = None) -> list:
-    """List upgrade requests, optionally filter by status."""
+def list_upgrade_requests(status: str = None, limit: int = None, offset: int = 0) -> list:
+    """List upgrade requests newest first, optionally filter by status; limit/offset return one page."""
     conn = get_conn()
     cur = conn.cursor()
-    if status:
-        cur.execute(
-            "SELECT * FROM upgrade_requests WHERE status = %s ORDER BY ts DESC",
-            (status,),
-        )
-    else:
-        cur.execute("SELECT * FROM upgrade_requests ORDER BY ts DESC")
-    cols = [d[0] for d in cur.description]
+    where, params = ("WHERE status = %s", [status]) if status else ("", [])
+    page = ""
+    if limit is not None:
+        page = "LIMIT %s OFFSET %s"
+        params += [limit, offset]
+    cur.execute(f"SELECT * FROM upgrade_requests {where} ORDER BY ts DESC, id DESC {page}", params)
     rows = cur.fetchall()
     cur.close()
     conn.close()
-    return [dict(zip(cols, row)) for row in rows]
+    return [{k.lower(): v for k, v in r.items()} for r in rows]
 
 
 def get_upgrade_request(req_id: int) -> dict:
@@ -227,6 +322,22 @@ def get_upgrade_request(req_id: int) -> dict:
     return dict(row) if row else None
 
 
+def find_upgrade_request_by_receipt(receipt_sha256: str, email: str = None) -> dict:
+    """Return the first upgrade request that used this receipt hash (with email: that blocks email), or None."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT * FROM upgrade_requests
+           WHERE receipt_sha256 = %s AND (%s IS NULL OR email != %s OR status IN ('pending', 'approved'))
+           ORDER BY id LIMIT 1""",
+        (receipt_sha256, *(2 * [email.strip().lower() if email else None])),
+    )
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    return {k.lower(): v for k, v in row.items()} if row else None
+
+
 def update_upgrade_request(
     req_id: int,
     status: str,
@@ -236,16 +347,427 @@ def update_upgrade_request(
     """Update upgrade request status and optional notes/expiry."""
     conn = get_conn()
     cur = conn.cursor()
+    cur.execute("BEGIN")
+    cur.execute("SELECT status FROM upgrade_requests WHERE id = %s", (req_id,))
+    old_status = _val(cur.fetchone(), "status", "STATUS")
     cur.execute(
         """UPDATE upgrade_requests SET status = %s, admin_notes = %s, approved_until = %s
            WHERE id = %s""",
         (status, admin_notes or "", approved_until or "", req_id),
     )
+    if old_status and old_status != status:
+        _bump(cur, f"upgrade_requests.{old_status}", -1)
+        _bump(cur, f"upgrade_requests.{status}")
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def decide_upgrade_requests(
+    req_ids: list,
+    status: str,
+    approved_until: str = None,
+    admin_notes: str = None,
+) -> list:
+    """
+    Move the still-pending requests among req_ids to status in one transaction. Approving also
+    creates missing users and sets each user's plan. Returns [{ id, email, plan }] actually changed.
+    """
+    if not req_ids:
+        return []
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN")
+    cur.execute(
+        f"""SELECT id, email, plan FROM upgrade_requests
+            WHERE status = 'pending' AND id IN ({",".join(["%s"] * len(req_ids))}) ORDER BY id""",
+        list(req_ids),
+    )
+    decided = [{"id": _val(r, "id"), "email": _val(r, "email"), "plan": _val(r, "plan")} for r in cur.fetchall()]
+    if decided:
+        ids = [r["id"] for r in decided]
+        cur.execute(
+            f"""UPDATE upgrade_requests SET status = %s, admin_notes = %s, approved_until = %s
+                WHERE id IN ({",".join(["%s"] * len(ids))})""",
+            [status, admin_notes or "", approved_until or ""] + ids,
+        )
+        _bump(cur, "upgrade_requests.pending", -len(decided))
+        _bump(cur, f"upgrade_requests.{status}", len(decided))
+        if status == "approved":
+            # Latest request wins when one user has several in the batch; MERGE needs unique source rows
+            plans = {r["email"].strip().lower(): r["plan"] for r in decided}
+            values = ", ".join(["(%s, %s)"] * len(plans))
+            params = [v for item in plans.items() for v in item]
+            cur.execute(
+                f"""MERGE INTO users u
+                    USING (SELECT column1 AS email FROM VALUES {values}) s ON u.email = s.email
+                    WHEN NOT MATCHED THEN INSERT (email, plan) VALUES (s.email, 'free')""",
+                params,
+            )
+            if cur.rowcount and cur.rowcount > 0:
+                _bump(cur, "users", cur.rowcount)
+            cur.execute(
+                f"""UPDATE users u SET plan = s.plan, premium_until = %s
+                    FROM (SELECT column1 AS email, column2 AS plan FROM VALUES {values}) s
+                    WHERE u.email = s.email""",
+                [approved_until] + params,
+            )
+    conn.commit()
+    cur.close()
+    conn.close()
+    return decided
+
+
+def list_community_alerts(limit: int = 10) -> list:
+    """Return most recent community alerts as [{ category, summary, ts, scan_count, baseline, window_start, window_end }]."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT category, summary, ts, scan_count, baseline, window_start, window_end
+           FROM community_alerts ORDER BY ts DESC LIMIT %s""",
+        (limit,),
+    )
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return [
+        {
+            "category": _val(r, "category", "CATEGORY") or "",
+            "summary": _val(r, "summary", "SUMMARY") or "",
+            "ts": str(_val(r, "ts", "TS") or ""),
+            "scan_count": _val(r, "scan_count", "SCAN_COUNT") or 0,
+            "baseline": _val(r, "baseline", "BASELINE"),
+            "window_start": str(_val(r, "window_start", "WINDOW_START") or ""),
+            "window_end": str(_val(r, "window_end", "WINDOW_END") or ""),
+        }
+        for r in rows
+    ]
+
+
+def advance_category_hourly(watermark_key: str, before_ts: str, max_rows: int = 5000) -> dict:
+    """
+    Fold the scans after the watermark (app_settings[watermark_key], a scan id) into
+    category_hourly and move the watermark, in one transaction. At most max_rows scans, stopping
+    at the first with ts > before_ts. The watermark moves by compare-and-set, so when two workers
+    race, the loser rolls back instead of counting the same scans twice. Returns { from_id, to_id, scans }.
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN")
+    try:
+        cur.execute("SELECT value FROM app_settings WHERE key = %s", (watermark_key,))
+        row = cur.fetchone()
+        old = _val(row, "value", "VALUE") if row else None
+        from_id = int(old) if old else 0
+        cur.execute("SELECT id, ts FROM scans WHERE id > %s ORDER BY id LIMIT %s", (from_id, max_rows))
+        to_id, n = from_id, 0
+        for r in cur.fetchall():
+            if str(_val(r, "ts", "TS"))[:19] > before_ts:
+                break
+            to_id, n = int(_val(r, "id", "ID")), n + 1
+        if not n:
+            conn.rollback()
+            return {"from_id": from_id, "to_id": from_id, "scans": 0}
+        if row is None:
+            cur.execute("INSERT INTO app_settings (key, value) VALUES (%s, %s)", (watermark_key, str(to_id)))
+        else:
+            cur.execute(
+                "UPDATE app_settings SET value = %s WHERE key = %s AND value = %s",
+                (str(to_id), watermark_key, old),
+            )
+            if not cur.rowcount:
+                conn.rollback()  # another worker advanced it first
+                return {"from_id": from_id, "to_id": from_id, "scans": 0}
+        cur.execute(
+            """MERGE INTO category_hourly h
+               USING (
+                   SELECT DATE_TRUNC('hour', ts) AS hour, category, COUNT(*) AS n FROM scans
+                   WHERE id > %s AND id <= %s AND verdict IN ('SCAM', 'SUSPICIOUS')
+                     AND category IS NOT NULL AND category NOT IN ('', 'Unknown')
+                   GROUP BY 1, 2
+               ) s ON h.hour = s.hour AND h.category = s.category
+               WHEN MATCHED THEN UPDATE SET count = h.count + s.n
+               WHEN NOT MATCHED THEN INSERT (hour, category, count) VALUES (s.hour, s.category, s.n)""",
+            (from_id, to_id),
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    return {"from_id": from_id, "to_id": to_id, "scans": n}
+
+
+def get_category_hourly(since_hour: str) -> list:
+    """[{ hour, category, count }] for hours >= since_hour (YYYY-MM-DD HH:00:00)."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT hour, category, count FROM category_hourly WHERE hour >= %s ORDER BY hour", (since_hour,))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return [
+        {
+            "hour": str(_val(r, "hour", "HOUR"))[:19],
+            "category": _val(r, "category", "CATEGORY"),
+            "count": _val(r, "count", "COUNT") or 0,
+        }
+        for r in rows
+    ]
+
+
+def save_community_alert(
+    category: str,
+    summary: str,
+    scan_count: int,
+    baseline: float,
+    window_start: str,
+    window_end: str,
+) -> int:
+    """Refresh the category's alert whose window reaches window_start, else insert one. Returns its id."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN")
+    cur.execute(
+        """SELECT id FROM community_alerts WHERE category = %s AND window_end >= %s
+           ORDER BY window_end DESC LIMIT 1""",
+        (category, window_start),
+    )
+    row = cur.fetchone()
+    if row:
+        aid = _val(row, "id", "ID")
+        cur.execute(
+            """UPDATE community_alerts
+               SET summary = %s, scan_count = %s, baseline = %s, window_end = %s, ts = CURRENT_TIMESTAMP()
+               WHERE id = %s""",
+            (summary, scan_count, baseline, window_end, aid),
+        )
+    else:
+        cur.execute("SELECT community_alerts_seq.NEXTVAL AS n")
+        aid = int(_val(cur.fetchone(), "n", "NEXTVAL"))
+        cur.execute(
+            """INSERT INTO community_alerts (id, category, summary, scan_count, baseline, window_start, window_end)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            (aid, category, summary, scan_count, baseline, window_start, window_end),
+        )
+    conn.commit()
+    cur.close()
+    conn.close()
+    return aid
+
+
+def list_stored_categories() -> list:
+    """Distinct category labels in scans, category_hourly and community_alerts."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT category FROM scans WHERE category IS NOT NULL AND category != ''
+           UNION SELECT category FROM category_hourly
+           UNION SELECT category FROM community_alerts"""
+    )
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return [_val(r, "category", "CATEGORY") for r in rows]
+
+
+def rename_category(old: str, new: str) -> None:
+    """Relabel old as new in scans, category_hourly (counts merged) and community_alerts, in one transaction."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN")
+    try:
+        cur.execute("UPDATE scans SET category = %s WHERE category = %s", (new, old))
+        cur.execute(
+            """MERGE INTO category_hourly h
+               USING (SELECT hour, count FROM category_hourly WHERE category = %s) s
+               ON h.hour = s.hour AND h.category = %s
+               WHEN MATCHED THEN UPDATE SET count = h.count + s.count
+               WHEN NOT MATCHED THEN INSERT (hour, category, count) VALUES (s.hour, %s, s.count)""",
+            (old, new, new),
+        )
+        cur.execute("DELETE FROM category_hourly WHERE category = %s", (old,))
+        cur.execute("UPDATE community_alerts SET category = %s WHERE category = %s", (new, old))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def link_scan_signals(links: list, watermark_key: str, to_id: int) -> None:
+    """Link [(scan_id, [(kind, key, text)])] and set app_settings[watermark_key] = to_id, in one transaction."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN")
+    try:
+        _link_signals(cur, links)
+        cur.execute(
+            """MERGE INTO app_settings a USING (SELECT %s AS key, %s AS value) s ON a.key = s.key
+               WHEN MATCHED THEN UPDATE SET value = s.value
+               WHEN NOT MATCHED THEN INSERT (key, value) VALUES (s.key, s.value)""",
+            (watermark_key, str(to_id)),
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def iter_scans(after_id: int = 0, chunk_size: int = 5000):
+    """Yield lists of scan dicts with id > after_id, in id order, chunk_size rows at a time."""
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        while True:
+            cur.execute(
+                """SELECT id, email, ts, verdict, confidence, category, signals_json, msg_hash
+                   FROM scans WHERE id > %s ORDER BY id LIMIT %s""",
+                (after_id, chunk_size),
+            )
+            rows = [{k.lower(): v for k, v in r.items()} for r in cur.fetchall()]
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1]["id"]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def iter_usage(after_date: str = "", chunk_size: int = 5000):
+    """Yield lists of usage dicts for complete days after after_date, in (date, email) order."""
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    after_date = after_date or "1970-01-01"
+    last_date, last_email = after_date, ""
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        while True:
+            cur.execute(
+                """SELECT email, date, checks_count FROM usage
+                   WHERE date > %s AND date < %s AND (date > %s OR (date = %s AND email > %s))
+                   ORDER BY date, email LIMIT %s""",
+                (after_date, today, last_date, last_date, last_email, chunk_size),
+            )
+            rows = [{k.lower(): v for k, v in r.items()} for r in cur.fetchall()]
+            if not rows:
+                return
+            for r in rows:
+                r["date"] = str(r["date"])
+            yield rows
+            last_date, last_email = rows[-1]["date"], rows[-1]["email"]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def insert_api_key(email: str, key_hash: str, label: str = "") -> None:
+    """Store a partner API key (hash only)."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO api_keys (key_hash, email, label) VALUES (%s, %s, %s)",
+        (key_hash, email.strip().lower(), label or ""),
+    )
     conn.commit()
     cur.close()
     conn.close()
 
 
+def get_api_key_owner(key_hash: str) -> str:
+    """Return the email owning an unrevoked key hash, or None."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT email FROM api_keys WHERE key_hash = %s AND revoked_at IS NULL", (key_hash,))
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    return _val(row, "email", "EMAIL") if row else None
+
+
+def list_api_keys(email: str) -> list:
+    """List a user's API keys (hashes), newest first."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT key_hash, label, created_at, revoked_at FROM api_keys WHERE email = %s ORDER BY created_at DESC",
+        (email.strip().lower(),),
+    )
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return [{k.lower(): v for k, v in r.items()} for r in rows]
+
+
+def revoke_api_keys(email: str) -> int:
+    """Revoke every active key of a user. Returns how many were revoked."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE api_keys SET revoked_at = CURRENT_TIMESTAMP() WHERE email = %s AND revoked_at IS NULL",
+        (email.strip().lower(),),
+    )
+    n = cur.rowcount or 0
+    conn.commit()
+    cur.close()
+    conn.close()
+    return n
+
+
+def insert_analysis_metrics(
+    scan_id: int,
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    cached_tokens: int,
+    latency_ms: float,
+    retries: int,
+    source: str,
+) -> None:
+    """Store one analysis' tokens, latency, retries and source."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """INSERT INTO analysis_metrics
+           (scan_id, model, prompt_tokens, completion_tokens, cached_tokens, latency_ms, retries, source)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+        (scan_id, model or "", prompt_tokens, completion_tokens, cached_tokens, latency_ms, retries, source),
+    )
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def get_analysis_metrics_daily(days: int = 14) -> list:
+    """Per day, source and model: call and token totals plus p50/p95/p99 latency."""
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT TO_VARCHAR(TO_DATE(ts), 'YYYY-MM-DD') AS day, source, model, COUNT(*) AS calls,
+                  SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+                  SUM(cached_tokens) AS cached_tokens, SUM(retries) AS retries,
+                  PERCENTILE_DISC(0.50) WITHIN GROUP (ORDER BY latency_ms) AS p50_ms,
+                  PERCENTILE_DISC(0.95) WITHIN GROUP (ORDER BY latency_ms) AS p95_ms,
+                  PERCENTILE_DISC(0.99) WITHIN GROUP (ORDER BY latency_ms) AS p99_ms
+           FROM analysis_metrics WHERE ts >= %s
+           GROUP BY 1, 2, 3 ORDER BY 1, 2, 3""",
+        (since,),
+    )
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return [{k.lower(): v for k, v in r.items()} for r in rows]
+
+
 def get_app_setting(key: str) -> str:
     conn = get_conn()
     cur = conn.cursor()
@@ -268,3 +790,65 @@ def set_app_setting(key: str, value: str) -> None:
     conn.commit()
     cur.close()
     conn.close()
+
+
+def get_counters() -> dict:
+    """Return { counter name: value } from the maintained counters table."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT name, value FROM counters")
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return {_val(r, "name", "NAME"): int(_val(r, "value", "VALUE") or 0) for r in rows}
+
+
+def get_daily_scan_counts(days: int = 14) -> list:
+    """Return [{ date, verdict, count }] from the scan_daily rollup for the last N days."""
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT date, verdict, count FROM scan_daily WHERE date >= %s ORDER BY date, verdict",
+        (since,),
+    )
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return [
+        {
+            "date": str(_val(r, "date", "DATE")),
+            "verdict": _val(r, "verdict", "VERDICT"),
+            "count": int(_val(r, "count", "COUNT") or 0),
+        }
+        for r in rows
+    ]
+
+
+def reconcile_counters() -> dict:
+    """Recompute counters and scan_daily from the base tables in one transaction; return new counters."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN")
+    cur.execute("SELECT COUNT(DISTINCT email) AS c FROM users")
+    counters = {"users": int(_val(cur.fetchone(), "c") or 0)}
+    cur.execute("SELECT COUNT(*) AS c FROM scans")
+    counters["scans"] = int(_val(cur.fetchone(), "c") or 0)
+    cur.execute("SELECT COUNT(*) AS c FROM upgrade_requests")
+    counters["upgrade_requests"] = int(_val(cur.fetchone(), "c") or 0)
+    for status in UPGRADE_STATUSES:
+        counters[f"upgrade_requests.{status}"] = 0
+    cur.execute("SELECT status, COUNT(*) AS c FROM upgrade_requests GROUP BY status")
+    for r in cur.fetchall():
+        counters[f"upgrade_requests.{_val(r, 'status', 'STATUS')}"] = int(_val(r, "c") or 0)
+    cur.execute("DELETE FROM counters")
+    cur.executemany("INSERT INTO counters (name, value) VALUES (%s, %s)", list(counters.items()))
+    cur.execute("DELETE FROM scan_daily")
+    cur.execute(
+        """INSERT INTO scan_daily (date, verdict, count)
+           SELECT DATE(ts), verdict, COUNT(*) FROM scans GROUP BY DATE(ts), verdict"""
+    )
+    conn.commit()
+    cur.close()
+    conn.close()
+    return counters
@@ -1,6 +1,17 @@
 """CRUD for CheckMoYan when using SQLite (no SNOWFLAKE in secrets)."""
 from ._sqlite_schema import get_conn
-from datetime import datetime
+from datetime import datetime, timedelta
+
+UPGRADE_STATUSES = ("pending", "approved", "rejected")
+
+
+def _bump(cur, name: str, delta: int = 1) -> None:
+    """Add delta to a maintained counter (same transaction as the row change)."""
+    cur.execute(
+        """INSERT INTO counters (name, value) VALUES (?, ?)
+           ON CONFLICT(name) DO UPDATE SET value = value + excluded.value""",
+        (name, delta),
+    )
 
 
 def ensure_user(email: str) -> None:
@@ -10,6 +21,8 @@ def ensure_user(email: str) -> None:
         "INSERT OR IGNORE INTO users (email, plan) VALUES (?, 'free')",
         (email.strip().lower(),),
     )
+    if cur.rowcount > 0:
+        _bump(cur, "users")
     conn.commit()
     conn.close()
 
@@ -39,31 +52,55 @@ def set_user_plan(email: str, plan: str, premium_until: str = None) -> None:
     conn.close()
 
 
-def record_usage(email: str) -> None:
-    ensure_user(email)
+def get_usage_today(email: str) -> int:
     today = datetime.utcnow().strftime("%Y-%m-%d")
     conn = get_conn()
     cur = conn.cursor()
     cur.execute(
-        """INSERT INTO usage (email, date, checks_count) VALUES (?, ?, 1)
-           ON CONFLICT(email, date) DO UPDATE SET checks_count = checks_count + 1""",
+        "SELECT checks_count FROM usage WHERE email = ? AND date = ?",
         (email.strip().lower(), today),
     )
-    conn.commit()
+    row = cur.fetchone()
     conn.close()
+    return row["checks_count"] if row else 0
 
 
-def get_usage_today(email: str) -> int:
-    today = datetime.utcnow().strftime("%Y-%m-%d")
+def add_usage(deltas: list) -> None:
+    """Add [(email, date, count)] to usage in one transaction (flush of services.usage_counters)."""
+    if not deltas:
+        return
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute(
-        "SELECT checks_count FROM usage WHERE email = ? AND date = ?",
-        (email.strip().lower(), today),
+    cur.execute("BEGIN IMMEDIATE")
+    cur.executemany(
+        """INSERT INTO usage (email, date, checks_count) VALUES (?, ?, ?)
+           ON CONFLICT(email, date) DO UPDATE SET checks_count = checks_count + excluded.checks_count""",
+        [(email.strip().lower(), date, count) for email, date, count in deltas],
     )
-    row = cur.fetchone()
+    conn.commit()
     conn.close()
-    return row["checks_count"] if row else 0
+
+
+def _link_signals(cur, links: list) -> None:
+    """Intern [(scan_id, [(kind, key, text)])] into signals and link them in scan_signals."""
+    entries = {}
+    for _, signals in links:
+        for kind, key, text in signals:
+            entries.setdefault((kind, key), text)
+    if not entries:
+        return
+    cur.executemany(
+        "INSERT INTO signals (kind, key, text) VALUES (?, ?, ?) ON CONFLICT(kind, key) DO NOTHING",
+        [(kind, key, text) for (kind, key), text in entries.items()],
+    )
+    ids = {}
+    for kind, key in entries:
+        cur.execute("SELECT id FROM signals WHERE kind = ? AND key = ?", (kind, key))
+        ids[(kind, key)] = cur.fetchone()["id"]
+    cur.executemany(
+        "INSERT OR IGNORE INTO scan_signals (scan_id, signal_id) VALUES (?, ?)",
+        [(scan_id, ids[(kind, key)]) for scan_id, signals in links for kind, key, _ in signals],
+    )
 
 
 def insert_scan(
@@ -73,6 +110,7 @@ def insert_scan(
     category: str,
     signals_json: str,
     msg_hash: str,
+    signals: list = None,
 ) -> int:
     conn = get_conn()
     cur = conn.cursor()
@@ -82,6 +120,13 @@ def insert_scan(
         (email.strip().lower(), verdict, confidence, category or "", signals_json, msg_hash or ""),
     )
     sid = cur.lastrowid
+    _link_signals(cur, [(sid, signals or [])])
+    _bump(cur, "scans")
+    cur.execute(
+        """INSERT INTO scan_daily (date, verdict, count) VALUES (?, ?, 1)
+           ON CONFLICT(date, verdict) DO UPDATE SET count = count + 1""",
+        (datetime.utcnow().strftime("%Y-%m-%d"), verdict),
+    )
     conn.commit()
     conn.close()
     return sid
@@ -124,36 +169,61 @@ def get_trending_categories(limit: int = 5) -> list:
     return [{"category": r["category"], "count": r["count"]} for r in rows]
 
 
+def get_top_signals(kind: str = "red_flag", days: int = 7, limit: int = 10) -> list:
+    """[{ text, count }]: the signals of kind linked to the most scans in the last days (range over scan_signals' key)."""
+    since = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM scans WHERE ts >= ? ORDER BY ts LIMIT 1", (since,))
+    row = cur.fetchone()
+    if row is None:
+        conn.close()
+        return []
+    first_id = row["id"]
+    cur.execute(
+        """SELECT s.text, COUNT(*) AS count FROM scan_signals ss JOIN signals s ON s.id = ss.signal_id
+           WHERE ss.scan_id >= ? AND s.kind = ?
+           GROUP BY ss.signal_id ORDER BY count DESC LIMIT ?""",
+        (first_id, kind, limit),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return [{"text": r["text"], "count": r["count"]} for r in rows]
+
+
 def insert_upgrade_request(
     email: str,
     plan: str,
     method: str,
     ref: str = None,
     receipt_path: str = None,
+    receipt_sha256: str = None,
 ) -> int:
     conn = get_conn()
     cur = conn.cursor()
     cur.execute(
-        """INSERT INTO upgrade_requests (email, plan, method, ref, receipt_path, status)
-           VALUES (?, ?, ?, ?, ?, 'pending')""",
-        (email.strip().lower(), plan, method, ref or "", receipt_path or ""),
+        """INSERT INTO upgrade_requests (email, plan, method, ref, receipt_path, receipt_sha256, status)
+           VALUES (?, ?, ?, ?, ?, ?, 'pending')""",
+        (email.strip().lower(), plan, method, ref or "", receipt_path or "", receipt_sha256 or None),
     )
     uid = cur.lastrowid
+    _bump(cur, "upgrade_requests")
+    _bump(cur, "upgrade_requests.pending")
     conn.commit()
     conn.close()
     return uid
 
 
-def list_upgrade_requests(status: str = None) -> list:
+def list_upgrade_requests(status: str = None, limit: int = None, offset: int = 0) -> list:
+    """Newest first; limit/offset return one page (limit=None returns everything)."""
     conn = get_conn()
     cur = conn.cursor()
-    if status:
-        cur.execute(
-            "SELECT * FROM upgrade_requests WHERE status = ? ORDER BY ts DESC",
-            (status,),
-        )
-    else:
-        cur.execute("SELECT * FROM upgrade_requests ORDER BY ts DESC")
+    where, params = ("WHERE status = ?", [status]) if status else ("", [])
+    page = ""
+    if limit is not None:
+        page = "LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    cur.execute(f"SELECT * FROM upgrade_requests {where} ORDER BY ts DESC, id DESC {page}", params)
     rows = cur.fetchall()
     conn.close()
     return [dict(r) for r in rows]
@@ -168,6 +238,20 @@ def get_upgrade_request(req_id: int) -> dict:
     return dict(row) if row else None
 
 
+def find_upgrade_request_by_receipt(receipt_sha256: str, email: str = None) -> dict:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT * FROM upgrade_requests
+           WHERE receipt_sha256 = ? AND (? IS NULL OR email != ? OR status IN ('pending', 'approved'))
+           ORDER BY id LIMIT 1""",
+        (receipt_sha256, *(2 * [email.strip().lower() if email else None])),
+    )
+    row = cur.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
 def update_upgrade_request(
     req_id: int,
     status: str,
@@ -176,15 +260,365 @@ def update_upgrade_request(
 ) -> None:
     conn = get_conn()
     cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    cur.execute("SELECT status FROM upgrade_requests WHERE id = ?", (req_id,))
+    row = cur.fetchone()
     cur.execute(
         """UPDATE upgrade_requests SET status = ?, admin_notes = ?, approved_until = ?
            WHERE id = ?""",
         (status, admin_notes or "", approved_until or "", req_id),
     )
+    if row and row["status"] != status:
+        _bump(cur, f"upgrade_requests.{row['status']}", -1)
+        _bump(cur, f"upgrade_requests.{status}")
     conn.commit()
     conn.close()
 
 
+def decide_upgrade_requests(
+    req_ids: list,
+    status: str,
+    approved_until: str = None,
+    admin_notes: str = None,
+) -> list:
+    """
+    Move the still-pending requests among req_ids to status in one transaction. Approving also
+    creates missing users and sets each user's plan. Returns [{ id, email, plan }] actually changed.
+    """
+    if not req_ids:
+        return []
+    marks = ",".join("?" * len(req_ids))
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    cur.execute(
+        f"SELECT id, email, plan FROM upgrade_requests WHERE status = 'pending' AND id IN ({marks}) ORDER BY id",
+        list(req_ids),
+    )
+    decided = [dict(r) for r in cur.fetchall()]
+    if decided:
+        ids = [r["id"] for r in decided]
+        cur.execute(
+            f"""UPDATE upgrade_requests SET status = ?, admin_notes = ?, approved_until = ?
+                WHERE id IN ({",".join("?" * len(ids))})""",
+            [status, admin_notes or "", approved_until or ""] + ids,
+        )
+        _bump(cur, "upgrade_requests.pending", -len(decided))
+        _bump(cur, f"upgrade_requests.{status}", len(decided))
+        if status == "approved":
+            # Latest request wins when one user has several in the batch
+            plans = {r["email"].strip().lower(): r["plan"] for r in decided}
+            cur.executemany("INSERT OR IGNORE INTO users (email, plan) VALUES (?, 'free')", [(e,) for e in plans])
+            if cur.rowcount > 0:
+                _bump(cur, "users", cur.rowcount)
+            cur.executemany(
+                "UPDATE users SET plan = ?, premium_until = ? WHERE email = ?",
+                [(plan, approved_until, email) for email, plan in plans.items()],
+            )
+    conn.commit()
+    conn.close()
+    return decided
+
+
+def list_community_alerts(limit: int = 10) -> list:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT category, summary, ts, scan_count, baseline, window_start, window_end
+           FROM community_alerts ORDER BY ts DESC LIMIT ?""",
+        (limit,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def advance_category_hourly(watermark_key: str, before_ts: str, max_rows: int = 5000) -> dict:
+    """
+    Fold the scans after the watermark (app_settings[watermark_key], a scan id) into
+    category_hourly and move the watermark, in one transaction. At most max_rows scans, stopping
+    at the first with ts > before_ts. Only SCAM/SUSPICIOUS scans with a category are counted.
+    Returns { from_id, to_id, scans }.
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.execute("SELECT value FROM app_settings WHERE key = ?", (watermark_key,))
+        row = cur.fetchone()
+        from_id = int(row["value"]) if row and row["value"] else 0
+        cur.execute("SELECT id, ts FROM scans WHERE id > ? ORDER BY id LIMIT ?", (from_id, max_rows))
+        to_id, n = from_id, 0
+        for r in cur.fetchall():
+            if r["ts"] > before_ts:
+                break
+            to_id, n = r["id"], n + 1
+        if n:
+            cur.execute(
+                """INSERT INTO category_hourly (hour, category, count)
+                   SELECT strftime('%Y-%m-%d %H:00:00', ts), category, COUNT(*) FROM scans
+                   WHERE id > ? AND id <= ? AND verdict IN ('SCAM', 'SUSPICIOUS')
+                     AND category IS NOT NULL AND category NOT IN ('', 'Unknown')
+                   GROUP BY 1, 2
+                   ON CONFLICT(hour, category) DO UPDATE SET count = count + excluded.count""",
+                (from_id, to_id),
+            )
+            cur.execute(
+                """INSERT INTO app_settings (key, value) VALUES (?, ?)
+                   ON CONFLICT(key) DO UPDATE SET value = excluded.value""",
+                (watermark_key, str(to_id)),
+            )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return {"from_id": from_id, "to_id": to_id, "scans": n}
+
+
+def get_category_hourly(since_hour: str) -> list:
+    """[{ hour, category, count }] for hours >= since_hour (YYYY-MM-DD HH:00:00)."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT hour, category, count FROM category_hourly WHERE hour >= ? ORDER BY hour", (since_hour,))
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def save_community_alert(
+    category: str,
+    summary: str,
+    scan_count: int,
+    baseline: float,
+    window_start: str,
+    window_end: str,
+) -> int:
+    """Refresh the category's alert whose window reaches window_start, else insert one. Returns its id."""
+    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    cur.execute(
+        """SELECT id FROM community_alerts WHERE category = ? AND window_end >= ?
+           ORDER BY window_end DESC LIMIT 1""",
+        (category, window_start),
+    )
+    row = cur.fetchone()
+    if row:
+        aid = row["id"]
+        cur.execute(
+            """UPDATE community_alerts SET summary = ?, scan_count = ?, baseline = ?, window_end = ?, ts = ?
+               WHERE id = ?""",
+            (summary, scan_count, baseline, window_end, now, aid),
+        )
+    else:
+        cur.execute(
+            """INSERT INTO community_alerts (category, summary, ts, scan_count, baseline, window_start, window_end)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (category, summary, now, scan_count, baseline, window_start, window_end),
+        )
+        aid = cur.lastrowid
+    conn.commit()
+    conn.close()
+    return aid
+
+
+def list_stored_categories() -> list:
+    """Distinct category labels in scans, category_hourly and community_alerts."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT category FROM scans WHERE category IS NOT NULL AND category != ''
+           UNION SELECT category FROM category_hourly
+           UNION SELECT category FROM community_alerts"""
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return [r["category"] for r in rows]
+
+
+def rename_category(old: str, new: str) -> None:
+    """Relabel old as new in scans, category_hourly (counts merged) and community_alerts, in one transaction."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.execute("UPDATE scans SET category = ? WHERE category = ?", (new, old))
+        cur.execute(
+            """INSERT INTO category_hourly (hour, category, count)
+               SELECT hour, ?, count FROM category_hourly WHERE category = ?
+               ON CONFLICT(hour, category) DO UPDATE SET count = count + excluded.count""",
+            (new, old),
+        )
+        cur.execute("DELETE FROM category_hourly WHERE category = ?", (old,))
+        cur.execute("UPDATE community_alerts SET category = ? WHERE category = ?", (new, old))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def link_scan_signals(links: list, watermark_key: str, to_id: int) -> None:
+    """Link [(scan_id, [(kind, key, text)])] and set app_settings[watermark_key] = to_id, in one transaction."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        _link_signals(cur, links)
+        cur.execute(
+            """INSERT INTO app_settings (key, value) VALUES (?, ?)
+               ON CONFLICT(key) DO UPDATE SET value = excluded.value""",
+            (watermark_key, str(to_id)),
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def iter_scans(after_id: int = 0, chunk_size: int = 5000):
+    """Yield lists of scan dicts with id > after_id, in id order, chunk_size rows at a time."""
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        while True:
+            cur.execute(
+                """SELECT id, email, ts, verdict, confidence, category, signals_json, msg_hash
+                   FROM scans WHERE id > ? ORDER BY id LIMIT ?""",
+                (after_id, chunk_size),
+            )
+            rows = [dict(r) for r in cur.fetchall()]
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1]["id"]
+    finally:
+        conn.close()
+
+
+def iter_usage(after_date: str = "", chunk_size: int = 5000):
+    """Yield lists of usage dicts for complete days after after_date, in (date, email) order."""
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    last_date, last_email = after_date or "", ""
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        while True:
+            cur.execute(
+                """SELECT email, date, checks_count FROM usage
+                   WHERE date > ? AND date < ? AND (date > ? OR (date = ? AND email > ?))
+                   ORDER BY date, email LIMIT ?""",
+                (after_date or "", today, last_date, last_date, last_email, chunk_size),
+            )
+            rows = [dict(r) for r in cur.fetchall()]
+            if not rows:
+                return
+            yield rows
+            last_date, last_email = rows[-1]["date"], rows[-1]["email"]
+    finally:
+        conn.close()
+
+
+def insert_api_key(email: str, key_hash: str, label: str = "") -> None:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO api_keys (key_hash, email, label) VALUES (?, ?, ?)",
+        (key_hash, email.strip().lower(), label or ""),
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_api_key_owner(key_hash: str) -> str:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT email FROM api_keys WHERE key_hash = ? AND revoked_at IS NULL", (key_hash,))
+    row = cur.fetchone()
+    conn.close()
+    return row["email"] if row else None
+
+
+def list_api_keys(email: str) -> list:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT key_hash, label, created_at, revoked_at FROM api_keys WHERE email = ? ORDER BY created_at DESC",
+        (email.strip().lower(),),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def revoke_api_keys(email: str) -> int:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE api_keys SET revoked_at = datetime('now') WHERE email = ? AND revoked_at IS NULL",
+        (email.strip().lower(),),
+    )
+    n = cur.rowcount
+    conn.commit()
+    conn.close()
+    return n
+
+
+def insert_analysis_metrics(
+    scan_id: int,
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    cached_tokens: int,
+    latency_ms: float,
+    retries: int,
+    source: str,
+) -> None:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """INSERT INTO analysis_metrics
+           (scan_id, model, prompt_tokens, completion_tokens, cached_tokens, latency_ms, retries, source)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (scan_id, model or "", prompt_tokens, completion_tokens, cached_tokens, latency_ms, retries, source),
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_analysis_metrics_daily(days: int = 14) -> list:
+    """Per day, source and model: call and token totals plus nearest-rank p50/p95/p99 latency."""
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """WITH ranked AS (
+               SELECT date(ts) AS day, source, model, prompt_tokens, completion_tokens, cached_tokens,
+                      latency_ms, retries,
+                      ROW_NUMBER() OVER (PARTITION BY date(ts), source, model ORDER BY latency_ms) AS rn,
+                      COUNT(*) OVER (PARTITION BY date(ts), source, model) AS n
+               FROM analysis_metrics WHERE ts >= ?
+           )
+           SELECT day, source, model, COUNT(*) AS calls,
+                  SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+                  SUM(cached_tokens) AS cached_tokens, SUM(retries) AS retries,
+                  MIN(CASE WHEN rn >= 0.50 * n THEN latency_ms END) AS p50_ms,
+                  MIN(CASE WHEN rn >= 0.95 * n THEN latency_ms END) AS p95_ms,
+                  MIN(CASE WHEN rn >= 0.99 * n THEN latency_ms END) AS p99_ms
+           FROM ranked GROUP BY day, source, model ORDER BY day, source, model""",
+        (since,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
 def get_app_setting(key: str) -> str:
     conn = get_conn()
     cur = conn.cursor()
@@ -203,3 +637,52 @@ def set_app_setting(key: str, value: str) -> None:
     )
     conn.commit()
     conn.close()
+
+
+def get_counters() -> dict:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT name, value FROM counters")
+    rows = cur.fetchall()
+    conn.close()
+    return {r["name"]: r["value"] for r in rows}
+
+
+def get_daily_scan_counts(days: int = 14) -> list:
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT date, verdict, count FROM scan_daily WHERE date >= ? ORDER BY date, verdict",
+        (since,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return [{"date": r["date"], "verdict": r["verdict"], "count": r["count"]} for r in rows]
+
+
+def reconcile_counters() -> dict:
+    """Recompute counters and scan_daily from the base tables in one transaction; return new counters."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")  # hold the write lock so no insert slips between count and rewrite
+    counters = {
+        "users": cur.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+        "scans": cur.execute("SELECT COUNT(*) FROM scans").fetchone()[0],
+        "upgrade_requests": cur.execute("SELECT COUNT(*) FROM upgrade_requests").fetchone()[0],
+    }
+    for status in UPGRADE_STATUSES:
+        counters[f"upgrade_requests.{status}"] = 0
+    cur.execute("SELECT status, COUNT(*) AS n FROM upgrade_requests GROUP BY status")
+    for r in cur.fetchall():
+        counters[f"upgrade_requests.{r['status']}"] = r["n"]
+    cur.execute("DELETE FROM counters")
+    cur.executemany("INSERT INTO counters (name, value) VALUES (?, ?)", list(counters.items()))
+    cur.execute("DELETE FROM scan_daily")
+    cur.execute(
+        """INSERT INTO scan_daily (date, verdict, count)
+           SELECT date(ts), verdict, COUNT(*) FROM scans GROUP BY date(ts), verdict"""
+    )
+    conn.commit()
+    conn.close()
+    return counters
@@ -1,9 +1,14 @@
 """DB layer: Snowflake (from secrets.toml [SNOWFLAKE]) or SQLite fallback."""
-import streamlit as st
+try:
+    import streamlit as st
+except ImportError:  # CLIs and tests without Streamlit: no secrets, so SQLite
+    st = None
 
 
 def _use_snowflake():
     """True if SNOWFLAKE is configured in secrets."""
+    if st is None:
+        return False
     try:
         cfg = st.secrets.get("SNOWFLAKE")
         return bool(cfg and isinstance(cfg, dict) and (cfg.get("account") or cfg.get("ACCOUNT")))
@@ -11,6 +16,16 @@ def _use_snowflake():
         return False
 
 
+def _use_duckdb():
+    """True if ANALYTICS_BACKEND = "duckdb" in secrets (SQLite only): heavy reads go to the DuckDB side-car."""
+    if _use_snowflake():
+        return False
+    try:
+        return str(st.secrets.get("ANALYTICS_BACKEND") or "").strip().lower() == "duckdb"
+    except Exception:
+        return False
+
+
 def get_conn():
     """Return Snowflake connection if configured, else SQLite."""
     if _use_snowflake():
@@ -38,6 +38,9 @@ CREATE TABLE IF NOT EXISTS scans (
     msg_hash VARCHAR(255)
 );
 
+-- Internal stage for bulk scan ingest (db/snowflake_ingest.py: PUT + COPY INTO)
+CREATE STAGE IF NOT EXISTS scans_stage;
+
 -- ========== UPGRADE_REQUESTS ==========
 CREATE SEQUENCE IF NOT EXISTS upgrade_requests_seq START 1 INCREMENT 1;
 
@@ -51,9 +54,13 @@ CREATE TABLE IF NOT EXISTS upgrade_requests (
     status VARCHAR(50) NOT NULL DEFAULT 'pending',
     ts TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
     admin_notes VARCHAR(65535),
-    approved_until DATE
+    approved_until DATE,
+    receipt_sha256 VARCHAR(64)
 );
 
+-- Existing deployments: add the receipt hash column (duplicate-receipt detection)
+ALTER TABLE upgrade_requests ADD COLUMN IF NOT EXISTS receipt_sha256 VARCHAR(64);
+
 -- ========== COMMUNITY_ALERTS ==========
 CREATE SEQUENCE IF NOT EXISTS community_alerts_seq START 1 INCREMENT 1;
 
@@ -61,11 +68,86 @@ CREATE TABLE IF NOT EXISTS community_alerts (
     id INTEGER NOT NULL PRIMARY KEY DEFAULT community_alerts_seq.NEXTVAL,
     category VARCHAR(255) NOT NULL,
     summary VARCHAR(65535),
-    ts TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
-);
+    ts TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    scan_count INTEGER NOT NULL DEFAULT 0,
+    baseline FLOAT,
+    window_start TIMESTAMP_NTZ,
+    window_end TIMESTAMP_NTZ
+) CLUSTER BY (ts);
+
+-- Existing deployments: auto-generated alerts (services.community_alerts) carry counts and windows
+ALTER TABLE community_alerts ADD COLUMN IF NOT EXISTS scan_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE community_alerts ADD COLUMN IF NOT EXISTS baseline FLOAT;
+ALTER TABLE community_alerts ADD COLUMN IF NOT EXISTS window_start TIMESTAMP_NTZ;
+ALTER TABLE community_alerts ADD COLUMN IF NOT EXISTS window_end TIMESTAMP_NTZ;
+ALTER TABLE community_alerts CLUSTER BY (ts);
 
 -- ========== APP_SETTINGS (payment config from Admin) ==========
 CREATE TABLE IF NOT EXISTS app_settings (
     key VARCHAR(255) PRIMARY KEY,
     value VARCHAR(65535) NOT NULL DEFAULT ''
 );
+
+-- ========== API_KEYS (partner JSON API; SHA-256 of the key only) ==========
+CREATE TABLE IF NOT EXISTS api_keys (
+    key_hash VARCHAR(64) PRIMARY KEY,
+    email VARCHAR(255) NOT NULL,
+    label VARCHAR(255),
+    created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    revoked_at TIMESTAMP_NTZ
+);
+
+-- ========== ANALYSIS_METRICS (tokens, latency, retries per OpenAI analysis) ==========
+CREATE SEQUENCE IF NOT EXISTS analysis_metrics_seq START 1 INCREMENT 1;
+
+CREATE TABLE IF NOT EXISTS analysis_metrics (
+    id INTEGER NOT NULL PRIMARY KEY DEFAULT analysis_metrics_seq.NEXTVAL,
+    ts TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    scan_id INTEGER,
+    model VARCHAR(100),
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_ms FLOAT NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    source VARCHAR(50) NOT NULL DEFAULT 'llm'
+);
+
+-- ========== COUNTERS (maintained totals for Admin → Stats) ==========
+CREATE TABLE IF NOT EXISTS counters (
+    name VARCHAR(255) PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+
+-- ========== SCAN_DAILY (per-day scans by verdict rollup) ==========
+CREATE TABLE IF NOT EXISTS scan_daily (
+    date DATE NOT NULL,
+    verdict VARCHAR(50) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date, verdict)
+);
+
+-- ========== CATEGORY_HOURLY (scans per hour and category, fed incrementally for community alerts) ==========
+CREATE TABLE IF NOT EXISTS category_hourly (
+    hour TIMESTAMP_NTZ NOT NULL,
+    category VARCHAR(255) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, category)
+);
+
+-- ========== SIGNALS / SCAN_SIGNALS (interned red flags and reasons, linked to scans) ==========
+CREATE SEQUENCE IF NOT EXISTS signals_seq START 1 INCREMENT 1;
+
+CREATE TABLE IF NOT EXISTS signals (
+    id INTEGER NOT NULL PRIMARY KEY DEFAULT signals_seq.NEXTVAL,
+    kind VARCHAR(20) NOT NULL,
+    key VARCHAR(255) NOT NULL,
+    text VARCHAR(255) NOT NULL,
+    UNIQUE (kind, key)
+);
+
+CREATE TABLE IF NOT EXISTS scan_signals (
+    scan_id INTEGER NOT NULL,
+    signal_id INTEGER NOT NULL,
+    PRIMARY KEY (scan_id, signal_id)
+) CLUSTER BY (scan_id);
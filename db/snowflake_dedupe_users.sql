@@ -0,0 +1,35 @@
+-- CheckMoYan: one-off dedup of USERS in Snowflake
+-- Snowflake does not enforce PRIMARY KEY, and the old ensure_user did a plain INSERT on every
+-- check, so users holds one row per check. ensure_user now uses MERGE; run this once to collapse
+-- the duplicates. Keeps one row per email: a paid plan over free, latest premium_until, earliest created_at.
+-- Afterwards refresh Admin → Stats counters:  python -m services.counters
+
+USE DATABASE CHECKMOYAN;
+USE SCHEMA PUBLIC;
+
+-- DDL commits implicitly, so create the scratch table before the transaction
+CREATE OR REPLACE TEMPORARY TABLE users_keep (
+    email VARCHAR(255),
+    plan VARCHAR(50),
+    premium_until DATE,
+    created_at TIMESTAMP_NTZ
+);
+
+BEGIN;
+
+INSERT INTO users_keep (email, plan, premium_until, created_at)
+SELECT LOWER(TRIM(email)), plan, premium_until, created_at
+FROM users
+QUALIFY ROW_NUMBER() OVER (
+    PARTITION BY LOWER(TRIM(email))
+    ORDER BY IFF(plan = 'free', 1, 0), premium_until DESC NULLS LAST, created_at ASC
+) = 1;
+
+DELETE FROM users;
+
+INSERT INTO users (email, plan, premium_until, created_at)
+SELECT email, plan, premium_until, created_at FROM users_keep;
+
+COMMIT;
+
+DROP TABLE IF EXISTS users_keep;
@@ -0,0 +1,277 @@
+"""Bulk scan ingest for Snowflake: local gzip CSV spool → PUT to internal stage → COPY INTO.
+
+With bulk_ingest = true under [SNOWFLAKE], insert_scan appends the row to a local spool file
+instead of running NEXTVAL + INSERT (two warehouse round trips per check). A scheduled flush
+compresses sealed spool files, stages them and loads them all with one COPY INTO; ids come
+from the scans.id DEFAULT (scans_seq.NEXTVAL). Each spooled row also carries the scan's signals
+(red flags and reasons); after COPY the loader looks up the new ids by (email, ts, msg_hash) and
+links them in scan_signals in the same transaction. insert_scan has no id to return for a
+spooled row, so it returns None; analysis_metrics rows for those scans have scan_id NULL.
+
+Spool files are bucketed per process and minute, so a bucket is sealed once its minute has
+passed and no writer (in any process) still appends to it. Files stay on disk until COPY
+reports them loaded, and COPY's load metadata skips files it already loaded, so a crash
+between load and cleanup does not duplicate rows.
+
+Run the loader:  python -m db.snowflake_ingest --interval 60
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+SPOOL_DIR = Path(__file__).resolve().parent.parent / "spool" / "scans"
+STAGE = "scans_stage"
+COLUMNS = ("email", "ts", "verdict", "confidence", "category", "signals_json", "msg_hash")
+SIGNALS_FIELD = len(COLUMNS)  # spool-only trailing field: [(kind, key, text)] as JSON, not loaded into scans
+LINK_CHUNK = 500  # scans per scan_signals link statement
+BUCKET_FORMAT = "%Y%m%d%H%M"
+
+_lock = threading.Lock()
+
+
+def spool_scan(
+    email: str,
+    verdict: str,
+    confidence: int,
+    category: str,
+    signals_json: str,
+    msg_hash: str,
+    signals: list = None,
+    spool_dir: Path = SPOOL_DIR,
+) -> None:
+    """Append one scan row (and its signals, linked after COPY) to this process's spool file for the current minute."""
+    now = datetime.utcnow()
+    row = (
+        email.strip().lower(),
+        now.strftime("%Y-%m-%d %H:%M:%S"),
+        verdict,
+        int(confidence),
+        category or "",
+        signals_json or "[]",
+        msg_hash or "",
+        json.dumps([list(s) for s in signals or []], ensure_ascii=False),
+    )
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    path = spool_dir / f"scans-{now.strftime(BUCKET_FORMAT)}-{os.getpid()}.csv"
+    with _lock:
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(row)
+
+
+def seal(spool_dir: Path = SPOOL_DIR, now: datetime = None) -> list:
+    """Compress spool files from finished minutes into .csv.gz batches; return all pending batches."""
+    if not spool_dir.is_dir():
+        return []
+    cutoff = ((now or datetime.utcnow()) - timedelta(minutes=1)).strftime(BUCKET_FORMAT)
+    for path in sorted(spool_dir.glob("scans-*.csv")):
+        bucket = path.name.split("-")[1]
+        if bucket >= cutoff:
+            continue  # a writer may still append to this minute
+        gz_path = path.with_name(path.name + ".gz")
+        tmp = gz_path.with_name(gz_path.name + ".tmp")
+        with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, gz_path)
+        path.unlink()
+    return sorted(spool_dir.glob("scans-*.csv.gz"))
+
+
+def _read_rows(path: Path):
+    """Spooled rows as COLUMNS + [signals JSON] (files spooled before signals were added get "[]")."""
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) == len(COLUMNS):
+                yield row + ["[]"]
+            elif len(row) == len(COLUMNS) + 1:
+                yield row
+
+
+def _spooled_signals(paths) -> dict:
+    """{ (email, ts, msg_hash): [(kind, key, text)] } for spooled rows that carry signals."""
+    out = {}
+    for path in paths:
+        for row in _read_rows(path):
+            try:
+                signals = [tuple(s) for s in json.loads(row[SIGNALS_FIELD]) if len(s) == 3]
+            except (TypeError, ValueError):
+                continue
+            if signals:
+                out.setdefault((row[0], row[1], row[6]), signals)
+    return out
+
+
+def _link_loaded(cur, paths, placeholder: str, link_signals, val) -> None:
+    """
+    Link the signals of rows just loaded from paths. Rows are found again by (email, ts, msg_hash)
+    in the batches' ts range; two scans sharing all three are the same message from the same user
+    in the same second, so they get the same signals.
+    """
+    spooled = _spooled_signals(paths)
+    if not spooled:
+        return
+    stamps = [ts for _, ts, _ in spooled]
+    cur.execute(
+        f"SELECT id, email, ts, msg_hash FROM scans WHERE ts >= {placeholder} AND ts <= {placeholder}",
+        (min(stamps), max(stamps)),
+    )
+    links = []
+    for r in cur.fetchall():
+        ts = val(r, "ts", "TS")
+        ts = ts if isinstance(ts, str) else ts.strftime("%Y-%m-%d %H:%M:%S")
+        signals = spooled.get((val(r, "email", "EMAIL"), ts, val(r, "msg_hash", "MSG_HASH") or ""))
+        if signals:
+            links.append((val(r, "id", "ID"), signals))
+    for i in range(0, len(links), LINK_CHUNK):
+        link_signals(cur, links[i:i + LINK_CHUNK])
+
+
+def summarize(paths) -> tuple:
+    """Return (row count, { (date, verdict): n }) for batches, to bump counters and scan_daily."""
+    total, daily = 0, {}
+    for path in paths:
+        for row in _read_rows(path):
+            total += 1
+            key = (row[1][:10], row[2])
+            daily[key] = daily.get(key, 0) + 1
+    return total, daily
+
+
+class SnowflakeStage:
+    """PUT batches to the internal stage and COPY INTO scans in one transaction with the counters."""
+
+    def load(self, paths) -> list:
+        from .snowflake_schema import get_conn
+        from .queries_snowflake import _bump, _link_signals, _val
+
+        names = [p.name for p in paths]
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            for path in paths:
+                cur.execute(f"PUT 'file://{path.resolve().as_posix()}' @{STAGE} AUTO_COMPRESS = FALSE OVERWRITE = TRUE")
+            cur.execute("BEGIN")
+            file_list = ", ".join(["%s"] * len(names))
+            cur.execute(
+                f"""COPY INTO scans ({", ".join(COLUMNS)})
+                    FROM @{STAGE}
+                    FILES = ({file_list})
+                    FILE_FORMAT = (
+                        TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '"' COMPRESSION = GZIP
+                        ERROR_ON_COLUMN_COUNT_MISMATCH = FALSE
+                    )
+                    ON_ERROR = ABORT_STATEMENT
+                    PURGE = TRUE""",
+                names,
+            )
+            loaded, skipped = [], []
+            for r in cur.fetchall():
+                name = os.path.basename(str(_val(r, "file", "FILE")))
+                status = str(_val(r, "status", "STATUS")).upper()
+                if status == "LOADED":
+                    loaded.append(name)
+                elif status == "LOAD_SKIPPED":
+                    skipped.append(name)  # loaded by an earlier run that crashed before cleanup
+            fresh = [p for p in paths if p.name in loaded]
+            total, daily = summarize(fresh)
+            if total:
+                _link_loaded(cur, fresh, "%s", _link_signals, _val)
+                _bump(cur, "scans", total)
+                for (dt, verdict), n in daily.items():
+                    cur.execute(
+                        """MERGE INTO scan_daily d
+                           USING (SELECT %s::DATE AS dt, %s AS verdict, %s AS n) s
+                           ON d.date = s.dt AND d.verdict = s.verdict
+                           WHEN MATCHED THEN UPDATE SET count = d.count + s.n
+                           WHEN NOT MATCHED THEN INSERT (date, verdict, count) VALUES (s.dt, s.verdict, s.n)""",
+                        (dt, verdict, n),
+                    )
+            conn.commit()
+            return loaded + skipped
+        finally:
+            cur.close()
+            conn.close()
+
+
+class LocalStage:
+    """
+    Local stand-in for the internal stage + COPY INTO, backed by SQLite.
+    Copies batches into stage_dir (PUT) and loads them into scans without an id, so ids come
+    from the column default, then links signals and bumps counters in the same transaction (COPY).
+    Remembers loaded file names like Snowflake's load metadata, so reloading is skipped.
+    """
+
+    def __init__(self, stage_dir, conn_factory=None):
+        from ._sqlite_schema import get_conn
+        self.stage_dir = Path(stage_dir)
+        self.conn_factory = conn_factory or get_conn
+        self.load_history = set()
+
+    def load(self, paths) -> list:
+        from .queries_sqlite import _bump, _link_signals
+
+        self.stage_dir.mkdir(parents=True, exist_ok=True)
+        for path in paths:
+            shutil.copyfile(path, self.stage_dir / path.name)
+        staged = [self.stage_dir / p.name for p in paths]
+        fresh = [p for p in staged if p.name not in self.load_history]
+        conn = self.conn_factory()
+        cur = conn.cursor()
+        try:
+            for path in fresh:
+                cur.executemany(
+                    f"INSERT INTO scans ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [row[:SIGNALS_FIELD] for row in _read_rows(path)],
+                )
+            total, daily = summarize(fresh)
+            if total:
+                _link_loaded(cur, fresh, "?", _link_signals, lambda r, k, _: r[k])
+                _bump(cur, "scans", total)
+                for (dt, verdict), n in daily.items():
+                    cur.execute(
+                        """INSERT INTO scan_daily (date, verdict, count) VALUES (?, ?, ?)
+                           ON CONFLICT(date, verdict) DO UPDATE SET count = count + excluded.count""",
+                        (dt, verdict, n),
+                    )
+            conn.commit()
+        finally:
+            conn.close()
+        for path in staged:
+            self.load_history.add(path.name)
+            path.unlink()  # PURGE = TRUE
+        return [p.name for p in staged]
+
+
+def flush(stage=None, spool_dir: Path = SPOOL_DIR, now: datetime = None) -> int:
+    """Seal finished spool files, load them through the stage, delete loaded batches. Returns batch count."""
+    batches = seal(spool_dir, now)
+    if not batches:
+        return 0
+    stage = stage or SnowflakeStage()
+    loaded = set(stage.load(batches))
+    for path in batches:
+        if path.name in loaded:
+            path.unlink()
+    return len(loaded)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load spooled CheckMoYan scans into Snowflake with COPY INTO.")
+    parser.add_argument("--interval", type=int, default=0, help="Seconds between flushes (0 = flush once and exit).")
+    args = parser.parse_args(argv)
+    while True:
+        n = flush()
+        print(f"{datetime.utcnow():%Y-%m-%d %H:%M:%S} loaded {n} batch file(s)")
+        if args.interval <= 0:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 """Snowflake schema and connection. Credentials from .streamlit/secrets.toml [SNOWFLAKE]."""
 import streamlit as st
-from snowflake.connector import DictCursor
 
 
 def _get_config():
@@ -24,6 +23,7 @@ def _get_config():
                 "database": database or "CHECKMOYAN",
                 "schema": schema or "PUBLIC",
                 "role": cfg.get("role") or cfg.get("ROLE"),
+                "bulk_ingest": bool(cfg.get("bulk_ingest") or cfg.get("BULK_INGEST")),
             }
     except Exception:
         pass
@@ -35,13 +35,22 @@ class _SnowflakeConnWrapper:
     def __init__(self, conn):
         self._conn = conn
     def cursor(self):
+        from snowflake.connector import DictCursor
         return self._conn.cursor(DictCursor)
     def commit(self):
         return self._conn.commit()
+    def rollback(self):
+        return self._conn.rollback()
     def close(self):
         return self._conn.close()
 
 
+def bulk_ingest_enabled() -> bool:
+    """True if [SNOWFLAKE] bulk_ingest = true: scans are spooled and loaded with COPY INTO."""
+    cfg = _get_config()
+    return bool(cfg and cfg.get("bulk_ingest"))
+
+
 def get_conn():
     """Return a Snowflake connection (DictCursor). Raises if SNOWFLAKE not in secrets."""
     import snowflake.connector
@@ -97,6 +106,9 @@ def init_db():
         )
     """)
 
+    # Internal stage for bulk scan ingest (db.snowflake_ingest: PUT + COPY INTO)
+    cur.execute("CREATE STAGE IF NOT EXISTS scans_stage")
+
     cur.execute("CREATE SEQUENCE IF NOT EXISTS upgrade_requests_seq START 1 INCREMENT 1")
     cur.execute("""
         CREATE TABLE IF NOT EXISTS upgrade_requests (
@@ -109,9 +121,11 @@ def init_db():
             status VARCHAR(50) NOT NULL DEFAULT 'pending',
             ts TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
             admin_notes VARCHAR(65535),
-            approved_until DATE
+            approved_until DATE,
+            receipt_sha256 VARCHAR(64)
         )
     """)
+    cur.execute("ALTER TABLE upgrade_requests ADD COLUMN IF NOT EXISTS receipt_sha256 VARCHAR(64)")
 
     cur.execute("CREATE SEQUENCE IF NOT EXISTS community_alerts_seq START 1 INCREMENT 1")
     cur.execute("""
@@ -119,9 +133,19 @@ def init_db():
             id INTEGER NOT NULL PRIMARY KEY DEFAULT community_alerts_seq.NEXTVAL,
             category VARCHAR(255) NOT NULL,
             summary VARCHAR(65535),
-            ts TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+            ts TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+            scan_count INTEGER NOT NULL DEFAULT 0,
+            baseline FLOAT,
+            window_start TIMESTAMP_NTZ,
+            window_end TIMESTAMP_NTZ
         )
     """)
+    cur.execute("ALTER TABLE community_alerts ADD COLUMN IF NOT EXISTS scan_count INTEGER NOT NULL DEFAULT 0")
+    cur.execute("ALTER TABLE community_alerts ADD COLUMN IF NOT EXISTS baseline FLOAT")
+    cur.execute("ALTER TABLE community_alerts ADD COLUMN IF NOT EXISTS window_start TIMESTAMP_NTZ")
+    cur.execute("ALTER TABLE community_alerts ADD COLUMN IF NOT EXISTS window_end TIMESTAMP_NTZ")
+    # No indexes in Snowflake: cluster on ts so "newest alerts first" prunes micro-partitions
+    cur.execute("ALTER TABLE community_alerts CLUSTER BY (ts)")
 
     cur.execute("""
         CREATE TABLE IF NOT EXISTS app_settings (
@@ -130,11 +154,89 @@ def init_db():
         )
     """)
 
+    # Partner API keys (api.py): only the SHA-256 of each key is stored
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS api_keys (
+            key_hash VARCHAR(64) PRIMARY KEY,
+            email VARCHAR(255) NOT NULL,
+            label VARCHAR(255),
+            created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+            revoked_at TIMESTAMP_NTZ
+        )
+    """)
+
+    # One row per OpenAI analysis (services.telemetry): tokens, latency, retries, source
+    cur.execute("CREATE SEQUENCE IF NOT EXISTS analysis_metrics_seq START 1 INCREMENT 1")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_metrics (
+            id INTEGER NOT NULL PRIMARY KEY DEFAULT analysis_metrics_seq.NEXTVAL,
+            ts TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+            scan_id INTEGER,
+            model VARCHAR(100),
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            completion_tokens INTEGER NOT NULL DEFAULT 0,
+            cached_tokens INTEGER NOT NULL DEFAULT 0,
+            latency_ms FLOAT NOT NULL DEFAULT 0,
+            retries INTEGER NOT NULL DEFAULT 0,
+            source VARCHAR(50) NOT NULL DEFAULT 'llm'
+        )
+    """)
+
+    # Maintained counters and per-day rollups (Admin → Stats reads these, never COUNT(*) over scans/users)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            name VARCHAR(255) PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS scan_daily (
+            date DATE NOT NULL,
+            verdict VARCHAR(50) NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, verdict)
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS category_hourly (
+            hour TIMESTAMP_NTZ NOT NULL,
+            category VARCHAR(255) NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, category)
+        )
+    """)
+
+    # Interned red flags and reasons, linked to scans (analytics group by signal_id, never parse signals_json)
+    cur.execute("CREATE SEQUENCE IF NOT EXISTS signals_seq START 1 INCREMENT 1")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS signals (
+            id INTEGER NOT NULL PRIMARY KEY DEFAULT signals_seq.NEXTVAL,
+            kind VARCHAR(20) NOT NULL,
+            key VARCHAR(255) NOT NULL,
+            text VARCHAR(255) NOT NULL,
+            UNIQUE (kind, key)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS scan_signals (
+            scan_id INTEGER NOT NULL,
+            signal_id INTEGER NOT NULL,
+            PRIMARY KEY (scan_id, signal_id)
+        ) CLUSTER BY (scan_id)
+    """)
+
     conn.commit()
     _seed_dummy_data(cur)
     conn.commit()
+    cur.execute("SELECT COUNT(*) AS cnt FROM counters")
+    backfill = (_first_value(cur.fetchone()) or 0) == 0
     cur.close()
     conn.close()
+    if backfill:
+        from .queries_snowflake import reconcile_counters
+        reconcile_counters()
 
 
 def _first_value(row):
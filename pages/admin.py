@@ -5,13 +5,25 @@ from services.auth import is_admin_logged_in, check_admin_password
 from services.payments import get_payment_config
 from db.queries import (
     list_upgrade_requests,
-    update_upgrade_request,
+    decide_upgrade_requests,
     set_user_plan,
     ensure_user,
     set_payment_config_in_db,
+    get_counters,
+    get_daily_scan_counts,
+    get_top_signals,
+    revoke_api_keys,
 )
+from db import cache, instrumentation
+from services.counters import last_reconciled_at, reconcile_now
+from services.sketches import rising
+from services.receipts import thumbnail_path
+from services.api_keys import issue_api_key
+from services.telemetry import daily_metrics, summarize
 from db.schema import get_conn
 
+REQUESTS_PER_PAGE = 25
+
 
 def run():
     st.title("🔐 Admin")
@@ -50,12 +62,54 @@ def run():
         st.session_state["admin_logged_in"] = False
         st.rerun()
 
-    tab1, tab2, tab3, tab4 = st.tabs(["Upgrade requests", "Users", "Payment config", "Stats"])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(
+        ["Upgrade requests", "Users", "Payment config", "Stats", "Export", "Performance", "AI cost"]
+    )
 
     with tab1:
         status_filter = st.selectbox("Filter", ["pending", "approved", "rejected", "all"], key="admin_status")
         status = None if status_filter == "all" else status_filter
-        requests = list_upgrade_requests(status=status)
+        counters = get_counters()
+        total = counters.get("upgrade_requests" if status is None else f"upgrade_requests.{status}", 0)
+        pages = max(1, -(-total // REQUESTS_PER_PAGE))
+        page_key = f"admin_req_page_{status_filter}"
+        if st.session_state.get(page_key, 1) > pages:
+            st.session_state[page_key] = pages  # the queue shrank after a decision
+        page = st.number_input(f"Page (of {pages}, {total} requests)", min_value=1, max_value=pages, step=1, key=page_key)
+        requests = list_upgrade_requests(status=status, limit=REQUESTS_PER_PAGE, offset=(page - 1) * REQUESTS_PER_PAGE)
+
+        pending = [req for req in requests if req["status"] == "pending"]
+        if pending:
+            with st.form("admin_bulk_decide"):
+                st.markdown("**Bulk decision (this page)**")
+                labels = {req["id"]: f"#{req['id']} — {req['email']} — {req['plan']}" for req in pending}
+                select_all = st.checkbox("Select all pending on this page", key="admin_bulk_all")
+                # Fresh widget key after each decision so decided ids don't linger as stale selections
+                batch = st.session_state.setdefault("admin_bulk_batch", 0)
+                selected = st.multiselect("Requests", list(labels), format_func=labels.get, key=f"admin_bulk_ids_{batch}")
+                bulk_until = st.text_input("Premium until (YYYY-MM-DD)", key="admin_bulk_until", placeholder="e.g. 2025-12-31")
+                c1, c2 = st.columns(2)
+                approve = c1.form_submit_button("Approve selected")
+                reject = c2.form_submit_button("Reject selected")
+                if approve or reject:
+                    ids = list(labels) if select_all else selected
+                    if not ids:
+                        st.error("Select at least one request.")
+                    else:
+                        decided = decide_upgrade_requests(
+                            ids,
+                            status="approved" if approve else "rejected",
+                            approved_until=(bulk_until or None) if approve else None,
+                        )
+                        st.session_state["admin_bulk_batch"] = batch + 1
+                        st.session_state["admin_bulk_result"] = (
+                            f"{'Approved' if approve else 'Rejected'} {len(decided)} request(s)."
+                            + (f" {len(ids) - len(decided)} were no longer pending." if len(decided) < len(ids) else "")
+                        )
+                        st.rerun()
+        if st.session_state.get("admin_bulk_result"):
+            st.success(st.session_state.pop("admin_bulk_result"))
+
         for req in requests:
             with st.expander(f"#{req['id']} — {req['email']} — {req['plan']} — {req['status']}"):
                 st.write(f"**Method:** {req.get('method')} | **Ref:** {req.get('ref') or '—'} | **TS:** {req.get('ts')}")
@@ -63,27 +117,26 @@ def run():
                 receipt_path = (req.get("receipt_path") or "").strip()
                 if receipt_path and os.path.isfile(receipt_path):
                     st.subheader("Uploaded receipt")
-                    try:
-                        st.image(receipt_path, use_container_width=True)
-                    except Exception:
-                        st.caption(f"File: {receipt_path}")
+                    thumb = thumbnail_path(req["receipt_sha256"]) if req.get("receipt_sha256") else None
+                    if thumb and thumb.is_file():
+                        st.image(str(thumb))
+                    # Originals can be several MB: load only when asked
+                    if st.checkbox("Show full-size receipt", key=f"full_{req['id']}"):
+                        try:
+                            st.image(receipt_path, use_container_width=True)
+                        except Exception:
+                            st.caption(f"File: {receipt_path}")
                 elif receipt_path:
                     st.caption(f"Receipt path (file not found): {receipt_path}")
                 if req["status"] == "pending":
                     st.markdown("---")
                     approved_until = st.text_input("Premium until (YYYY-MM-DD)", key=f"until_{req['id']}", placeholder="e.g. 2025-12-31")
                     if st.button("Approve", key=f"approve_{req['id']}"):
-                        ensure_user(req["email"])
-                        update_upgrade_request(
-                            req["id"],
-                            status="approved",
-                            approved_until=approved_until or None,
-                        )
-                        set_user_plan(req["email"], req["plan"], premium_until=approved_until or None)
+                        decide_upgrade_requests([req["id"]], status="approved", approved_until=approved_until or None)
                         st.success("Approved.")
                         st.rerun()
                     if st.button("Reject", key=f"reject_{req['id']}"):
-                        update_upgrade_request(req["id"], status="rejected")
+                        decide_upgrade_requests([req["id"]], status="rejected")
                         st.rerun()
 
     with tab2:
@@ -113,6 +166,24 @@ def run():
                     )
                     st.success(f"Updated {change_email} to {change_plan}" + (f" until {change_until}" if change_until else "."))
                     st.rerun()
+        st.markdown("---")
+        st.subheader("Partner API keys")
+        st.caption("Active Pro users only. The key is shown once; only its hash is stored.")
+        with st.form("admin_api_key"):
+            key_email = st.text_input("Pro user email", key="admin_key_email", placeholder="partner@example.com")
+            key_label = st.text_input("Label", key="admin_key_label", placeholder="e.g. SMS gateway")
+            c1, c2 = st.columns(2)
+            issue = c1.form_submit_button("Issue key")
+            revoke = c2.form_submit_button("Revoke all keys")
+            if (issue or revoke) and not (key_email or "").strip():
+                st.error("Enter user email.")
+            elif issue:
+                try:
+                    st.code(issue_api_key(key_email, key_label), language=None)
+                except ValueError as e:
+                    st.error(str(e))
+            elif revoke:
+                st.success(f"Revoked {revoke_api_keys(key_email)} key(s).")
 
     with tab3:
         st.subheader("Payment configuration")
@@ -154,12 +225,194 @@ def run():
 
     with tab4:
         st.subheader("Stats")
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) AS n FROM scans")
-        total_scans = cur.fetchone()["n"]
-        cur.execute("SELECT COUNT(*) AS n FROM users")
-        total_users = cur.fetchone()["n"]
-        conn.close()
-        st.metric("Total scans", total_scans)
-        st.metric("Total users", total_users)
+        counters = get_counters()
+        total_users = counters.get("users", 0)
+        requested = counters.get("upgrade_requests", 0)
+        approved = counters.get("upgrade_requests.approved", 0)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total scans", counters.get("scans", 0))
+        col2.metric("Total users", total_users)
+        col3.metric("Paid conversions", approved)
+
+        st.markdown("**Upgrade requests**")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Submitted", requested)
+        col2.metric("Pending", counters.get("upgrade_requests.pending", 0))
+        col3.metric("Rejected", counters.get("upgrade_requests.rejected", 0))
+        col4.metric("Approval rate", f"{approved / requested:.0%}" if requested else "—")
+        st.caption(
+            f"Users → paid conversion: {approved / total_users:.1%}" if total_users else "Users → paid conversion: —"
+        )
+
+        st.markdown("**Scans per day by verdict (last 14 days)**")
+        by_day = {}
+        for r in get_daily_scan_counts(14):
+            by_day.setdefault(r["date"], {"SAFE": 0, "SUSPICIOUS": 0, "SCAM": 0})[r["verdict"]] = r["count"]
+        if by_day:
+            st.bar_chart(
+                {
+                    "date": list(by_day),
+                    "SAFE": [v.get("SAFE", 0) for v in by_day.values()],
+                    "SUSPICIOUS": [v.get("SUSPICIOUS", 0) for v in by_day.values()],
+                    "SCAM": [v.get("SCAM", 0) for v in by_day.values()],
+                },
+                x="date",
+                y=["SAFE", "SUSPICIOUS", "SCAM"],
+            )
+        else:
+            st.caption("No scans in the last 14 days.")
+
+        st.markdown("**Rising right now** (SCAM / SUSPICIOUS, last ~15 min vs the usual rate, all replicas)")
+        col1, col2, col3 = st.columns(3)
+        for col, dimension, title in (
+            (col1, "category", "Categories"),
+            (col2, "red_flag", "Red flags"),
+            (col3, "msg_hash", "Message blasts"),
+        ):
+            with col:
+                st.caption(title)
+                rows = rising(dimension, 10)
+                if rows:
+                    st.dataframe(
+                        [{"key": r["label"], "per hour": r["rate_per_hour"], "usual": r["usual_per_hour"]} for r in rows],
+                        hide_index=True,
+                    )
+                else:
+                    st.caption("Nothing rising.")
+
+        st.markdown("**Top red flags this week**")
+        top_flags = get_top_signals("red_flag", 7, 15)
+        if top_flags:
+            st.dataframe(top_flags, use_container_width=True, hide_index=True)
+        else:
+            st.caption("No red flags recorded in the last 7 days.")
+
+        st.markdown("---")
+        st.caption(f"Counters last reconciled: {last_reconciled_at() or 'never'} (UTC)")
+        if st.button("Reconcile counters now", key="admin_reconcile"):
+            reconcile_now()
+            st.success("Counters reconciled.")
+            st.rerun()
+
+    with tab5:
+        st.subheader("Export for offline analytics")
+        st.caption("Streams rows in chunks into a columnar file. For scheduled incremental exports use `python -m services.export`.")
+        col1, col2 = st.columns(2)
+        with col1:
+            export_tbl = st.selectbox("Table", ["scans", "usage"], key="admin_export_table")
+            export_fmt = st.selectbox("Format", ["parquet", "arrow"], key="admin_export_format")
+        with col2:
+            since_label = "Export scans with id greater than" if export_tbl == "scans" else "Export days after (YYYY-MM-DD)"
+            export_since = st.text_input(since_label, key="admin_export_since", placeholder="leave empty for all")
+        if st.button("Build export", key="admin_export_build"):
+            from services.export import export_table, new_download_path  # pyarrow loads only when an export runs
+            previous = st.session_state.pop("admin_export_file", None)
+            if previous and os.path.exists(previous[1]):
+                os.remove(previous[1])
+            out_path = str(new_download_path(export_tbl, export_fmt))
+            try:
+                result = export_table(export_tbl, out_path, fmt=export_fmt, since=export_since.strip() or None)
+                # Only the path lives in session state; the file is read when the button is sent
+                st.session_state["admin_export_file"] = (f"{export_tbl}.{export_fmt}", out_path, result)
+            except ValueError as e:
+                if os.path.exists(out_path):
+                    os.remove(out_path)
+                st.error(str(e))
+            except BaseException:
+                if os.path.exists(out_path):
+                    os.remove(out_path)
+                raise
+        built = st.session_state.get("admin_export_file")
+        if built and os.path.exists(built[1]):
+            from services.export import MAX_DOWNLOAD_BYTES
+            name, path, result = built
+            size = os.path.getsize(path)
+            st.caption(f"{result['rows']} rows · {size / 1e6:.1f} MB · high-water mark: {result['high_water_mark'] or '—'}")
+            if size > MAX_DOWNLOAD_BYTES:
+                # download_button holds the whole file in this process' memory
+                st.warning(
+                    f"Too large to download here (limit {MAX_DOWNLOAD_BYTES / 1e6:.0f} MB). It was written to "
+                    f"`{path}` on the server (deleted after an hour); use `python -m services.export` instead."
+                )
+            else:
+                with open(path, "rb") as f:
+                    st.download_button("Download", data=f, file_name=name, key="admin_export_download")
+
+    with tab6:
+        st.subheader("Query performance (this server process)")
+        st.caption("Every db.queries call that reaches the database, by function, backend and page. Cache hits are not counted.")
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            threshold = st.number_input(
+                "Slow-query threshold (ms)",
+                min_value=1,
+                value=int(instrumentation.get_slow_threshold_ms()),
+                key="admin_slow_ms",
+            )
+            if threshold != int(instrumentation.get_slow_threshold_ms()):
+                instrumentation.set_slow_threshold_ms(threshold)
+        with col2:
+            if st.button("Reset stats", key="admin_perf_reset"):
+                instrumentation.reset()
+                st.rerun()
+        stats = instrumentation.snapshot()
+        if stats:
+            st.dataframe(
+                [{k: v for k, v in r.items() if k != "histogram"} for r in stats],
+                use_container_width=True,
+                hide_index=True,
+            )
+            names = [f"{r['function']} · {r['backend']} · {r['page']}" for r in stats]
+            pick = st.selectbox("Latency histogram", names, key="admin_perf_hist")
+            hist = stats[names.index(pick)]["histogram"]
+            st.bar_chart({"bucket": list(hist), "calls": list(hist.values())}, x="bucket", y="calls")
+        else:
+            st.caption("No queries recorded yet.")
+        st.markdown("**Query cache**")
+        cache_stats = cache.stats()
+        if cache_stats:
+            st.dataframe(cache_stats, use_container_width=True, hide_index=True)
+        if st.button("Clear query cache", key="admin_cache_clear"):
+            cache.clear()
+            st.rerun()
+        st.markdown("**Slow queries**")
+        slow = instrumentation.slow_queries()
+        if slow:
+            st.dataframe(slow, use_container_width=True, hide_index=True)
+        else:
+            st.caption("None over the threshold.")
+
+    with tab7:
+        st.subheader("AI cost and latency")
+        st.caption("One row per OpenAI analysis (analysis_metrics). Cost uses services.telemetry.MODEL_PRICES.")
+        days = st.selectbox("Days", [7, 14, 30], index=1, key="admin_cost_days")
+        rows = daily_metrics(days)
+        if not rows:
+            st.caption("No analyses recorded yet.")
+        else:
+            total = summarize(rows)
+            c1, c2, c3, c4, c5 = st.columns(5)
+            c1.metric("Analyses", f"{total['calls']:,}", help=f"{total['cache_hits']:,} served from the verdict cache")
+            c2.metric("Cost (USD)", f"${total['cost_usd']:,.2f}")
+            c3.metric("Cost per analysis", f"${total['cost_per_call_usd']:.5f}")
+            c4.metric("Local tier", f"{total['local_hit_rate']:.1%}", help="Live checks answered by the local classifier")
+            c5.metric("Errors", f"{total['error_rate']:.1%}", help=f"{total['retries']} retries")
+            by_day = {}
+            for r in rows:
+                by_day[r["day"]] = by_day.get(r["day"], 0.0) + r["cost_usd"]
+            st.markdown("**Cost per day (USD)**")
+            st.bar_chart({"day": list(by_day), "cost_usd": list(by_day.values())}, x="day", y="cost_usd")
+            live = [r for r in rows if r["source"] == "llm"]
+            if live:
+                st.markdown("**Latency per day, live checks (ms)**")
+                st.line_chart(
+                    {
+                        "day": [r["day"] for r in live],
+                        "p50": [r["p50_ms"] for r in live],
+                        "p95": [r["p95_ms"] for r in live],
+                        "p99": [r["p99_ms"] for r in live],
+                    },
+                    x="day",
+                    y=["p50", "p95", "p99"],
+                )
+            st.dataframe(rows, use_container_width=True, hide_index=True)
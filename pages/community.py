@@ -1,8 +1,8 @@
 """Community Alerts (Trending Scams): enhanced background, readable theme cards, scam details."""
 import html
 import streamlit as st
-from db.queries import get_trending_categories
-from db.schema import get_conn
+from db.queries import get_trending_categories, list_community_alerts
+from services.taxonomy import canonical_category, category_detail
 from components.theme import ALERT_RED, BG_CARD, RADIUS, TEXT_MUTED, TEXT_PRIMARY
 
 # Readable text and enhanced Community Alerts background
@@ -11,19 +11,6 @@ CARD_LABEL = "#f1f5f9"
 PAGE_BG = "linear-gradient(180deg, #1e3a5f 0%, #0f172a 40%, #0c1222 100%)"
 CARD_BG = "#334155"
 
-# Short descriptions for common scam types (safe for display)
-SCAM_DETAILS = {
-    "gcash phishing": "Fake GCash links, OTP requests, or \"verify account\" messages. Never share OTP or click links from SMS.",
-    "fake job offer": "Too-good job posts, upfront fees, or \"training\" payments. Real employers don’t ask for money.",
-    "loan scam": "Instant loans with high fees, or \"processing\" charges before release. Use licensed lenders only.",
-    "romance scam": "Fake relationships leading to money requests or \"emergency\" help. Be wary of strangers asking for cash.",
-    "investment scam": "Guaranteed returns, crypto or \"exclusive\" deals. If it’s too good to be true, it usually is.",
-    "sss/philhealth impersonation": "Fake SSS/PhilHealth links or \"benefits\" forms. Use only official sites and hotlines.",
-    "bank otp scam": "Calls or SMS pretending to be your bank asking for OTP or card details. Banks never ask for OTP.",
-    "maya phishing": "Fake Maya app links or \"verify\" messages. Don’t click links; open the app directly.",
-    "unknown": "Other suspicious patterns. When in doubt, don’t click links or send money.",
-}
-
 
 def _esc(s):
     """Escape for HTML to prevent injection and stray tags."""
@@ -32,34 +19,6 @@ def _esc(s):
     return html.escape(str(s).strip())
 
 
-def _row_cat(row):
-    """Get category from row (dict or tuple from SQLite/Snowflake)."""
-    if hasattr(row, "get"):
-        return (row.get("category") or row.get("CATEGORY") or "")
-    try:
-        return (row[0] if len(row) > 0 else "")
-    except (IndexError, TypeError):
-        return ""
-
-
-def _row_summary(row):
-    if hasattr(row, "get"):
-        return (row.get("summary") or row.get("SUMMARY") or "")
-    try:
-        return (row[1] if len(row) > 1 else "")
-    except (IndexError, TypeError):
-        return ""
-
-
-def _row_ts(row):
-    if hasattr(row, "get"):
-        return (row.get("ts") or row.get("TS") or "")
-    try:
-        return (row[2] if len(row) > 2 else "")
-    except (IndexError, TypeError):
-        return ""
-
-
 def run():
     st.markdown(
         f"""
@@ -85,9 +44,9 @@ def run():
 
     st.subheader("Trending scams this week")
     for r in trending:
-        cat = (r.get("category") or r.get("CATEGORY") or "Unknown").strip()
+        cat = canonical_category((r.get("category") or r.get("CATEGORY") or "Unknown").strip())
         count = r.get("count") or r.get("COUNT") or 0
-        detail = SCAM_DETAILS.get(cat.lower(), SCAM_DETAILS.get("unknown", "Stay alert. Don’t share OTP or send money to strangers."))
+        detail = category_detail(cat)
         st.markdown(
             f"""
             <div style="
@@ -107,15 +66,11 @@ def run():
     st.markdown("---")
     st.subheader("Recent alerts")
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT category, summary, ts FROM community_alerts ORDER BY ts DESC LIMIT 10")
-        rows = cur.fetchall()
-        conn.close()
+        rows = list_community_alerts(10)
         for row in rows:
-            cat = _esc(_row_cat(row))
-            summary = _esc(_row_summary(row))
-            ts = _esc(str(_row_ts(row)))
+            cat = _esc(row["category"])
+            summary = _esc(row["summary"])
+            ts = _esc(str(row["ts"]))
             st.markdown(
                 f"""
                 <div style="
@@ -2,7 +2,8 @@
 import streamlit as st
 from services.payments import get_payment_config, get_plans_config
 from services.auth import get_email_from_session, validate_email
-from db.queries import insert_upgrade_request, ensure_user
+from services.receipts import save_receipt
+from db.queries import insert_upgrade_request, ensure_user, find_upgrade_request_by_receipt
 from components.theme import ALERT_RED, BG_CARD, RADIUS, TEXT_MUTED, TEXT_PRIMARY
 
 
@@ -57,20 +58,24 @@ def _render_payment_section(pay, show_full_numbers: bool):
             st.error("Please enter a valid email.")
         else:
             ensure_user(email)
-            receipt_path = ""
+            receipt_path, receipt_sha256 = "", None
             if receipt_file:
-                import os
-                os.makedirs("receipts", exist_ok=True)
-                path = os.path.join("receipts", f"{email.replace('@', '_')}_{plan}_{receipt_file.name}")
-                with open(path, "wb") as f:
-                    f.write(receipt_file.getvalue())
-                receipt_path = path
+                stored = save_receipt(receipt_file, receipt_file.name)
+                earlier = find_upgrade_request_by_receipt(stored["sha256"], email)
+                if earlier and earlier["email"] == email.strip().lower():
+                    st.info(f"You already submitted this receipt with request #{earlier['id']} ({earlier['status']}).")
+                    return
+                if earlier:
+                    st.error(f"This receipt was already submitted with request #{earlier['id']}. Please upload your own receipt.")
+                    return
+                receipt_path, receipt_sha256 = stored["path"], stored["sha256"]
             rid = insert_upgrade_request(
                 email=email.strip().lower(),
                 plan=plan,
                 method=method,
                 ref=ref or "",
                 receipt_path=receipt_path,
+                receipt_sha256=receipt_sha256,
             )
             st.success(f"Request #{rid} submitted. We'll verify and activate your plan soon.")
 
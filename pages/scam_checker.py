@@ -2,13 +2,93 @@
 import streamlit as st
 import json
 from services.auth import get_email_from_session, set_email_session, validate_email
-from services.usage import can_user_check, get_daily_limit, get_usage_today, record_check
-from services.analysis import analyze_message
+from services.usage import get_daily_limit, get_usage_today, record_check, release_check, reserve_check
+from services.jobs import submit_analysis, get_job, cancel, forget, JobQueueFull, DONE, FAILED, CANCELLED
+from services.analysis import DEADLINE_SECONDS, get_final_verdict
+from services.demo_verdicts import demo_verdict, find_sample, submit_fill
 from components.verdict import verdict_card, share_snippet
 from components.ui import primary_cta, toast_success, toast_error
 from components.theme import ALERT_RED, BG_CARD, BORDER_ACCENT, RADIUS, TEXT_MUTED, TEXT_PRIMARY
 from db.queries import ensure_user
 
+POLL_SECONDS = 1.0
+
+
+def _fragment(run_every):
+    """st.fragment(run_every=...) where available (Streamlit >= 1.37); else render once and poll by rerun."""
+    frag = getattr(st, "fragment", None)
+    if frag is None:
+        return lambda f: f
+    return frag(run_every=run_every)
+
+
+def _record_result(email: str, result: dict) -> None:
+    """Runs in the analysis worker: store the scan (no raw message). The check was counted at submit."""
+    if result.get("upgrade_pending"):
+        return  # stored once, from on_final, when the LLM verdict arrives
+    record_check(
+        email=email,
+        verdict=result.get("verdict", "SUSPICIOUS"),
+        confidence=result.get("confidence", 0),
+        category=result.get("category", ""),
+        signals_json=json.dumps(result.get("reasons", [])[:3]),
+        msg_hash=result.get("msg_hash", ""),
+        metrics=result.get("metrics"),
+        red_flags=result.get("red_flags"),
+        reasons=result.get("reasons"),
+        count_usage=False,
+    )
+
+
+@_fragment(run_every=POLL_SECONDS)
+def _analysis_progress():
+    """Poll the background analysis job; on completion store the verdict and rerun the page."""
+    job_id = st.session_state.get("analysis_job")
+    if not job_id:
+        return
+    job = get_job(job_id)
+    if job is None or job["status"] in (DONE, FAILED, CANCELLED):
+        st.session_state.pop("analysis_job", None)
+        forget(job_id)
+        if job and job["status"] == DONE:
+            st.session_state["last_result"] = job["result"]
+            if job["result"].get("upgrade_pending"):
+                st.session_state["pending_upgrade"] = job["result"]["msg_hash"]
+        elif job and job["status"] == FAILED:
+            st.session_state["analysis_error"] = job["error"] or "Analysis failed. Please try again."
+        st.rerun()
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.info(f"⏳ Analyzing with AI (OpenAI)... {job['elapsed']:.0f}s — you can keep browsing, the result will be here.")
+    with col2:
+        if st.button("Cancel", key="scam_cancel", use_container_width=True):
+            cancel(job_id)
+            st.session_state.pop("analysis_job", None)
+            forget(job_id)
+            st.rerun()
+    if getattr(st, "fragment", None) is None:
+        import time
+        time.sleep(POLL_SECONDS)
+        st.rerun()
+
+
+@_fragment(run_every=POLL_SECONDS)
+def _upgrade_progress():
+    """Poll for the LLM verdict that replaces a provisional one; swap it in when it arrives."""
+    msg_hash = st.session_state.get("pending_upgrade")
+    if not msg_hash:
+        return
+    final = get_final_verdict(msg_hash)
+    if final is not None:
+        st.session_state.pop("pending_upgrade", None)
+        st.session_state["last_result"] = final
+        st.rerun()
+    st.caption("⏳ Full AI analysis still running — the verdict below will update automatically.")
+    if getattr(st, "fragment", None) is None:
+        import time
+        time.sleep(POLL_SECONDS)
+        st.rerun()
+
 
 def run():
     # Pre-fill from landing "Try this message" demo
@@ -65,39 +145,63 @@ def run():
         key="scam_learning",
     )
 
-    if primary_cta("CheckMoYan", key="scam_analyze"):
+    in_progress = bool(st.session_state.get("analysis_job"))
+    if primary_cta("CheckMoYan", key="scam_analyze") and not in_progress:
+        try:
+            api_key = (st.secrets.get("OPENAI_API_KEY") or "").strip()
+        except Exception:
+            api_key = ""
+        sample = find_sample(message) if message and message.strip() else None
+        demo = demo_verdict(message) if sample is not None else None
         if not message or not message.strip():
             toast_error("Please paste a message to check.")
+        elif demo is not None:
+            # Landing-page sample: stored verdict (analyzed once per prompt version), no daily check used
+            st.session_state["last_result"] = demo
+            st.session_state.pop("pending_upgrade", None)
+        elif not api_key:
+            toast_error("OpenAI API key not configured. Add OPENAI_API_KEY to .streamlit/secrets.toml.")
+        elif sample is not None:
+            # Sample with no stored verdict yet: analyze it in the background, still no daily check used
+            try:
+                st.session_state["analysis_job"] = submit_fill(message, api_key)
+            except JobQueueFull as e:
+                toast_error(str(e))
+            else:
+                st.session_state.pop("last_result", None)
+                st.session_state.pop("pending_upgrade", None)
+                st.rerun()
         else:
-            can_do, err = can_user_check(email)
-            if not can_do:
+            # Count the check now, so parallel sessions can't all start checks past the limit
+            reservation, err = reserve_check(email)
+            if not reservation:
                 toast_error(err)
             else:
                 try:
-                    api_key = (st.secrets.get("OPENAI_API_KEY") or "").strip()
-                except Exception:
-                    api_key = ""
-                if not api_key:
-                    toast_error("OpenAI API key not configured. Add OPENAI_API_KEY to .streamlit/secrets.toml.")
-                else:
-                    with st.spinner("Analyzing with AI (OpenAI)..."):
-                        result = analyze_message(
-                            message.strip(),
-                            channel=channel or "",
-                            language=language or "",
-                            api_key=api_key,
-                        )
-                    record_check(
+                    st.session_state["analysis_job"] = submit_analysis(
+                        message.strip(),
+                        channel=channel or "",
+                        language=language or "",
+                        api_key=api_key,
+                        on_result=lambda result, email=email: _record_result(email, result),
                         email=email,
-                        verdict=result.get("verdict", "SUSPICIOUS"),
-                        confidence=result.get("confidence", 0),
-                        category=result.get("category", ""),
-                        signals_json=json.dumps(result.get("reasons", [])[:3]),
-                        msg_hash=result.get("msg_hash", ""),
+                        deadline_seconds=DEADLINE_SECONDS,
+                        on_final=lambda result, email=email: _record_result(email, result),
+                        on_abort=lambda email=email, reservation=reservation: release_check(email, reservation),
                     )
-                    st.session_state["last_result"] = result
+                except JobQueueFull as e:
+                    release_check(email, reservation)
+                    toast_error(str(e))
+                else:
+                    st.session_state.pop("last_result", None)
+                    st.session_state.pop("pending_upgrade", None)
                     st.rerun()
 
+    if st.session_state.get("analysis_job"):
+        _analysis_progress()
+    if st.session_state.get("analysis_error"):
+        toast_error(st.session_state.pop("analysis_error"))
+
     if st.session_state.get("last_result"):
         st.markdown("---")
         st.markdown(
@@ -105,6 +209,12 @@ def run():
             unsafe_allow_html=True,
         )
         st.subheader("Verdict")
+        if st.session_state.get("pending_upgrade"):
+            _upgrade_progress()
+        if st.session_state["last_result"].get("demo"):
+            st.caption("Sample message: stored verdict, doesn't use your daily checks.")
+        if st.session_state["last_result"].get("provisional"):
+            st.warning("Provisional verdict from a quick check of keywords and links, not the full AI analysis.")
         verdict_card(st.session_state["last_result"])
 
     st.markdown("---")
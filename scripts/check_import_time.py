@@ -0,0 +1,82 @@
+"""Cold-start import budget: fails (exit 1) when app startup imports get slower or pull in heavy deps.
+
+Runs the modules app.py imports before the first render in a fresh interpreter under
+`python -X importtime`, sums their cumulative import time, and checks that none of the heavy
+optional dependencies (openai, httpx, snowflake.connector, pyarrow, duckdb) were loaded.
+Every autoscaled replica pays this cost, so run it in CI:
+
+    python scripts/check_import_time.py --budget-ms 1500
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What app.py imports before routing to the landing page
+STARTUP_MODULES = [
+    "db.schema",
+    "db.instrumentation",
+    "services.auth",
+    "services.public_stats",
+    "components.nav",
+    "components.theme",
+    "pages.landing",
+]
+
+# Must only load on first use (analysis call, Snowflake backend, export, DuckDB side-car)
+HEAVY_MODULES = ["openai", "httpx", "snowflake.connector", "pyarrow", "duckdb"]
+
+
+def measure(modules: list) -> tuple:
+    """Return (total cumulative ms of the top-level imports, { imported module: cumulative ms })."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import failed:\n{proc.stderr[-2000:]}")
+    imported, total_us = {}, 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, raw_name = line[len("import time:"):].split("|")
+        name = raw_name.strip()
+        imported[name] = int(cumulative) / 1000.0
+        if len(raw_name) - len(raw_name.lstrip()) == 1:  # top level: cumulative includes its children
+            total_us += int(cumulative)
+    return total_us / 1000.0, imported
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check CheckMoYan cold-start import time budget.")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", "1500")))
+    parser.add_argument("--runs", type=int, default=3, help="Take the fastest of N runs to reduce noise.")
+    args = parser.parse_args(argv)
+
+    best, imported = None, {}
+    for _ in range(max(1, args.runs)):
+        total, imported = measure(STARTUP_MODULES)
+        best = total if best is None else min(best, total)
+
+    failures = []
+    heavy = [m for m in HEAVY_MODULES if m in imported]
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    if best > args.budget_ms:
+        failures.append(f"startup imports took {best:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    slowest = sorted(imported.items(), key=lambda kv: kv[1], reverse=True)[:10]
+    print(f"startup imports: {best:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, ms in slowest:
+        print(f"  {ms:8.1f} ms  {name}")
+    for f in failures:
+        print(f"FAIL: {f}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,28 @@
 # CheckMoYan services
-from .analysis import analyze_message
-from .auth import get_email_from_session, set_email_session, is_admin_logged_in, check_admin_password
-from .usage import get_daily_limit, can_user_check, record_check
-from .payments import get_payment_config, get_plans_config
+# Exports load their submodule on first access (PEP 562), so `import services.auth` does not
+# pull in openai/httpx through services.analysis. Cold start only pays for what a page uses.
+import importlib
 
-__all__ = [
-    "analyze_message",
-    "get_email_from_session",
-    "set_email_session",
-    "is_admin_logged_in",
-    "check_admin_password",
-    "get_daily_limit",
-    "can_user_check",
-    "record_check",
-    "get_payment_config",
-    "get_plans_config",
-]
+_EXPORTS = {
+    "analyze_message": "analysis",
+    "get_email_from_session": "auth",
+    "set_email_session": "auth",
+    "is_admin_logged_in": "auth",
+    "check_admin_password": "auth",
+    "get_daily_limit": "usage",
+    "can_user_check": "usage",
+    "record_check": "usage",
+    "get_payment_config": "payments",
+    "get_plans_config": "payments",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
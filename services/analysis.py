@@ -1,10 +1,41 @@
-"""OpenAI-based scam analysis. API key from .streamlit/secrets.toml (OPENAI_API_KEY)."""
+"""OpenAI-based scam analysis. API key from .streamlit/secrets.toml (OPENAI_API_KEY).
+
+A cascade: the local classifier (services.classifier) answers confident SAFE / SCAM cases in
+milliseconds, and only the uncertain middle band goes to the LLM. metrics.source records
+which tier answered ("local" or "llm"), so Admin → AI cost shows each tier's hit rate.
+When the LLM is slow (deadline_seconds) or fails, a provisional verdict from keyword and link
+heuristics (services.heuristics) is returned instead of making the user wait or guess.
+
+openai and httpx are imported on the first analysis, not at module import (cold start).
+"""
 import json
 import os
 import re
-import hashlib
-import httpx
-from openai import OpenAI
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from services.taxonomy import CATEGORIES, canonical_category
+
+MODEL = "gpt-4o-mini"
+MAX_COMPLETION_TOKENS = 1000
+MAX_RETRIES = 2
+
+# Tier 1 (services.classifier) answers without the LLM when its posterior reaches these
+LOCAL_SCAM_THRESHOLD = float(os.environ.get("CHECKMOYAN_LOCAL_SCAM_THRESHOLD", "0.97"))
+LOCAL_SAFE_THRESHOLD = float(os.environ.get("CHECKMOYAN_LOCAL_SAFE_THRESHOLD", "0.97"))
+
+# Latency SLO for interactive checks (analyze_message(deadline_seconds=...)); slower LLM answers arrive later
+DEADLINE_SECONDS = float(os.environ.get("CHECKMOYAN_ANALYSIS_DEADLINE_SECONDS", "8"))
+BACKGROUND_WORKERS = int(os.environ.get("CHECKMOYAN_ANALYSIS_BACKGROUND_WORKERS", "8"))
+# LLM calls allowed in the background pool at once (running + queued). When full, a deadline call
+# runs inline and is waited for, so work past the deadline never escapes the scheduler's bounds
+BACKGROUND_MAX_INFLIGHT = int(os.environ.get("CHECKMOYAN_ANALYSIS_BACKGROUND_MAX_INFLIGHT", str(2 * BACKGROUND_WORKERS)))
+FINAL_CACHE_SIZE = 1000
+
+_final_verdicts = {}  # msg_hash -> LLM verdict that upgraded a provisional one (oldest first)
+_final_lock = threading.Lock()
+_executor = {"pool": None}
+_inflight = threading.BoundedSemaphore(BACKGROUND_MAX_INFLIGHT)
 
 SYSTEM_PROMPT = """You are a scam and spam analyst for the Philippines. Your job is to classify messages (SMS, Messenger, Email, or call scripts) into: SAFE, SUSPICIOUS, or SCAM.
 
@@ -30,19 +61,19 @@ Output JSON schema (use exactly these keys):
 {
   "verdict": "SAFE" | "SUSPICIOUS" | "SCAM",
   "confidence": <0-100 integer>,
-  "category": "<short label, e.g. GCash phishing, Fake job offer, Loan scam, Romance scam, Investment scam, Bank OTP scam, SSS/PhilHealth impersonation, Maya phishing, or Unknown>",
+  "category": "<one of: __CATEGORIES__>",
   "reasons": ["reason 1", "reason 2", ...],
   "recommended_actions": ["action 1", "action 2", ...],
   "warning_message": "<short shareable warning text for friends, 1-2 sentences>",
   "red_flags": ["flag 1", "flag 2", ...],
   "safety_notes": "<optional brief note>"
-}"""
+}""".replace("__CATEGORIES__", ", ".join(c["name"] for c in CATEGORIES if c["id"]) + ", or Unknown")
 
 
 def _hash_message(text: str) -> str:
-    """Return SHA256 hex digest of normalized message (no raw storage)."""
-    normalized = (text or "").strip().lower()
-    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    """Versioned hash of the canonical message (services.canonical); no raw storage."""
+    from services.canonical import message_key
+    return message_key(text)
 
 
 def _sanitize(text: str) -> str:
@@ -89,6 +120,7 @@ def _parse_response(raw: str) -> dict:
     category = data.get("category") or "Unknown"
     if not isinstance(category, str):
         category = "Unknown"
+    category = canonical_category(category)
     reasons = data.get("reasons")
     if not isinstance(reasons, list):
         reasons = fallback["reasons"]
@@ -119,15 +151,113 @@ def _parse_response(raw: str) -> dict:
     }
 
 
+def classify_local(message: str) -> dict | None:
+    """Tier 1: the local classifier's verdict if it is confident enough, else None (ask the LLM)."""
+    msg = _sanitize(message)
+    if not msg:
+        return None
+    started = time.perf_counter()
+    try:
+        from services.classifier import predict
+        pred = predict(msg)
+    except Exception:
+        return None  # unreadable model: fall through to the LLM
+    threshold = {"SCAM": LOCAL_SCAM_THRESHOLD, "SAFE": LOCAL_SAFE_THRESHOLD}.get(pred["verdict"]) if pred else None
+    if threshold is None or pred["probability"] < threshold:
+        return None
+    confidence = min(99, int(round(pred["probability"] * 100)))
+    words = ", ".join(pred["top_words"])
+    if pred["verdict"] == "SCAM":
+        category = canonical_category(pred["category"])
+        known = f"known {category} messages" if category != "Unknown" else "known scam messages"
+        result = {
+            "verdict": "SCAM",
+            "confidence": confidence,
+            "category": category,
+            "reasons": [f"Closely matches {known}."] + ([f"Typical wording: {words}."] if words else []),
+            "recommended_actions": [
+                "Do not click links or reply.",
+                "Do not share OTP or personal details.",
+                "Contact the official company/bank via their verified website or hotline.",
+            ],
+            "warning_message": "This matches a common scam pattern. Do not engage.",
+            "red_flags": pred["top_words"],
+        }
+    else:
+        result = {
+            "verdict": "SAFE",
+            "confidence": confidence,
+            "category": "",  # SAFE results are not a scam type and stay out of trending
+            "reasons": ["No common scam patterns found."] + ([f"Typical wording of legitimate messages: {words}."] if words else []),
+            "recommended_actions": ["If unsure, verify through official channels."],
+            "warning_message": "This looks legitimate.",
+            "red_flags": [],
+        }
+    result["safety_notes"] = "Quick verdict from CheckMoYan's local classifier (no AI call)."
+    result["msg_hash"] = _hash_message(msg)
+    result["metrics"] = {
+        "model": "local-nb",
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "retries": 0,
+        "source": "local",
+    }
+    return result
+
+
+def provisional_verdict(msg: str, reason: str) -> dict:
+    """services.heuristics verdict for msg, marked provisional, with reason as the first line."""
+    from services.heuristics import heuristic_verdict
+    result = heuristic_verdict(msg)
+    result["reasons"] = [reason] + result["reasons"]
+    result["safety_notes"] = f"Provisional: {result['safety_notes']}"
+    result["provisional"] = True
+    result["msg_hash"] = _hash_message(msg)
+    return result
+
+
+def get_final_verdict(msg_hash: str) -> dict | None:
+    """The LLM verdict that replaced a provisional one for msg_hash, once it has arrived."""
+    with _final_lock:
+        return _final_verdicts.get(msg_hash)
+
+
+def _store_final(msg_hash: str, result: dict) -> None:
+    with _final_lock:
+        _final_verdicts.pop(msg_hash, None)
+        _final_verdicts[msg_hash] = result
+        while len(_final_verdicts) > FINAL_CACHE_SIZE:
+            _final_verdicts.pop(next(iter(_final_verdicts)))
+
+
+def _background() -> ThreadPoolExecutor:
+    with _final_lock:
+        if _executor["pool"] is None:
+            _executor["pool"] = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="analysis-llm")
+        return _executor["pool"]
+
+
 def analyze_message(
     message: str,
     channel: str = "",
     language: str = "",
     api_key: str = None,
+    use_local: bool = True,
+    deadline_seconds: float = None,
+    on_final=None,
 ) -> dict:
     """
-    Call OpenAI to analyze message. Returns parsed dict with verdict, confidence, category, reasons, etc.
-    Also returns msg_hash for storage (no raw message stored).
+    Analyze message: the local classifier first (unless use_local=False), OpenAI for uncertain cases.
+    Returns parsed dict with verdict, confidence, category, reasons, etc. Also returns msg_hash for
+    storage (no raw message stored) and, when a tier answered, metrics:
+    { model, prompt_tokens, completion_tokens, cached_tokens, latency_ms, retries, source }.
+
+    With deadline_seconds, an LLM answer that takes longer is not waited for: the heuristic verdict
+    comes back with provisional=True and upgrade_pending=True (and no metrics), the call finishes in
+    the background, and its result goes to get_final_verdict(msg_hash) and on_final(result). While
+    BACKGROUND_MAX_INFLIGHT calls are already in the background, the deadline is not applied.
     """
     msg = _sanitize(message)
     if not msg:
@@ -142,6 +272,10 @@ def analyze_message(
             "safety_notes": "",
             "msg_hash": "",
         }
+    if use_local:
+        local = classify_local(msg)
+        if local is not None:
+            return local
     user_content = f"Message to analyze:\n\n{msg}"
     if channel:
         user_content += f"\n\nChannel: {channel}"
@@ -161,41 +295,92 @@ def analyze_message(
             "safety_notes": "",
             "msg_hash": _hash_message(msg),
         }
+    if deadline_seconds is None or not _inflight.acquire(blocking=False):
+        return _llm_verdict(msg, user_content, api_key)
+
+    future = _background().submit(_llm_verdict, msg, user_content, api_key)
+    future.add_done_callback(lambda f: _inflight.release())
+    try:
+        return future.result(timeout=max(0.0, deadline_seconds))
+    except FutureTimeout:
+        pass
+    result = provisional_verdict(msg, "AI analysis is taking longer than usual; this quick check will be replaced when it finishes.")
+    result["upgrade_pending"] = True
+    msg_hash = result["msg_hash"]
 
+    def _upgrade(f):
+        final = f.result()  # _llm_verdict reports errors in its result, it doesn't raise
+        _store_final(msg_hash, final)
+        if on_final is not None:
+            on_final(final)
+
+    future.add_done_callback(_upgrade)
+    return result
+
+
+def _llm_verdict(msg: str, user_content: str, api_key: str) -> dict:
+    """One LLM analysis with counted retries. On failure, the provisional heuristic verdict (source "error")."""
+    started = time.perf_counter()
+    metrics = {
+        "model": MODEL,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "latency_ms": 0.0,
+        "retries": 0,
+        "source": "llm",
+    }
     try:
         # Avoid "proxies" argument error: unset proxy env so OpenAI/httpx don't pass proxies
         saved = {}
         for k in ("HTTP_PROXY", "HTTPS_PROXY", "http_proxy", "https_proxy"):
             saved[k] = os.environ.pop(k, None)
         try:
+            import httpx
+            import openai
+            from openai import OpenAI
+
             http_client = httpx.Client()
-            client = OpenAI(api_key=api_key, http_client=http_client)
-            resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_content},
-                ],
-                temperature=0.2,
-                max_tokens=1000,
-            )
+            # Retry here rather than in the client so every retry is counted in the metrics
+            client = OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+            retryable = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    resp = client.chat.completions.create(
+                        model=MODEL,
+                        messages=[
+                            {"role": "system", "content": SYSTEM_PROMPT},
+                            {"role": "user", "content": user_content},
+                        ],
+                        temperature=0.2,
+                        max_tokens=MAX_COMPLETION_TOKENS,
+                    )
+                    break
+                except retryable:
+                    if attempt == MAX_RETRIES:
+                        raise
+                    metrics["retries"] = attempt + 1
+                    time.sleep(0.5 * 2 ** attempt)
             raw = (resp.choices[0].message.content or "").strip()
             result = _parse_response(raw)
             result["msg_hash"] = _hash_message(msg)
+            usage = getattr(resp, "usage", None)
+            details = getattr(usage, "prompt_tokens_details", None)
+            metrics.update(
+                model=getattr(resp, "model", None) or MODEL,
+                prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+                cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+                latency_ms=round((time.perf_counter() - started) * 1000, 1),
+            )
+            result["metrics"] = metrics
             return result
         finally:
             for k, v in saved.items():
                 if v is not None:
                     os.environ[k] = v
     except Exception as e:
-        return {
-            "verdict": "SUSPICIOUS",
-            "confidence": 0,
-            "category": "Unknown",
-            "reasons": [f"Analysis failed: {str(e)[:200]}. Please try again or verify through official channels."],
-            "recommended_actions": ["Do not share OTP or personal details.", "Contact official channels."],
-            "warning_message": "Could not analyze. Stay cautious.",
-            "red_flags": [],
-            "safety_notes": "",
-            "msg_hash": _hash_message(msg),
-        }
+        metrics.update(latency_ms=round((time.perf_counter() - started) * 1000, 1), source="error")
+        result = provisional_verdict(msg, f"AI analysis failed ({str(e)[:120]}). This is a quick check of keywords and links only.")
+        result["metrics"] = metrics
+        return result
@@ -0,0 +1,64 @@
+"""Partner API keys: issued to Pro users, stored only as a SHA-256 hash.
+
+    python -m services.api_keys issue partner@telco.ph --label "SMS gateway"
+    python -m services.api_keys revoke partner@telco.ph
+"""
+import argparse
+import hashlib
+import secrets
+from db.queries import (
+    insert_api_key,
+    get_api_key_owner,
+    revoke_api_keys,
+)
+from services.usage import active_plan
+
+KEY_PREFIX = "cmy_"
+
+
+def _hash_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.strip().encode("utf-8")).hexdigest()
+
+
+def is_pro_active(email: str) -> bool:
+    """True if the user is on the Pro plan and premium_until has not passed."""
+    return active_plan(email) == "pro"
+
+
+def issue_api_key(email: str, label: str = "") -> str:
+    """Create a key for an active Pro user. Returns the key; it cannot be shown again."""
+    email = email.strip().lower()
+    if not is_pro_active(email):
+        raise ValueError(f"{email} is not an active Pro user.")
+    api_key = KEY_PREFIX + secrets.token_urlsafe(32)
+    insert_api_key(email, _hash_key(api_key), label)
+    return api_key
+
+
+def authenticate(api_key: str) -> str | None:
+    """Return the owner's email if the key is valid and its owner is still Pro; else None."""
+    if not api_key or not api_key.startswith(KEY_PREFIX):
+        return None
+    email = get_api_key_owner(_hash_key(api_key))
+    if not email or not is_pro_active(email):
+        return None
+    return email
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Manage CheckMoYan partner API keys.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    issue = sub.add_parser("issue", help="Issue a key to an active Pro user.")
+    issue.add_argument("email")
+    issue.add_argument("--label", default="")
+    revoke = sub.add_parser("revoke", help="Revoke every key of a user.")
+    revoke.add_argument("email")
+    args = parser.parse_args(argv)
+    if args.command == "issue":
+        print(issue_api_key(args.email, args.label))
+    else:
+        print(f"revoked {revoke_api_keys(args.email)} key(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""Batch scam checks over a JSONL or CSV file of messages, streamed to a JSONL of verdicts.
+
+Input records carry a message (`message`, `text` or `body`) and optionally `channel`, `language`
+and `id`. The input is read one record at a time and results are written in input order with at
+most --concurrency analyses in flight, so memory stays flat however large the file is. Output
+lines hold the verdict and msg_hash, never the raw message.
+
+Repeated messages (same canonical text, see services.canonical, plus channel and language) are
+analyzed once, so a blast that differs only in OTPs, numbers or links costs one call: identical
+in-flight messages share one call, and finished verdicts go to an on-disk SQLite cache that also
+serves later runs. Every couple of seconds the input offset of the last written result and the
+output size are checkpointed, so an interrupted run resumes where it stopped:
+
+    python -m services.batch messages.jsonl --out verdicts.jsonl --concurrency 8
+    python -m services.batch messages.csv --out verdicts.jsonl          # rerun: resumes
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from services.scheduler import Overloaded
+
+MESSAGE_FIELDS = ("message", "text", "body")
+CHECKPOINT_EVERY_SECONDS = 2.0
+OVERLOAD_BACKOFF_SECONDS = 0.5  # first wait when the scheduler sheds a batch job; doubles up to the max
+OVERLOAD_BACKOFF_MAX_SECONDS = 10.0
+
+
+def _openai_key() -> str:
+    key = os.environ.get("OPENAI_API_KEY") or ""
+    if not key:
+        try:
+            import streamlit as st
+            key = st.secrets.get("OPENAI_API_KEY") or ""
+        except Exception:
+            key = ""
+    return key.strip()
+
+
+def _records(path: str, fmt: str, offset: int):
+    """
+    Yield (record dict, end offset) from byte offset onward. Reads the file in binary so the
+    offset is exact; CSV records spanning lines (quoted newlines) are joined before parsing.
+    """
+    with open(path, "rb") as f:
+        header = None
+        if fmt == "csv":
+            header = next(csv.reader([_read_csv_record(f).decode("utf-8-sig")]), [])
+            offset = max(offset, f.tell())
+        f.seek(offset)
+        while True:
+            raw = _read_csv_record(f) if fmt == "csv" else f.readline()
+            if not raw:
+                return
+            end = f.tell()
+            text = raw.decode("utf-8", errors="replace").strip()
+            if not text:
+                yield None, end
+            elif fmt == "csv":
+                values = next(csv.reader(io.StringIO(text)), [])
+                yield dict(zip(header, values)), end
+            else:
+                try:
+                    rec = json.loads(text)
+                except ValueError:
+                    rec = {"_error": "invalid JSON"}
+                yield rec if isinstance(rec, dict) else {"message": rec}, end
+
+
+def _read_csv_record(f) -> bytes:
+    """Read physical lines until the quotes balance (one logical CSV record)."""
+    raw = f.readline()
+    while raw and raw.count(b'"') % 2:
+        more = f.readline()
+        if not more:
+            break
+        raw += more
+    return raw
+
+
+def _item(rec: dict) -> dict | None:
+    message = next((rec[k] for k in MESSAGE_FIELDS if isinstance(rec.get(k), str) and rec[k].strip()), "")
+    if not message:
+        return None
+    return {
+        "message": message,
+        "channel": str(rec.get("channel") or ""),
+        "language": str(rec.get("language") or ""),
+    }
+
+
+def _cache_keys(item: dict) -> list:
+    """item's cache key under every services.canonical key version, current first."""
+    from services.canonical import message_keys
+    return message_keys(item["message"], (item["channel"].lower(), item["language"].lower()))
+
+
+def _failed(result: dict, metrics: dict = None) -> bool:
+    """analyze_message reports API errors as a provisional heuristic verdict (source "error"): don't cache those."""
+    return bool(result.get("provisional")) or (metrics or {}).get("source") == "error"
+
+
+class ResultCache:
+    """hash -> verdict JSON in a local SQLite file, shared by later runs."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT NOT NULL)")
+
+    def get(self, key: str) -> dict | None:
+        row = self.conn.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lookup(self, keys: list) -> dict | None:
+        """First hit among keys (current version first); a hit under an older key is re-stored under keys[0]."""
+        for i, key in enumerate(keys):
+            result = self.get(key)
+            if result is not None:
+                if i:
+                    self.put(keys[0], result)
+                return result
+        return None
+
+    def put(self, key: str, result: dict) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO results (key, result) VALUES (?, ?)", (key, json.dumps(result)))
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+
+def _load_checkpoint(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"offset": 0, "line": 0, "out_bytes": 0}
+
+
+def _save_checkpoint(path: str, state: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def run_batch(
+    input_path: str,
+    out_path: str,
+    fmt: str = None,
+    concurrency: int = 4,
+    cache_path: str = None,
+    analyze=None,
+    resume: bool = True,
+    record_metrics: bool = True,
+) -> dict:
+    """
+    Check every message in input_path, appending results to out_path in input order.
+    analyze(message, channel=, language=) defaults to analyze_message via services.scheduler.
+    Fresh analyses (LLM or local classifier) are recorded in analysis_metrics with source "batch"
+    (cost shows in Admin), cache and duplicate hits with source "cache".
+    Returns { processed, analyzed, cached, deduped, skipped }.
+    """
+    from db.queries import insert_analysis_metrics
+    fmt = fmt or ("csv" if input_path.lower().endswith(".csv") else "jsonl")
+    if analyze is None:
+        from services import scheduler
+        api_key = _openai_key()
+        if not api_key:
+            raise SystemExit("OPENAI_API_KEY is not set (environment or .streamlit/secrets.toml).")
+
+        def analyze(message, channel="", language=""):
+            # Lowest priority, and the shared rate limiter keeps batch runs from starving live checks.
+            # Rejected or shed under load means "later", not "failed": back off and retry
+            delay = OVERLOAD_BACKOFF_SECONDS
+            while True:
+                try:
+                    return scheduler.analyze(message, channel=channel, language=language, api_key=api_key, priority=scheduler.BATCH)
+                except scheduler.Overloaded:
+                    time.sleep(delay)
+                    delay = min(delay * 2, OVERLOAD_BACKOFF_MAX_SECONDS)
+
+    ckpt_path = f"{out_path}.checkpoint"
+    state = _load_checkpoint(ckpt_path) if resume else {"offset": 0, "line": 0, "out_bytes": 0}
+    cache = ResultCache(cache_path) if cache_path else None
+    stats = {"processed": 0, "analyzed": 0, "cached": 0, "deduped": 0, "skipped": 0}
+
+    out = open(out_path, "ab" if state["out_bytes"] else "wb")
+    out.truncate(state["out_bytes"])  # drop lines written after the last checkpoint
+    out.seek(state["out_bytes"])
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
+    window = deque()  # (line, end offset, record id, cache key, future or cached result, source), input order
+    inflight = {}  # cache key -> future, so duplicates in the window share one analysis
+    line, last_ckpt = state["line"], time.monotonic()
+
+    def flush_head():
+        nonlocal last_ckpt
+        n, end, rec_id, key, pending, source = window.popleft()
+        entry = {"line": n}
+        if rec_id is not None:
+            entry["id"] = rec_id
+        if key is None:
+            entry["error"] = pending
+            stats["skipped"] += 1
+        else:
+            try:
+                result = pending.result() if source != "cached" else pending
+            except Overloaded:
+                raise  # shed, not failed: stop before checkpointing past it, so a resume retries it
+            except Exception as e:
+                result = None
+                entry["error"] = str(e)[:200]
+            metrics = result.pop("metrics", None) if result is not None else None
+            if inflight.get(key) is pending:
+                del inflight[key]
+                if cache and result is not None and not _failed(result, metrics):
+                    cache.put(key, result)
+                if metrics and record_metrics:
+                    if metrics.get("source") in ("llm", "local"):
+                        metrics["source"] = "batch"  # not a live check: keep it out of local_hit_rate
+                    insert_analysis_metrics(scan_id=None, **metrics)
+            elif source != "analyzed" and result is not None and record_metrics:
+                # Served from the verdict cache or a duplicate's analysis: no tokens, but counted
+                insert_analysis_metrics(scan_id=None, model="cache", source="cache")
+            if result is not None:
+                entry.update(cached=source != "analyzed", result=result)
+        out.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        stats["processed"] += 1
+        state.update(offset=end, line=n, out_bytes=out.tell())
+        if time.monotonic() - last_ckpt >= CHECKPOINT_EVERY_SECONDS:
+            _checkpoint()
+            last_ckpt = time.monotonic()
+
+    def _checkpoint():
+        out.flush()
+        os.fsync(out.fileno())
+        if cache:
+            cache.commit()
+        _save_checkpoint(ckpt_path, state)
+
+    try:
+        for rec, end in _records(input_path, fmt, state["offset"]):
+            if rec is None:
+                continue
+            line += 1
+            item = None if "_error" in rec else _item(rec)
+            rec_id = rec.get("id")
+            if item is None:
+                window.append((line, end, rec_id, None, rec.get("_error") or "no message", None))
+            else:
+                keys = _cache_keys(item)
+                key = keys[0]
+                pending, source = inflight.get(key), "deduped"
+                if pending is None:
+                    pending, source = (cache.lookup(keys) if cache else None), "cached"
+                if pending is None:
+                    pending = inflight[key] = pool.submit(analyze, item["message"], channel=item["channel"], language=item["language"])
+                    source = "analyzed"
+                stats[source] += 1
+                window.append((line, end, rec_id, key, pending, source))
+            # Keep at most ~2x concurrency records buffered; flush finished heads as we go
+            while window and (len(window) > 2 * concurrency or _done(window[0][4])):
+                flush_head()
+        while window:
+            flush_head()
+        _checkpoint()
+    except Overloaded:
+        _checkpoint()  # state only covers lines already written, so the shed item is retried on resume
+        raise
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        out.close()
+        if cache:
+            cache.close()
+    return stats
+
+
+def _done(pending) -> bool:
+    return not hasattr(pending, "done") or pending.done()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Batch-check a JSONL or CSV file of messages.")
+    parser.add_argument("input", help="JSONL or CSV with a message/text/body field; optional channel, language, id.")
+    parser.add_argument("--out", required=True, help="Output JSONL (appended; resumes from its checkpoint).")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Default: from the input extension.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Analyses in flight.")
+    parser.add_argument("--cache", help="SQLite verdict cache (default: <out>.cache.sqlite).")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write the verdict cache.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over.")
+    args = parser.parse_args(argv)
+    cache_path = None if args.no_cache else (args.cache or f"{args.out}.cache.sqlite")
+    stats = run_batch(
+        args.input,
+        args.out,
+        fmt=args.format,
+        concurrency=args.concurrency,
+        cache_path=cache_path,
+        resume=not args.restart,
+    )
+    print(json.dumps(stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
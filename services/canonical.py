@@ -0,0 +1,115 @@
+"""Message canonicalization: the cache and dedupe key for near-identical scam blasts.
+
+A blast is one template sent with a different OTP, phone number, peso amount or link per
+recipient, often with look-alike letters (Cyrillic а, fullwidth Ｇ), zero-width characters and
+emoji sprinkled in to dodge filters. canonicalize() folds all of that to one text with typed
+placeholders, so the whole blast hashes to one msg_hash and hits the verdict cache:
+
+    "GCash: OTP 482913, call 0917 555 1234, pay ₱1,500 at https://gcash-ph.xyz/a/9f"
+    -> "gcash: otp <code>, call <phone>, pay <amount> at <url:gcash-ph.xyz>"
+
+Keys are versioned ("v2:<sha256>"). Changing the rules means adding a version: message_keys()
+lists a message's key under every version, newest first, so stores keyed by an older scheme can
+be looked up and migrated. Version 1 is the original bare strip().lower() hash.
+
+scans.msg_hash holds whichever version was current when the scan was written. Raw messages are
+not stored, so scans from before version 2 keep their bare v1 hashes and cannot be rehashed;
+compare msg_hash only within one key_version().
+"""
+import hashlib
+import re
+import unicodedata
+
+CANON_VERSION = 2
+KEY_VERSIONS = (2, 1)  # newest first
+
+# Look-alikes NFKC leaves alone (Cyrillic, Greek, Latin small capitals) -> ASCII
+CONFUSABLES = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p", "с": "c",
+    "т": "t", "у": "y", "х": "x", "і": "i", "ї": "i", "ј": "j", "ѕ": "s", "ԁ": "d", "ɡ": "g", "һ": "h",
+    "α": "a", "β": "b", "ε": "e", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x",
+    "ᴀ": "a", "ʙ": "b", "ᴄ": "c", "ᴅ": "d", "ᴇ": "e", "ɢ": "g", "ʜ": "h", "ɪ": "i", "ᴊ": "j", "ᴋ": "k",
+    "ʟ": "l", "ᴍ": "m", "ɴ": "n", "ᴏ": "o", "ᴘ": "p", "ʀ": "r", "ꜱ": "s", "ᴛ": "t", "ᴜ": "u", "ᴠ": "v", "ᴡ": "w", "ʏ": "y", "ᴢ": "z",
+    "‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-", "₱": " php ",
+})
+
+_URL_RE = re.compile(r"\b(?:https?://|www\.)[^\s<>\"']+|\b(?:[a-z0-9-]+\.)+(?:com|ph|net|org|xyz|top|site|link|info|click|online|shop|vip|ly|gl|gd|co|me|io)\b(?:/[^\s<>\"']*)?")
+_EMAIL_RE = re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")
+# Mobile numbers, including the masked "09XX XXX XXXX" style
+_PHONE_RE = re.compile(r"(?<![\w<])(?:\+?63[\s-]?|0)9[\dx]{2}[\s-]?[\dx]{3}[\s-]?[\dx]{4}\b")
+_AMOUNT_RE = re.compile(
+    r"\b(?:php|p)\s?\d[\d,]*(?:\.\d+)?k?\b"
+    r"|\b\d[\d,]*(?:\.\d+)?\s?k?\s?(?:pesos?|php)\b"
+    r"|\b\d{1,3}(?:,\d{3})+(?:\.\d+)?\b"  # 1,500 with thousands separators
+)
+_CODE_RE = re.compile(r"(?<![\d:])\d{4,8}(?![\d:])")  # OTPs, PINs, reference codes (not hh:mm parts)
+_YEAR_RE = re.compile(r"(?:19|20)\d\d")
+# A year-like number is still a code right after one of these ("OTP: 2024", "PIN no. 1987")
+_CODE_CONTEXT_RE = re.compile(r"\b(?:otp|code|pin|tac|passcode|password|ref|reference)\W{0,3}(?:no|number|#)?\W{0,3}$")
+_LONG_NUMBER_RE = re.compile(r"\b\d{9,}\b")  # account and card numbers
+_ZERO_WIDTH_RE = re.compile("[\u00ad\u180e\u200b-\u200f\u2060-\u2064\ufeff]")
+_REPEAT_PUNCT_RE = re.compile(r"([!?.,*~_-])\1+")
+
+
+def _strip_emoji(text: str) -> str:
+    """Drop emoji and pictographs, skin-tone and variation modifiers (decoration, not content)."""
+    return "".join(
+        ch for ch in text
+        if not (unicodedata.category(ch) in ("So", "Sk", "Mn", "Cf") or 0x1F3FB <= ord(ch) <= 0x1F3FF)
+    )
+
+
+def _host(url: str) -> str:
+    host = re.sub(r"^(?:https?://)?(?:www\.)?", "", url).split("/", 1)[0].split("?", 1)[0]
+    return host.rstrip(".,;:!)")
+
+
+def _code(m: re.Match) -> str:
+    """Mask a 4-8 digit code, but keep years ("meet on 2024") unless they follow an OTP-like word."""
+    if _YEAR_RE.fullmatch(m.group(0)) and not _CODE_CONTEXT_RE.search(m.string[max(0, m.start() - 24):m.start()]):
+        return m.group(0)
+    return " <code> "
+
+
+def canonicalize(text: str) -> str:
+    """The canonical form of a message (current CANON_VERSION rules)."""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = _ZERO_WIDTH_RE.sub("", text)
+    # Decompose so accents become combining marks, which _strip_emoji drops with the emoji
+    text = unicodedata.normalize("NFKD", text.casefold().translate(CONFUSABLES))
+    text = _strip_emoji(text)
+    text = _EMAIL_RE.sub(" <email> ", text)
+    text = _URL_RE.sub(lambda m: f" <url:{_host(m.group(0))}> ", text)
+    text = _PHONE_RE.sub(" <phone> ", text)
+    text = _AMOUNT_RE.sub(" <amount> ", text)
+    text = _LONG_NUMBER_RE.sub(" <number> ", text)
+    text = _CODE_RE.sub(_code, text)
+    text = _REPEAT_PUNCT_RE.sub(r"\1", text)
+    text = re.sub(r"\s+([,.!?:;])", r"\1", text)
+    return " ".join(text.split()).rstrip(" .!?")
+
+
+def message_key(text: str, version: int = CANON_VERSION, context: tuple = ()) -> str:
+    """
+    Hash of text (plus context, e.g. channel and language) under a key version:
+    "v2:<sha256>" of the canonical form; version 1 is the bare hex of strip().lower().
+    """
+    if version == 1:
+        base = (text or "").strip().lower()
+    elif version == CANON_VERSION:
+        base = canonicalize(text)
+    else:
+        raise ValueError(f"Unknown message key version: {version}")
+    digest = hashlib.sha256("\x1f".join([base, *context]).encode("utf-8")).hexdigest()
+    return digest if version == 1 else f"v{version}:{digest}"
+
+
+def message_keys(text: str, context: tuple = ()) -> list:
+    """text's key under every KEY_VERSIONS scheme, current first (for lookups during a migration)."""
+    return [message_key(text, v, context) for v in KEY_VERSIONS]
+
+
+def key_version(key: str) -> int:
+    """The scheme a stored key was made with."""
+    m = re.match(r"v(\d+):", key or "")
+    return int(m.group(1)) if m else 1
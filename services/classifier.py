@@ -0,0 +1,226 @@
+"""Local first-tier scam classifier: naive Bayes over character n-grams, trained offline.
+
+The model is a JSON file of per-label n-gram counts, trained from a labeled JSONL corpus
+(one {"message", "label", "category"?} per line, label SAFE / SUSPICIOUS / SCAM). Scoring is a
+few dictionary lookups, so services.analysis can answer blatant spam locally and send only the
+uncertain middle band to the LLM. Character n-grams (3-5, within words) survive the usual
+obfuscation (G-Cash, GCa$h, l0an) better than whole words.
+
+    python -m services.classifier train corpus.jsonl            # writes models/scam_nb.json
+    python -m services.classifier evaluate holdout.jsonl --threshold 0.97
+"""
+import argparse
+import json
+import math
+import os
+import re
+import threading
+from pathlib import Path
+
+MODEL_PATH = Path(
+    os.environ.get("CHECKMOYAN_LOCAL_MODEL")
+    or Path(__file__).resolve().parent.parent / "models" / "scam_nb.json"
+)
+LABELS = ("SAFE", "SUSPICIOUS", "SCAM")
+NGRAM_SIZES = (3, 4, 5)
+ALPHA = 1.0  # Laplace smoothing
+MIN_COUNT = 2  # drop n-grams seen fewer times in training (keeps the model file small)
+EVIDENCE_WEIGHT = float(os.environ.get("CHECKMOYAN_LOCAL_EVIDENCE_WEIGHT", "5"))
+
+_URL_RE = re.compile(r"https?://\S+|www\.\S+|\b[\w-]+\.(?:com|ph|net|org|xyz|top|site|link|info)\S*", re.I)
+_model = {"path": None, "mtime": None, "data": None}
+_model_lock = threading.Lock()
+
+
+def _words(text: str) -> list:
+    text = _URL_RE.sub(" httpurl ", (text or "").lower())
+    text = re.sub(r"\d", "0", text)
+    return re.findall(r"[^\s]+", text)
+
+
+def features(text: str) -> set:
+    """Distinct word and character n-gram features of a message (presence, not counts)."""
+    feats = set()
+    for word in _words(text):
+        feats.add(f"w:{word}")
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                feats.add(padded[i:i + n])
+    return feats
+
+
+def _fit(docs: list) -> dict:
+    """docs: [(feature set, label)] -> { labels, doc_counts, totals, counts }."""
+    labels = sorted({label for _, label in docs})
+    index = {label: i for i, label in enumerate(labels)}
+    counts = {}
+    doc_counts = [0] * len(labels)
+    for feats, label in docs:
+        i = index[label]
+        doc_counts[i] += 1
+        for f in feats:
+            row = counts.setdefault(f, [0] * len(labels))
+            row[i] += 1
+    counts = {f: row for f, row in counts.items() if sum(row) >= MIN_COUNT}
+    totals = [sum(row[i] for row in counts.values()) for i in range(len(labels))]
+    return {"labels": labels, "doc_counts": doc_counts, "totals": totals, "counts": counts}
+
+
+def _posterior(part: dict, feats: set) -> dict:
+    """
+    Naive Bayes posterior, tempered: the summed log-likelihoods are divided by the message's
+    feature count and scaled by EVIDENCE_WEIGHT. Overlapping n-grams are far from independent, so
+    plain NB saturates at ~1.0 for almost anything; this keeps short or unfamiliar messages in
+    the uncertain band, where the cascade hands them to the LLM.
+    """
+    labels = part["labels"]
+    vocab = len(part["counts"]) or 1
+    n_docs = sum(part["doc_counts"])
+    denom = [math.log(part["totals"][i] + ALPHA * vocab) for i in range(len(labels))]
+    loglik = [0.0] * len(labels)
+    for f in feats:
+        row = part["counts"].get(f)
+        if row is None:
+            continue
+        for i in range(len(labels)):
+            loglik[i] += math.log(row[i] + ALPHA) - denom[i]
+    scale = EVIDENCE_WEIGHT / max(1, len(feats))
+    scores = [math.log(part["doc_counts"][i] / n_docs) + scale * loglik[i] for i in range(len(labels))]
+    top = max(scores)
+    exp = [math.exp(s - top) for s in scores]
+    total = sum(exp)
+    return {label: e / total for label, e in zip(labels, exp)}
+
+
+def train(corpus_path: str, out_path: Path = MODEL_PATH) -> dict:
+    """Train from a labeled JSONL corpus and write the model JSON. Returns { docs, labels, features }."""
+    docs, scam_docs = [], []
+    with open(corpus_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            label = str(rec.get("label") or rec.get("verdict") or "").upper()
+            message = rec.get("message") or rec.get("text") or ""
+            if label not in LABELS or not message.strip():
+                continue
+            feats = features(message)
+            docs.append((feats, label))
+            if label == "SCAM" and rec.get("category"):
+                scam_docs.append((feats, str(rec["category"])))
+    if len({label for _, label in docs}) < 2:
+        raise ValueError("Corpus needs at least two labels (e.g. SAFE and SCAM).")
+    model = {"version": 1, "verdict": _fit(docs), "category": _fit(scam_docs) if scam_docs else None}
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(model, f, separators=(",", ":"))
+    os.replace(tmp, out_path)
+    return {"docs": len(docs), "labels": model["verdict"]["labels"], "features": len(model["verdict"]["counts"])}
+
+
+def load_model(path: Path = MODEL_PATH) -> dict | None:
+    """The model at path (re-read when the file changes), or None if there is no trained model."""
+    path = Path(path)
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    with _model_lock:
+        if _model["path"] != path or _model["mtime"] != mtime:
+            with open(path, encoding="utf-8") as f:
+                _model.update(path=path, mtime=mtime, data=json.load(f))
+        return _model["data"]
+
+
+def _top_words(part: dict, text: str, label: str, n: int = 3) -> list:
+    """Words whose n-grams most favour label, for an explainable local verdict."""
+    i = part["labels"].index(label)
+    others = [j for j in range(len(part["labels"])) if j != i]
+    vocab = len(part["counts"]) or 1
+    denom = [part["totals"][j] + ALPHA * vocab for j in range(len(part["labels"]))]
+    scored = {}
+    for word in set(_words(text)):
+        if word == "httpurl" or len(word) < 3:
+            continue
+        padded, score = f" {word} ", 0.0
+        for f in [f"w:{word}"] + [padded[k:k + m] for m in NGRAM_SIZES for k in range(len(padded) - m + 1)]:
+            row = part["counts"].get(f)
+            if row:
+                score += math.log((row[i] + ALPHA) / denom[i]) - max(math.log((row[j] + ALPHA) / denom[j]) for j in others)
+        if score > 0:
+            scored[word] = score
+    return [w for w, _ in sorted(scored.items(), key=lambda kv: kv[1], reverse=True)[:n]]
+
+
+def predict(text: str, model: dict = None) -> dict | None:
+    """
+    Return { verdict, probability, probabilities, category, top_words } for text, or None without a model.
+    verdict is the most probable label; probability is its posterior.
+    """
+    model = model or load_model()
+    if model is None:
+        return None
+    feats = features(text)
+    probs = _posterior(model["verdict"], feats)
+    verdict = max(probs, key=probs.get)
+    category = "Unknown"
+    if verdict == "SCAM" and model.get("category"):
+        cats = _posterior(model["category"], feats)
+        category = max(cats, key=cats.get)
+    return {
+        "verdict": verdict,
+        "probability": probs[verdict],
+        "probabilities": probs,
+        "category": category,
+        "top_words": _top_words(model["verdict"], text, verdict) if verdict != "SUSPICIOUS" else [],
+    }
+
+
+def evaluate(corpus_path: str, threshold: float, model: dict = None) -> dict:
+    """Share of messages the local tier would answer at threshold, and its accuracy on those."""
+    model = model or load_model()
+    if model is None:
+        raise SystemExit(f"No model at {MODEL_PATH}. Train one first.")
+    total = answered = correct = 0
+    with open(corpus_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            label = str(rec.get("label") or rec.get("verdict") or "").upper()
+            if label not in LABELS:
+                continue
+            total += 1
+            p = predict(rec.get("message") or rec.get("text") or "", model)
+            if p["verdict"] in ("SAFE", "SCAM") and p["probability"] >= threshold:
+                answered += 1
+                correct += p["verdict"] == label
+    return {
+        "messages": total,
+        "local_hit_rate": round(answered / total, 3) if total else 0.0,
+        "local_accuracy": round(correct / answered, 3) if answered else None,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Train or evaluate the local scam classifier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    t = sub.add_parser("train", help="Train from a labeled JSONL corpus.")
+    t.add_argument("corpus")
+    t.add_argument("--out", default=str(MODEL_PATH))
+    e = sub.add_parser("evaluate", help="Local hit rate and accuracy on a labeled JSONL file.")
+    e.add_argument("corpus")
+    e.add_argument("--threshold", type=float, default=0.97)
+    args = parser.parse_args(argv)
+    if args.command == "train":
+        print(json.dumps(train(args.corpus, Path(args.out))))
+    else:
+        print(json.dumps(evaluate(args.corpus, args.threshold)))
+
+
+if __name__ == "__main__":
+    main()
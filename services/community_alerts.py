@@ -0,0 +1,140 @@
+"""Auto-generated community alerts: categories whose scan volume jumps over their baseline.
+
+Incremental: each run folds only the scans added since the last run (a scan-id watermark in
+app_settings) into the category_hourly rollup, in the same transaction that moves the
+watermark, so no scan is counted twice and history is never rescanned. Scans newer than
+LAG_SECONDS are left for the next run so an insert that commits late (Snowflake sequence ids)
+isn't skipped. Detection then reads only the rollup: the last WINDOW_HOURS against the mean
+WINDOW_HOURS volume over the previous BASELINE_DAYS. A spike inserts an alert, or refreshes the
+category's alert while its window is still open (count, baseline, window end, ts).
+
+Run from cron or a worker:  python -m services.community_alerts --interval 300
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from db.instrumentation import set_page
+from db.queries import advance_category_hourly, get_category_hourly, save_community_alert
+
+WATERMARK_KEY = "community_alerts.scan_id"
+WINDOW_HOURS = int(os.environ.get("CHECKMOYAN_ALERTS_WINDOW_HOURS", "3"))
+BASELINE_DAYS = int(os.environ.get("CHECKMOYAN_ALERTS_BASELINE_DAYS", "7"))
+MIN_SCANS = int(os.environ.get("CHECKMOYAN_ALERTS_MIN_SCANS", "5"))
+SPIKE_RATIO = float(os.environ.get("CHECKMOYAN_ALERTS_SPIKE_RATIO", "2.0"))
+INTERVAL_SECONDS = int(os.environ.get("CHECKMOYAN_ALERTS_INTERVAL", "300"))
+LAG_SECONDS = 60
+BATCH_ROWS = 5000
+
+logger = logging.getLogger("checkmoyan.community_alerts")
+
+_worker = {"thread": None}
+_worker_lock = threading.Lock()
+
+
+def _fmt(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def ingest_new_scans(now: datetime = None) -> int:
+    """Fold every scan since the watermark (older than LAG_SECONDS) into category_hourly. Returns scans folded."""
+    now = now or datetime.utcnow()
+    before = _fmt(now - timedelta(seconds=LAG_SECONDS))
+    total = 0
+    while True:
+        step = advance_category_hourly(WATERMARK_KEY, before, BATCH_ROWS)
+        total += step["scans"]
+        if step["scans"] < BATCH_ROWS:
+            return total
+
+
+def detect_spikes(now: datetime = None) -> list:
+    """
+    [{ category, count, baseline, window_start, window_end }] for categories with at least
+    MIN_SCANS in the last WINDOW_HOURS and SPIKE_RATIO times their baseline (baseline floor 1).
+    """
+    now = now or datetime.utcnow()
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    window_start = current_hour - timedelta(hours=WINDOW_HOURS - 1)
+    baseline_start = window_start - timedelta(days=BASELINE_DAYS)
+    windows_in_baseline = BASELINE_DAYS * 24 / WINDOW_HOURS
+    recent, past = {}, {}
+    for r in get_category_hourly(_fmt(baseline_start)):
+        bucket = recent if r["hour"] >= _fmt(window_start) else past
+        bucket[r["category"]] = bucket.get(r["category"], 0) + r["count"]
+    spikes = []
+    for category, count in recent.items():
+        baseline = past.get(category, 0) / windows_in_baseline
+        if count >= MIN_SCANS and count >= SPIKE_RATIO * max(baseline, 1.0):
+            spikes.append({
+                "category": category,
+                "count": count,
+                "baseline": round(baseline, 2),
+                "window_start": _fmt(window_start),
+                "window_end": _fmt(now),
+            })
+    return sorted(spikes, key=lambda s: s["count"], reverse=True)
+
+
+def _summary(spike: dict) -> str:
+    hours = f"{WINDOW_HOURS} hour{'s' if WINDOW_HOURS != 1 else ''}"
+    if not spike["baseline"]:
+        return f"{spike['count']} reports in the last {hours}, none in the {BASELINE_DAYS} days before. Don't click links or share OTPs."
+    ratio = spike["count"] / spike["baseline"]
+    return f"{spike['count']} reports in the last {hours}, {ratio:.1f}x the usual. Don't click links or share OTPs."
+
+
+def run_once(now: datetime = None) -> dict:
+    """Ingest new scans, then write or refresh an alert per spiking category. Returns { scans, alerts }."""
+    now = now or datetime.utcnow()
+    scans = ingest_new_scans(now)
+    spikes = detect_spikes(now)
+    for spike in spikes:
+        save_community_alert(
+            spike["category"],
+            _summary(spike),
+            spike["count"],
+            spike["baseline"],
+            spike["window_start"],
+            spike["window_end"],
+        )
+    return {"scans": scans, "alerts": len(spikes)}
+
+
+def _run(interval: int) -> None:
+    set_page("community_alerts job")
+    while True:
+        try:
+            run_once()
+        except Exception:
+            # the watermark only moves with a committed rollup; retry next tick
+            logger.exception("community alerts run failed")
+        time.sleep(interval)
+
+
+def start_worker(interval: int = INTERVAL_SECONDS) -> None:
+    """Start the background alerts thread once per process (replicas may all run it)."""
+    with _worker_lock:
+        if _worker["thread"] is not None and _worker["thread"].is_alive():
+            return
+        t = threading.Thread(target=_run, args=(interval,), name="community-alerts", daemon=True)
+        t.start()
+        _worker["thread"] = t
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Generate CheckMoYan community alerts from new scans.")
+    parser.add_argument("--interval", type=int, default=0, help="Seconds between runs (0 = run once and exit).")
+    args = parser.parse_args(argv)
+    set_page("community_alerts job")
+    while True:
+        print(f"{datetime.utcnow():%Y-%m-%d %H:%M:%S} {run_once()}")
+        if args.interval <= 0:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Maintained counters: periodic reconciliation against the base tables.
+
+Counters and the scan_daily rollup are bumped in the same transaction as each insert,
+so they stay exact; reconciliation only repairs drift (manual SQL edits, failed writes).
+Run from cron or a worker:  python -m services.counters --interval 3600
+"""
+import argparse
+import time
+from datetime import datetime
+from db.queries import get_app_setting, set_app_setting, reconcile_counters
+
+RECONCILED_AT_KEY = "counters_reconciled_at"
+
+
+def last_reconciled_at() -> str:
+    """Return UTC timestamp (YYYY-MM-DD HH:MM:SS) of the last reconciliation, or empty string."""
+    return get_app_setting(RECONCILED_AT_KEY)
+
+
+def reconcile_now() -> dict:
+    """Recompute counters from the base tables and record when it ran."""
+    counters = reconcile_counters()
+    set_app_setting(RECONCILED_AT_KEY, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
+    return counters
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Reconcile CheckMoYan counters with base tables.")
+    parser.add_argument("--interval", type=int, default=0, help="Seconds between runs (0 = run once and exit).")
+    args = parser.parse_args(argv)
+    while True:
+        counters = reconcile_now()
+        print(f"{datetime.utcnow():%Y-%m-%d %H:%M:%S} reconciled: {counters}")
+        if args.interval <= 0:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
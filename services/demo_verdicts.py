@@ -0,0 +1,191 @@
+"""Stored verdicts for the landing-page demo messages (components.landing.SAMPLE_SCAM_MESSAGES).
+
+The demos are fixed texts, so each needs one LLM verdict per prompt version (a hash of MODEL and
+SYSTEM_PROMPT), not one per click. The store is a JSON file keyed by sample id; an entry is current
+while its prompt version and the sample's text hash match. Demo clicks are served from the file
+only: they never use the visitor's daily checks and are not recorded as scans.
+
+Building the store is a required deploy step (the file is not in git), after the code is in place
+and before traffic arrives; it exits non-zero if a sample could not be analyzed:
+
+    python -m services.demo_verdicts build            # analyze samples with no current entry
+    python -m services.demo_verdicts build --force    # re-analyze everything
+
+If a click still finds no current entry (the step was skipped, or the store is not shared between
+replicas), submit_fill() analyzes that sample once as a background job (services.jobs) and saves it.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+DEMO_VERDICTS_PATH = Path(
+    os.environ.get("CHECKMOYAN_DEMO_VERDICTS_PATH")
+    or Path(__file__).resolve().parent.parent / "snapshots" / "demo_verdicts.json"
+)
+
+_cache = {"path": None, "mtime": None, "data": None}
+_write_lock = threading.Lock()
+_sample_locks = {}  # sample id -> lock, so one fill per sample runs at a time
+
+
+def prompt_version() -> str:
+    """Short hash of everything that shapes an LLM verdict; a change invalidates stored verdicts."""
+    from services.analysis import MODEL, SYSTEM_PROMPT
+    return hashlib.sha256(f"{MODEL}\x1f{SYSTEM_PROMPT}".encode("utf-8")).hexdigest()[:16]
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def find_sample(message: str) -> dict | None:
+    """The demo sample whose text is message (whitespace-trimmed), else None."""
+    from components.landing import SAMPLE_SCAM_MESSAGES
+    text = (message or "").strip()
+    return next((s for s in SAMPLE_SCAM_MESSAGES if s["text"].strip() == text), None)
+
+
+def load_store(path: Path = DEMO_VERDICTS_PATH) -> dict:
+    """The store file (re-read when it changes), or an empty store."""
+    path = Path(path)
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return {"verdicts": {}}
+    if _cache["path"] != path or _cache["mtime"] != mtime:
+        try:
+            with open(path, encoding="utf-8") as f:
+                _cache.update(path=path, mtime=mtime, data=json.load(f))
+        except (OSError, json.JSONDecodeError):
+            return _cache["data"] or {"verdicts": {}}
+    return _cache["data"]
+
+
+def _current(entry: dict, sample: dict, version: str) -> bool:
+    return bool(entry) and entry.get("prompt_version") == version and entry.get("text_hash") == _text_hash(sample["text"])
+
+
+def _served(entry: dict, sample: dict) -> dict:
+    from services.analysis import _hash_message
+    result = dict(entry["result"])
+    result["msg_hash"] = _hash_message(sample["text"])
+    result["demo"] = True
+    return result
+
+
+def _analyze(sample: dict, api_key: str) -> dict | None:
+    """A store entry for sample from a fresh LLM verdict, or None if the LLM didn't answer."""
+    from services.analysis import analyze_message
+    result = analyze_message(sample["text"], api_key=api_key, use_local=False)
+    metrics = result.pop("metrics", None) or {}
+    if result.pop("provisional", False) or metrics.get("source") != "llm":
+        return None
+    result.pop("msg_hash", None)
+    return {
+        "label": sample["label"],
+        "prompt_version": prompt_version(),
+        "text_hash": _text_hash(sample["text"]),
+        "model": metrics.get("model"),
+        "generated_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "result": result,
+    }
+
+
+def _save(entries: dict, path: Path = DEMO_VERDICTS_PATH) -> None:
+    """Merge entries (sample id -> entry) into the store file (atomic replace)."""
+    path = Path(path)
+    store = load_store(path)
+    verdicts = dict(store.get("verdicts", {}))
+    verdicts.update(entries)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"verdicts": verdicts}, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def demo_verdict(message: str) -> dict | None:
+    """The stored verdict for a demo sample, or None if message is not a sample or has no current entry."""
+    sample = find_sample(message)
+    if sample is None:
+        return None
+    entry = load_store().get("verdicts", {}).get(sample["id"])
+    return _served(entry, sample) if _current(entry, sample, prompt_version()) else None
+
+
+def _fill(sample: dict, api_key: str) -> dict:
+    """Job body: analyze sample unless another job stored it meanwhile, save it and return it."""
+    with _write_lock:
+        lock = _sample_locks.setdefault(sample["id"], threading.Lock())
+    with lock:
+        entry = load_store().get("verdicts", {}).get(sample["id"])
+        if not _current(entry, sample, prompt_version()):
+            entry = _analyze(sample, api_key)
+            if entry is None:
+                raise RuntimeError("The sample message couldn't be analyzed right now. Please try again.")
+            with _write_lock:
+                _save({sample["id"]: entry})
+    return _served(entry, sample)
+
+
+def submit_fill(message: str, api_key: str) -> str:
+    """
+    Queue a background job (services.jobs, free-tier priority) that analyzes the demo sample message
+    and stores its verdict; the job's result is the served verdict. Returns the job id. Raises
+    ValueError if message is not a sample, services.jobs.JobQueueFull if the queue is full.
+    """
+    from services.jobs import submit
+    from services.scheduler import FREE, estimate_tokens
+    sample = find_sample(message)
+    if sample is None:
+        raise ValueError("Not a demo sample message.")
+    return submit(_fill, sample, api_key, priority=FREE, cost_tokens=estimate_tokens(sample["text"]))
+
+
+def build(api_key: str, force: bool = False, path: Path = DEMO_VERDICTS_PATH) -> dict:
+    """Analyze samples with a missing or stale entry and save them. Returns { analyzed, kept, failed }."""
+    from components.landing import SAMPLE_SCAM_MESSAGES
+    version = prompt_version()
+    old = load_store(path).get("verdicts", {})
+    fresh, stats = {}, {"analyzed": 0, "kept": 0, "failed": 0}
+    for sample in SAMPLE_SCAM_MESSAGES:
+        if _current(old.get(sample["id"]), sample, version) and not force:
+            stats["kept"] += 1
+            continue
+        entry = _analyze(sample, api_key)
+        if entry is None:
+            stats["failed"] += 1
+            continue
+        fresh[sample["id"]] = entry
+        stats["analyzed"] += 1
+    if fresh:
+        with _write_lock:
+            _save(fresh, path)
+    return stats
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute verdicts for the landing-page demo messages.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="Analyze demo samples whose stored verdict is missing or stale.")
+    b.add_argument("--force", action="store_true", help="Re-analyze every sample.")
+    b.add_argument("--out", default=str(DEMO_VERDICTS_PATH))
+    args = parser.parse_args(argv)
+    from services.batch import _openai_key
+    api_key = _openai_key()
+    if not api_key:
+        raise SystemExit("OPENAI_API_KEY is not set (environment or .streamlit/secrets.toml).")
+    stats = build(api_key, force=args.force, path=Path(args.out))
+    print(json.dumps(stats), file=sys.stderr)
+    if stats["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
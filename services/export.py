@@ -0,0 +1,175 @@
+"""Streaming columnar export of scans and usage (Parquet or Arrow IPC) for offline analytics.
+
+Rows are pulled in keyset-paginated chunks and written one record batch at a time, so memory
+stays bounded by the chunk size regardless of table size. Incremental runs resume from a
+high-water mark: last scan id for scans, last complete day for usage.
+
+CLI:  python -m services.export --table scans --out exports/ [--format arrow] [--full]
+
+The admin Export tab writes one-off downloads under DOWNLOADS_DIR (exports/admin, gitignored);
+files older than DOWNLOAD_TTL_SECONDS are deleted whenever a new one is made, so sessions that
+never come back don't leave them behind. Streamlit sends a download from the script's memory,
+so files over MAX_DOWNLOAD_BYTES are not offered for download: use the CLI for those.
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from db.queries import iter_scans, iter_usage
+
+FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+STATE_FILE = ".export_state.json"
+DOWNLOADS_DIR = Path(os.environ.get("CHECKMOYAN_EXPORT_DIR") or "exports") / "admin"
+DOWNLOAD_TTL_SECONDS = 3600
+MAX_DOWNLOAD_BYTES = int(os.environ.get("CHECKMOYAN_EXPORT_MAX_DOWNLOAD_BYTES", str(200 * 1024 * 1024)))
+
+SCHEMAS = {
+    "scans": pa.schema([
+        ("id", pa.int64()),
+        ("email", pa.string()),
+        ("ts", pa.timestamp("s")),
+        ("verdict", pa.string()),
+        ("confidence", pa.int32()),
+        ("category", pa.string()),
+        ("signals_json", pa.string()),
+        ("msg_hash", pa.string()),
+    ]),
+    "usage": pa.schema([
+        ("email", pa.string()),
+        ("date", pa.date32()),
+        ("checks_count", pa.int32()),
+    ]),
+}
+
+
+def _to_datetime(v):
+    if v is None or isinstance(v, datetime):
+        return v
+    try:
+        return datetime.fromisoformat(str(v))
+    except ValueError:
+        return None
+
+
+def _to_date(v):
+    if v is None or not isinstance(v, str):
+        return v
+    return datetime.strptime(str(v)[:10], "%Y-%m-%d").date()
+
+
+def _batch(table: str, rows: list) -> pa.RecordBatch:
+    """Build one record batch from a chunk of row dicts."""
+    schema = SCHEMAS[table]
+    if table == "scans":
+        for r in rows:
+            r["ts"] = _to_datetime(r.get("ts"))
+    else:
+        for r in rows:
+            r["date"] = _to_date(r.get("date"))
+    return pa.RecordBatch.from_pylist(rows, schema=schema)
+
+
+def _chunks(table: str, since, chunk_size: int):
+    if table == "scans":
+        return iter_scans(after_id=int(since or 0), chunk_size=chunk_size)
+    return iter_usage(after_date=since or "", chunk_size=chunk_size)
+
+
+def export_table(table: str, out, fmt: str = "parquet", since=None, chunk_size: int = 5000) -> dict:
+    """
+    Stream table rows after `since` (scan id or usage date) into `out` (path or binary file object).
+    Returns { rows, high_water_mark }; high_water_mark is `since` if nothing new was exported.
+    """
+    if table not in SCHEMAS:
+        raise ValueError(f"Unknown table: {table}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    schema = SCHEMAS[table]
+    writer = pq.ParquetWriter(out, schema, compression="zstd") if fmt == "parquet" else ipc.new_file(out, schema)
+    rows_written, hwm = 0, since
+    try:
+        for rows in _chunks(table, since, chunk_size):
+            hwm = rows[-1]["id"] if table == "scans" else str(rows[-1]["date"])
+            batch = _batch(table, rows)
+            writer.write_batch(batch)
+            rows_written += batch.num_rows
+    finally:
+        writer.close()
+    return {"rows": rows_written, "high_water_mark": hwm}
+
+
+def new_download_path(table: str, fmt: str, directory: Path = DOWNLOADS_DIR) -> Path:
+    """A fresh path for an admin download, after deleting downloads older than DOWNLOAD_TTL_SECONDS."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    for old in directory.iterdir():
+        try:
+            if now - old.stat().st_mtime > DOWNLOAD_TTL_SECONDS:
+                old.unlink()
+        except OSError:
+            pass  # removed by another session meanwhile
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return directory / f"{table}_{stamp}_{uuid.uuid4().hex[:8]}.{FORMATS[fmt]}"
+
+
+def _load_state(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, STATE_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_state(out_dir: str, state: dict) -> None:
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def export_incremental(table: str, out_dir: str, fmt: str = "parquet", full: bool = False, chunk_size: int = 5000) -> dict:
+    """
+    Export rows newer than the high-water mark saved in out_dir into a new timestamped file,
+    then advance the mark. Returns { path, rows, high_water_mark }; path is "" if nothing new.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    state = _load_state(out_dir)
+    since = None if full else state.get(table)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(out_dir, f"{table}_{stamp}.{FORMATS[fmt]}")
+    tmp = path + ".partial"
+    result = export_table(table, tmp, fmt=fmt, since=since, chunk_size=chunk_size)
+    if result["rows"] == 0:
+        os.remove(tmp)
+        return {"path": "", **result}
+    os.replace(tmp, path)
+    state[table] = result["high_water_mark"]
+    _save_state(out_dir, state)
+    return {"path": path, **result}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Export CheckMoYan scans/usage to Parquet or Arrow IPC.")
+    parser.add_argument("--table", choices=sorted(SCHEMAS), default="scans")
+    parser.add_argument("--out", default="exports", help="Output directory (holds the high-water-mark state).")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--full", action="store_true", help="Ignore the saved high-water mark and export everything.")
+    args = parser.parse_args(argv)
+    result = export_incremental(args.table, args.out, fmt=args.format, full=args.full, chunk_size=args.chunk_size)
+    if result["path"]:
+        print(f"Wrote {result['rows']} {args.table} rows to {result['path']} (high-water mark {result['high_water_mark']})")
+    else:
+        print(f"No new {args.table} rows since {result['high_water_mark']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Keyword and link heuristics: a best-effort verdict when the LLM is slow or unavailable.
+
+No model and no network: a handful of regexes for the red flags the system prompt lists
+(OTP requests, urgency, prize and loan lures, upfront fees, shortened or look-alike links).
+services.analysis returns this verdict, marked provisional, when the LLM misses its deadline
+or fails, instead of an uninformative SUSPICIOUS / 0.
+"""
+import re
+from urllib.parse import urlsplit
+
+SHORTENERS = {"bit.ly", "tinyurl.com", "goo.gl", "t.co", "cutt.ly", "is.gd", "ow.ly", "rb.gy", "shorturl.at", "s.id", "tiny.cc"}
+_URL_RE = re.compile(
+    r"https?://[^\s<>\"']+|www\.[^\s<>\"']+"
+    r"|\b(?:" + "|".join(re.escape(d) for d in SHORTENERS) + r")/[^\s<>\"']*"
+    r"|\b[\w-]+(?:\.[\w-]+)*\.(?:com|ph|net|org|xyz|top|site|link|info|click|online|shop|vip)\b[^\s<>\"']*",
+    re.I,
+)
+RISKY_TLDS = {"xyz", "top", "site", "link", "info", "click", "online", "shop", "vip"}
+# Brand -> (display name, official domains); a link naming the brand on any other domain is a look-alike
+BRAND_DOMAINS = {
+    "gcash": ("GCash", ("gcash.com",)),
+    "maya": ("Maya", ("maya.ph", "paymaya.com")),
+    "bdo": ("BDO", ("bdo.com.ph",)),
+    "bpi": ("BPI", ("bpi.com.ph",)),
+    "sss": ("SSS", ("sss.gov.ph",)),
+    "philhealth": ("PhilHealth", ("philhealth.gov.ph",)),
+    "pagibig": ("Pag-IBIG", ("pagibigfund.gov.ph",)),
+}
+
+# (red flag shown to the user, weight, pattern)
+KEYWORD_FLAGS = [
+    ("Asks for an OTP, PIN or password", 3, r"\b(otp|one[- ]time (pin|password|code)|pin code|mpin|password)\b"),
+    ("Urgency or threat (account suspended, act now)", 2, r"\b(urgent|immediately|within 24 ?(hours|hrs)|suspend(ed)?|locked|blocked|deactivat\w*|expire[sd]?|final notice|ngayon din|agad)\b"),
+    ("Prize or reward you did not enter for", 2, r"\b(congratulations|congrats|you (have )?won|winner|claim (your|now)|reward|prize|premyo|nanalo)\b"),
+    ("Upfront or processing fee", 3, r"\b(processing|registration|release|advance|reservation) fee\b|\bpay (a|the)? ?fee first\b"),
+    ("Easy loan offer", 2, r"\b(loan (is )?approved|pre-?approved loan|no collateral|instant loan|utang)\b"),
+    ("Work-from-home or high daily income offer", 2, r"\b(work from home|wfh|daily (income|salary|sahod)|earn \S+ (daily|per day|a day)|part[- ]time job)\b"),
+    ("Promised investment returns", 3, r"\b(double your (money|investment)|guaranteed (profit|returns?)|\d+% (daily|weekly) (profit|returns?))\b"),
+    ("Asks to verify or update your account", 2, r"\b(verify|update|confirm|re-?activate) (your )?(account|details|information|identity|kyc)\b"),
+]
+_KEYWORD_RES = [(flag, weight, re.compile(pattern, re.I)) for flag, weight, pattern in KEYWORD_FLAGS]
+
+# First match wins; checked against the lowercased message
+CATEGORY_HINTS = [
+    ("GCash phishing", r"g-?cash"),
+    ("Maya phishing", r"\b(pay)?maya\b"),
+    ("SSS/PhilHealth impersonation", r"\b(sss|philhealth|pag-?ibig)\b"),
+    ("Bank OTP scam", r"\b(bdo|bpi|metrobank|landbank|unionbank|security bank|rcbc)\b"),
+    ("Loan scam", r"\b(loan|utang)\b"),
+    ("Fake job offer", r"\b(job|hiring|work from home|wfh|sahod|salary)\b"),
+    ("Investment scam", r"\b(invest\w*|crypto|bitcoin|profit)\b"),
+]
+
+
+def _host(url: str) -> str:
+    url = url.rstrip(".,;:!?)]}")
+    if not re.match(r"https?://", url, re.I):
+        url = "http://" + url
+    try:
+        return (urlsplit(url).hostname or "").lower()
+    except ValueError:
+        return ""
+
+
+def link_flags(message: str) -> list:
+    """[(flag, weight)] for the links in message."""
+    flags = []
+    hosts = {h for h in (_host(u) for u in _URL_RE.findall(message or "")) if h}
+    for host in sorted(hosts):
+        bare = host[4:] if host.startswith("www.") else host
+        if bare in SHORTENERS:
+            flags.append((f"Shortened link hides the destination ({bare})", 2))
+        elif re.fullmatch(r"[\d.]+", bare):
+            flags.append((f"Link to a bare IP address ({bare})", 3))
+        elif bare.rsplit(".", 1)[-1] in RISKY_TLDS:
+            flags.append((f"Link on a domain type often used by scammers ({bare})", 2))
+        squashed = bare.replace("-", "")
+        for brand, (name, official) in BRAND_DOMAINS.items():
+            if brand in squashed and not any(bare == d or bare.endswith("." + d) for d in official):
+                flags.append((f"Link imitates {name} but is not its official site ({bare})", 3))
+    if hosts and not flags:
+        flags.append(("Contains a link (check it goes to the official site)", 1))
+    return flags
+
+
+def red_flags(message: str) -> list:
+    """[(flag, weight)] from keywords and links, strongest first."""
+    flags = [(flag, weight) for flag, weight, rx in _KEYWORD_RES if rx.search(message or "")]
+    flags += link_flags(message)
+    return sorted(flags, key=lambda fw: fw[1], reverse=True)
+
+
+def guess_category(message: str) -> str:
+    text = (message or "").lower()
+    return next((cat for cat, pattern in CATEGORY_HINTS if re.search(pattern, text)), "Unknown")
+
+
+def heuristic_verdict(message: str) -> dict:
+    """
+    A verdict dict (same keys as analyze_message) from red_flags alone. Never SAFE: without the
+    LLM, no red flags only means none of the common ones. Confidence stays below the LLM's SCAM band.
+    """
+    flags = red_flags(message)
+    score = sum(weight for _, weight in flags)
+    if score >= 5:
+        verdict, confidence = "SCAM", min(85, 55 + 5 * score)
+        warning = "This message has several common scam signs. Do not click links or send money."
+    elif score >= 2:
+        verdict, confidence = "SUSPICIOUS", min(65, 40 + 5 * score)
+        warning = "This message has some common scam signs. Verify before you act."
+    else:
+        verdict, confidence = "SUSPICIOUS", 30
+        warning = "No obvious scam signs, but verify through official channels before you act."
+    reasons = [flag for flag, _ in flags[:5]] or ["No common red flags (OTP requests, urgent threats, prize or loan offers, suspicious links) found."]
+    return {
+        "verdict": verdict,
+        "confidence": confidence,
+        "category": guess_category(message) if verdict != "SUSPICIOUS" or flags else "Unknown",
+        "reasons": reasons,
+        "recommended_actions": [
+            "Do not share OTP or personal details.",
+            "Do not click links or pay any fee until you verify.",
+            "Contact the official company/bank via their verified website or hotline.",
+        ],
+        "warning_message": warning,
+        "red_flags": [flag for flag, _ in flags[:10]],
+        "safety_notes": "Quick check of keywords and links only.",
+    }
@@ -0,0 +1,219 @@
+"""Background analysis jobs: a bounded thread pool so Streamlit script threads never wait on OpenAI.
+
+Pages submit a job, keep only its id in session_state, and poll get_job() (e.g. from a
+fragment) on later reruns. Jobs live in this process, not in the session, so they survive
+reruns and navigation. cancel() drops a queued job outright; a running LLM call can't be
+interrupted, but its result is discarded and its on_result callback is skipped. Analyses go
+through services.scheduler, so paying users' checks start first and share one OpenAI budget.
+
+on_abort() runs once if a job ends without delivering a result (failed, shed, cancelled, or its
+on_result raised), so a page that reserved the user's check at submit time can give it back.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = int(os.environ.get("CHECKMOYAN_ANALYSIS_WORKERS", "4"))
+MAX_PENDING = int(os.environ.get("CHECKMOYAN_ANALYSIS_MAX_PENDING", "64"))
+FINISHED_TTL_SECONDS = 600
+
+logger = logging.getLogger("checkmoyan.jobs")
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = "pending", "running", "done", "failed", "cancelled"
+
+_lock = threading.Lock()
+_jobs = {}  # job id -> dict
+_executor = {"pool": None}
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when MAX_PENDING jobs are already queued or running."""
+
+
+def _pool() -> ThreadPoolExecutor:
+    if _executor["pool"] is None:
+        _executor["pool"] = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="analysis")
+    return _executor["pool"]
+
+
+def _prune(now: float) -> None:
+    """Forget finished jobs nobody collected within FINISHED_TTL_SECONDS (caller holds _lock)."""
+    stale = [jid for jid, j in _jobs.items() if j["finished_at"] and now - j["finished_at"] > FINISHED_TTL_SECONDS]
+    for jid in stale:
+        del _jobs[jid]
+
+
+def _take_abort(job: dict):
+    """The job's on_abort callback, at most once; None after its result was delivered (caller holds _lock)."""
+    on_abort, job["on_abort"] = job.get("on_abort"), None
+    return on_abort
+
+
+def _call_abort(on_abort) -> None:
+    if on_abort is not None:
+        try:
+            on_abort()
+        except Exception:
+            logger.exception("job on_abort callback failed")
+
+
+def _run(job_id: str, fn, args, kwargs, on_result) -> None:
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job["status"] == CANCELLED:
+            return
+        job["status"] = RUNNING
+        job["started_at"] = time.time()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        with _lock:
+            job.update(status=FAILED, error=str(e)[:200], finished_at=time.time())
+            on_abort = _take_abort(job)
+        _call_abort(on_abort)
+        return
+    with _lock:
+        if job["status"] == CANCELLED:
+            return
+        on_abort = _take_abort(job)  # from here on a cancel no longer aborts: the result is delivered
+    if on_result is not None:
+        try:
+            on_result(result)
+        except Exception as e:
+            logger.exception("job on_result callback failed")
+            with _lock:
+                job.update(status=FAILED, error=str(e)[:200], finished_at=time.time())
+            _call_abort(on_abort)  # the user sees an error, not a result
+            return
+    with _lock:
+        job.update(status=DONE, result=result, finished_at=time.time())
+
+
+def _on_done(job_id: str, future) -> None:
+    """A job's future failed outside _run: the scheduler shed it under load."""
+    if future.cancelled() or future.exception() is None:
+        return
+    on_abort = None
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None and job["status"] in (PENDING, RUNNING):
+            job.update(status=FAILED, error=str(future.exception())[:200], finished_at=time.time())
+            on_abort = _take_abort(job)
+    _call_abort(on_abort)
+
+
+def submit(fn, *args, on_result=None, on_abort=None, priority: int = None, cost_tokens: int = 0, **kwargs) -> str:
+    """
+    Queue fn(*args, **kwargs); on_result(result) runs in the worker when it finishes, on_abort()
+    if it never delivers a result. Returns job id. Raises JobQueueFull (without calling on_abort).
+    With a priority (services.scheduler class), the job runs on the rate-limited priority scheduler.
+    """
+    now = time.time()
+    with _lock:
+        _prune(now)
+        active = sum(1 for j in _jobs.values() if j["status"] in (PENDING, RUNNING))
+        if active >= MAX_PENDING:
+            raise JobQueueFull("Too many checks in progress. Please try again in a moment.")
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "status": PENDING,
+            "result": None,
+            "error": "",
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "future": None,
+            "on_abort": on_abort,
+        }
+        if priority is None:
+            _jobs[job_id]["future"] = _pool().submit(_run, job_id, fn, args, kwargs, on_result)
+            return job_id
+    # The scheduler may shed another job (running its callback) inside submit: don't hold _lock
+    from services.scheduler import submit as schedule, Overloaded
+    try:
+        future = schedule(_run, job_id, fn, args, kwargs, on_result, priority=priority, cost_tokens=cost_tokens)
+    except Overloaded as e:
+        with _lock:
+            _jobs.pop(job_id, None)
+        raise JobQueueFull(str(e))
+    future.add_done_callback(lambda f: _on_done(job_id, f))
+    with _lock:
+        if job_id in _jobs:
+            _jobs[job_id]["future"] = future
+    return job_id
+
+
+def submit_analysis(
+    message: str,
+    channel: str = "",
+    language: str = "",
+    api_key: str = None,
+    on_result=None,
+    email: str = "",
+    deadline_seconds: float = None,
+    on_final=None,
+    on_abort=None,
+) -> str:
+    """
+    Queue analyze_message(message, ...) on the priority scheduler (class from email's plan). Returns job id.
+    A confident local-classifier verdict completes the job at once, without LLM budget. With
+    deadline_seconds the job may finish with a provisional verdict; on_final(result) gets the LLM's.
+    """
+    from services.analysis import analyze_message, classify_local
+    from services.scheduler import priority_for, estimate_tokens
+    local = classify_local(message)
+    if local is not None:
+        return submit(lambda: local, on_result=on_result, on_abort=on_abort)
+    return submit(
+        analyze_message,
+        message,
+        channel=channel,
+        language=language,
+        api_key=api_key,
+        use_local=False,
+        deadline_seconds=deadline_seconds,
+        on_final=on_final,
+        on_result=on_result,
+        on_abort=on_abort,
+        priority=priority_for(email),
+        cost_tokens=estimate_tokens(message),
+    )
+
+
+def get_job(job_id: str) -> dict | None:
+    """Return { status, result, error, elapsed } for a job, or None if unknown or expired."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        end = job["finished_at"] or time.time()
+        return {
+            "status": job["status"],
+            "result": job["result"],
+            "error": job["error"],
+            "elapsed": round(end - job["created_at"], 1),
+        }
+
+
+def cancel(job_id: str) -> bool:
+    """Cancel a job. Returns True if it was still pending or running."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job["status"] not in (PENDING, RUNNING):
+            return False
+        job["status"] = CANCELLED
+        job["finished_at"] = time.time()
+        if job["future"] is not None:
+            job["future"].cancel()
+        on_abort = _take_abort(job)
+    _call_abort(on_abort)
+    return True
+
+
+def forget(job_id: str) -> None:
+    """Drop a finished job once the page has collected its result."""
+    with _lock:
+        _jobs.pop(job_id, None)
@@ -0,0 +1,116 @@
+"""Precomputed public stats snapshot (live stats + trending + rising) for the landing page.
+
+A refresher recomputes stats and trending every REFRESH_SECONDS and publishes them as a JSON
+file replaced atomically (write temp + os.replace), so readers never see a partial file. The
+landing page only reads that file (re-parsed when its mtime changes) and never touches the DB,
+so its cost does not grow with traffic. Point CHECKMOYAN_SNAPSHOT_PATH at a shared volume and
+every replica serves the same snapshot; a replica skips its refresh while the file is fresh.
+
+Standalone refresher:  python -m services.public_stats --interval 30
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from db.instrumentation import set_page
+from db.queries import get_stats_today, get_trending_categories
+from services.sketches import rising
+
+SNAPSHOT_PATH = Path(
+    os.environ.get("CHECKMOYAN_SNAPSHOT_PATH")
+    or Path(__file__).resolve().parent.parent / "snapshots" / "public_stats.json"
+)
+REFRESH_SECONDS = int(os.environ.get("CHECKMOYAN_SNAPSHOT_INTERVAL", "30"))
+TRENDING_LIMIT = 10
+RISING_LIMIT = 3
+
+logger = logging.getLogger("checkmoyan.public_stats")
+
+_cache = {"mtime": None, "data": None}
+_refresher = {"thread": None}
+_refresher_lock = threading.Lock()
+
+
+def build_snapshot() -> dict:
+    """Compute the public stats from the DB, and rising categories from the streaming sketches."""
+    return {
+        "generated_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "stats": get_stats_today(),
+        "trending": get_trending_categories(TRENDING_LIMIT),
+        "rising": rising("category", RISING_LIMIT),
+    }
+
+
+def publish(snapshot: dict, path: Path = SNAPSHOT_PATH) -> None:
+    """Atomically replace the snapshot file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def read_snapshot(path: Path = SNAPSHOT_PATH) -> dict | None:
+    """Return the latest published snapshot, or None if none exists. No DB access."""
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    if _cache["mtime"] != mtime:
+        try:
+            with open(path, encoding="utf-8") as f:
+                _cache["data"] = json.load(f)
+            _cache["mtime"] = mtime
+        except (OSError, json.JSONDecodeError):
+            return _cache["data"]
+    return _cache["data"]
+
+
+def refresh_if_stale(max_age_seconds: int = REFRESH_SECONDS, path: Path = SNAPSHOT_PATH) -> bool:
+    """Rebuild and publish unless another refresher (any replica) published within max_age_seconds."""
+    try:
+        if time.time() - path.stat().st_mtime < max_age_seconds:
+            return False
+    except OSError:
+        pass
+    publish(build_snapshot(), path)
+    return True
+
+
+def _run(interval: int) -> None:
+    set_page("public_stats refresher")
+    while True:
+        try:
+            refresh_if_stale(interval)
+        except Exception:
+            # keep serving the last snapshot; retry next tick
+            logger.exception("public stats refresh failed")
+        time.sleep(interval)
+
+
+def start_refresher(interval: int = REFRESH_SECONDS) -> None:
+    """Start the background refresher thread once per process."""
+    with _refresher_lock:
+        if _refresher["thread"] is not None and _refresher["thread"].is_alive():
+            return
+        t = threading.Thread(target=_run, args=(interval,), name="public-stats-refresher", daemon=True)
+        t.start()
+        _refresher["thread"] = t
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Refresh the CheckMoYan public stats snapshot.")
+    parser.add_argument("--interval", type=int, default=REFRESH_SECONDS, help="Seconds between refreshes (0 = once).")
+    args = parser.parse_args(argv)
+    if args.interval <= 0:
+        publish(build_snapshot())
+        return
+    _run(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Content-addressed receipt storage: receipts/<aa>/<bb>/<sha256>.<ext>, plus a small JPEG thumbnail.
+
+Uploads are streamed to a temp file in the target directory while hashing, then moved into
+place with os.replace, so a file under its hash name is always complete and identical
+uploads share one file. The thumbnail is generated once, when a hash is first stored, so
+the admin queue shows small thumbnails and loads originals only on demand.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+RECEIPTS_DIR = Path(os.environ.get("CHECKMOYAN_RECEIPTS_DIR") or "receipts")
+THUMBS_DIRNAME = "thumbs"
+THUMB_MAX_PX = 320
+CHUNK_SIZE = 64 * 1024
+ALLOWED_EXTENSIONS = ("png", "jpg", "jpeg")
+
+
+def _shard(sha256: str) -> Path:
+    return Path(sha256[:2]) / sha256[2:4]
+
+
+def receipt_path(sha256: str, ext: str, root: Path = RECEIPTS_DIR) -> Path:
+    return root / _shard(sha256) / f"{sha256}.{ext}"
+
+
+def thumbnail_path(sha256: str, root: Path = RECEIPTS_DIR) -> Path:
+    return root / THUMBS_DIRNAME / _shard(sha256) / f"{sha256}.jpg"
+
+
+def _extension(filename: str) -> str:
+    ext = (filename or "").rsplit(".", 1)[-1].lower()
+    return ext if ext in ALLOWED_EXTENSIONS else "bin"
+
+
+def _make_thumbnail(src: Path, dst: Path) -> bool:
+    """Write a downscaled JPEG of src to dst (atomically). Returns False if Pillow can't read it."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        with Image.open(src) as im:
+            im.thumbnail((THUMB_MAX_PX, THUMB_MAX_PX))
+            im.convert("RGB").save(tmp, "JPEG", quality=70, optimize=True)
+        os.replace(tmp, dst)
+        return True
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+
+
+def save_receipt(fileobj, filename: str, root: Path = RECEIPTS_DIR) -> dict:
+    """
+    Stream fileobj into the store. Returns { sha256, path, thumb_path, existed }.
+    existed is True if identical bytes were already stored (a re-uploaded receipt).
+    """
+    ext = _extension(filename)
+    root.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=root, suffix=".upload")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if hasattr(fileobj, "seek"):
+                fileobj.seek(0)
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        sha256 = digest.hexdigest()
+        path = receipt_path(sha256, ext, root)
+        existed = path.exists()
+        if existed:
+            os.remove(tmp)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    thumb = thumbnail_path(sha256, root)
+    if not thumb.exists():
+        _make_thumbnail(path, thumb)
+    return {
+        "sha256": sha256,
+        "path": str(path),
+        "thumb_path": str(thumb) if thumb.exists() else "",
+        "existed": existed,
+    }
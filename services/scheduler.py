@@ -0,0 +1,234 @@
+"""Priority scheduler in front of analyze_message, with a shared OpenAI rate limiter.
+
+Every analysis is queued by priority class (Pro, then Premium, then Free, then offline batch
+work) and a fixed set of worker threads starts the highest-priority job whenever the provider
+budget allows. The budget is a pair of token buckets (requests per minute, tokens per minute)
+kept in a small SQLite file, so all threads and all processes on the host (Streamlit, api.py,
+services.batch) draw from the same OpenAI limits instead of each discovering them as 429s.
+
+Queues are bounded. Free and batch jobs may fill at most LOW_PRIORITY_SHARE of the queue; when
+the queue is full, a paying user's job evicts the newest queued lower-priority job, which fails
+with Overloaded. So under a free-tier burst, free checks are shed first.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+
+PRO, PREMIUM, FREE, BATCH = 0, 1, 2, 3
+PRIORITY_NAMES = {PRO: "pro", PREMIUM: "premium", FREE: "free", BATCH: "batch"}
+
+WORKERS = int(os.environ.get("CHECKMOYAN_SCHEDULER_WORKERS", "8"))
+MAX_QUEUED = int(os.environ.get("CHECKMOYAN_SCHEDULER_MAX_QUEUED", "64"))
+LOW_PRIORITY_SHARE = 0.5
+OPENAI_RPM = int(os.environ.get("CHECKMOYAN_OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.environ.get("CHECKMOYAN_OPENAI_TPM", "200000"))
+RATE_LIMIT_PATH = Path(
+    os.environ.get("CHECKMOYAN_RATE_LIMIT_PATH")
+    or Path(__file__).resolve().parent.parent / "ratelimit.db"
+)
+MAX_WAIT_SLICE = 0.5  # re-check the queue head at least this often while waiting for budget
+
+
+class Overloaded(RuntimeError):
+    """Raised (or set on the job's future) when a job is rejected or shed by the scheduler."""
+
+
+class TokenBucketLimiter:
+    """Requests/min and tokens/min buckets in a SQLite file shared by every thread and process."""
+
+    def __init__(self, path: Path = RATE_LIMIT_PATH, rpm: int = OPENAI_RPM, tpm: int = OPENAI_TPM):
+        self.path = Path(path)
+        self.capacity = {"requests": max(1, rpm), "tokens": max(1, tpm)}
+        self.rate = {name: cap / 60.0 for name, cap in self.capacity.items()}
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=10, isolation_level=None)
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, delta: dict, all_or_nothing: bool) -> float:
+        """Refill, then apply delta (negative = take). Returns seconds until the take would fit, 0 if applied."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            levels = {}
+            for name in delta:
+                row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+                full = self.capacity[name]
+                levels[name] = full if row is None else min(full, row[0] + (now - row[1]) * self.rate[name])
+            wait = max(0.0, max((-delta[n] - levels[n]) / self.rate[n] for n in delta))
+            if wait == 0 or not all_or_nothing:
+                levels = {n: min(self.capacity[n], levels[n] + delta[n]) for n in delta}
+            conn.executemany(
+                """INSERT INTO buckets (name, level, updated) VALUES (?, ?, ?)
+                   ON CONFLICT(name) DO UPDATE SET level = excluded.level, updated = excluded.updated""",
+                [(n, level, now) for n, level in levels.items()],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait if all_or_nothing else 0.0
+
+    def try_acquire(self, requests: int = 1, tokens: int = 0) -> float:
+        """Take from both buckets if both have enough (else take nothing). Returns 0.0 or seconds to wait."""
+        tokens = min(tokens, self.capacity["tokens"])
+        return self._update({"requests": -requests, "tokens": -tokens}, all_or_nothing=True)
+
+    def refund(self, requests: int = 1, tokens: int = 0) -> None:
+        """Give back budget taken for a job that did not run."""
+        tokens = min(tokens, self.capacity["tokens"])
+        self._update({"requests": requests, "tokens": tokens}, all_or_nothing=False)
+
+
+class Scheduler:
+    def __init__(self, limiter: TokenBucketLimiter, workers: int = WORKERS, max_queued: int = MAX_QUEUED):
+        self.limiter = limiter
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self._queues = {p: deque() for p in PRIORITY_NAMES}
+        self._cond = threading.Condition()
+        self._threads = []
+        self._shed = {p: 0 for p in PRIORITY_NAMES}
+
+    def _start(self) -> None:
+        """Start worker threads on first submit (caller holds _cond)."""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"analysis-scheduler-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn, *args, priority: int = FREE, cost_tokens: int = 0, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs). Returns a Future; raises Overloaded if the job can't be queued."""
+        future = Future()
+        victim = None
+        with self._cond:
+            self._start()
+            queued = sum(len(q) for q in self._queues.values())
+            low = len(self._queues[FREE]) + len(self._queues[BATCH])
+            if priority >= FREE and low >= int(self.max_queued * LOW_PRIORITY_SHARE):
+                self._shed[priority] += 1
+                raise Overloaded("Too many checks in progress. Please try again in a moment.")
+            if queued >= self.max_queued:
+                lower = [p for p in sorted(self._queues, reverse=True) if p > priority and self._queues[p]]
+                if not lower:
+                    self._shed[priority] += 1
+                    raise Overloaded("Too many checks in progress. Please try again in a moment.")
+                victim = self._queues[lower[0]].pop()[0]  # newest job of the lowest class
+                self._shed[lower[0]] += 1
+            self._queues[priority].append((future, fn, args, kwargs, cost_tokens))
+            self._cond.notify()
+        if victim is not None and victim.set_running_or_notify_cancel():
+            victim.set_exception(Overloaded("Shed under load to make room for higher-priority checks."))
+        return future
+
+    def _head(self):
+        """Highest-priority live job, dropping cancelled ones (caller holds _cond)."""
+        for p in sorted(self._queues):
+            q = self._queues[p]
+            while q and q[0][0].cancelled():
+                q.popleft()
+            if q:
+                return p, q[0]
+        return None, None
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                priority, item = self._head()
+                while item is None:
+                    self._cond.wait()
+                    priority, item = self._head()
+                cost = item[4]
+            wait = self.limiter.try_acquire(1, cost)
+            if wait > 0:
+                time.sleep(min(wait, MAX_WAIT_SLICE))
+                continue
+            with self._cond:
+                # Budget was taken for this job's cost. If a higher-priority job arrived meanwhile (or
+                # this one was cancelled), give it back and acquire again for the new head
+                head_priority, head = self._head()
+                if head is item:
+                    self._queues[head_priority].popleft()
+            if head is not item or not item[0].set_running_or_notify_cancel():
+                self.limiter.refund(1, cost)
+                continue
+            future, fn, args, kwargs, _ = item
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def stats(self) -> list:
+        """Per class: { priority, queued, shed }."""
+        with self._cond:
+            return [
+                {"priority": PRIORITY_NAMES[p], "queued": len(self._queues[p]), "shed": self._shed[p]}
+                for p in sorted(self._queues)
+            ]
+
+
+_instance = {"scheduler": None}
+_instance_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    with _instance_lock:
+        if _instance["scheduler"] is None:
+            _instance["scheduler"] = Scheduler(TokenBucketLimiter())
+        return _instance["scheduler"]
+
+
+def priority_for(email: str) -> int:
+    """Priority class from the user's active plan (expired Premium/Pro counts as Free)."""
+    from services.usage import active_plan
+    return {"pro": PRO, "premium": PREMIUM}.get(active_plan(email) if email else "free", FREE)
+
+
+def estimate_tokens(message: str) -> int:
+    """Rough TPM cost of one analysis: prompt at ~4 chars/token plus the completion cap."""
+    from services.analysis import SYSTEM_PROMPT, MAX_COMPLETION_TOKENS
+    return (len(SYSTEM_PROMPT) + len(message or "")) // 4 + MAX_COMPLETION_TOKENS
+
+
+def submit(fn, *args, priority: int = FREE, cost_tokens: int = 0, **kwargs) -> Future:
+    """Queue fn on the shared scheduler. Raises Overloaded if rejected."""
+    return get_scheduler().submit(fn, *args, priority=priority, cost_tokens=cost_tokens, **kwargs)
+
+
+def analyze(message: str, channel: str = "", language: str = "", api_key: str = None, priority: int = FREE) -> dict:
+    """
+    analyze_message through the scheduler, blocking until it has run. Raises Overloaded if shed.
+    Confident local-classifier verdicts return at once, without queueing or spending LLM budget.
+    """
+    from services.analysis import analyze_message, classify_local
+    local = classify_local(message)
+    if local is not None:
+        return local
+    future = submit(
+        analyze_message,
+        message,
+        channel=channel,
+        language=language,
+        api_key=api_key,
+        use_local=False,
+        priority=priority,
+        cost_tokens=estimate_tokens(message),
+    )
+    return future.result()
+
+
+def stats() -> list:
+    return get_scheduler().stats()
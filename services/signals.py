@@ -0,0 +1,73 @@
+"""Red flags and reasons as interned signals linked to scans (signals + scan_signals tables).
+
+scans.signals_json holds the first three reasons as JSON text, so red-flag analytics used to parse
+every row. record_check now passes signal_entries() to insert_scan, which interns each red flag and
+reason once in signals (kind, key, text) and links it in scan_signals(scan_id, signal_id), in the
+scan's own transaction. "Top red flags this week" is then an indexed aggregate
+(db.queries.get_top_signals). signals_json is still written for exports and the DuckDB side-car.
+
+Snowflake bulk-ingest scans are linked by the loader after COPY INTO (db.snowflake_ingest). Scans
+from before this are linked from their signals_json by the backfill, which resumes from a scan-id
+watermark:
+
+    python -m services.signals backfill
+"""
+import argparse
+import json
+import sys
+from db.instrumentation import set_page
+from db.queries import get_app_setting, iter_scans, link_scan_signals
+
+WATERMARK_KEY = "scan_signals.backfill_id"
+MAX_TEXT = 200
+MAX_PER_KIND = 10
+BATCH_ROWS = 5000
+
+
+def _entries(kind: str, items) -> list:
+    out, seen = [], set()
+    for item in (items or [])[:MAX_PER_KIND]:
+        text = " ".join(str(item).split())[:MAX_TEXT]
+        key = text.casefold().rstrip(" .!")
+        if key and key not in seen:
+            seen.add(key)
+            out.append((kind, key, text))
+    return out
+
+
+def signal_entries(red_flags: list = None, reasons: list = None) -> list:
+    """[(kind, key, text)] for insert_scan: kind "red_flag" or "reason", key the case-folded text it is interned by."""
+    return _entries("red_flag", red_flags) + _entries("reason", reasons)
+
+
+def _reasons(signals_json: str) -> list:
+    try:
+        reasons = json.loads(signals_json or "[]")
+    except (TypeError, ValueError):
+        return []
+    return reasons if isinstance(reasons, list) else []
+
+
+def backfill(batch_rows: int = BATCH_ROWS) -> int:
+    """Link the reasons in signals_json of every scan after the watermark. Returns scans processed."""
+    after_id = int(get_app_setting(WATERMARK_KEY) or 0)
+    total = 0
+    for rows in iter_scans(after_id, batch_rows):
+        links = [(r["id"], signal_entries(reasons=_reasons(r["signals_json"]))) for r in rows]
+        link_scan_signals([link for link in links if link[1]], WATERMARK_KEY, rows[-1]["id"])
+        total += len(rows)
+    return total
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Link stored CheckMoYan scans to interned signals.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("backfill", help="Link reasons from signals_json for scans after the watermark.")
+    b.add_argument("--batch", type=int, default=BATCH_ROWS, help="Scans per transaction.")
+    args = parser.parse_args(argv)
+    set_page("signals backfill")
+    print(json.dumps({"scans": backfill(args.batch)}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""Streaming heavy hitters and spike detection over incoming verdicts, without GROUP BY over scans.
+
+record_check feeds every SCAM / SUSPICIOUS verdict here: its category, red flags and canonical
+msg_hash. Each dimension is a Space-Saving sketch (at most CAPACITY keys, so memory is bounded
+however many distinct values arrive) whose counts decay exponentially at two half-lives: a
+slow one (the usual level) and a fast one (right now). A key is rising when its fast rate is
+RISING_RATIO times its slow rate. Decay is "forward": weights grow as exp(λ·(t - landmark))
+instead of every count shrinking on each tick, and the landmark is moved when weights get big.
+
+Sketches are mergeable. Every process publishes its own to SKETCH_DIR every PUBLISH_SECONDS
+(point CHECKMOYAN_SKETCH_DIR at a shared volume, like the public stats snapshot), and readers
+merge all recently published ones, so "rising right now" covers every replica. A file not
+rewritten for STALE_SECONDS (its process has exited) is deleted by the next reader; a live but
+quiet process re-publishes well within that.
+
+A msg_hash means nothing to an operator, so each tracked hash also keeps a label (its category
+and first red flag) for display.
+"""
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+DIMENSIONS = ("category", "red_flag", "msg_hash")
+CAPACITY = int(os.environ.get("CHECKMOYAN_SKETCH_CAPACITY", "200"))
+FAST_HALF_LIFE_SECONDS = 15 * 60
+SLOW_HALF_LIFE_SECONDS = 6 * 3600
+RISING_RATIO = 2.0
+MIN_RECENT = 3.0  # decayed fast count a key needs before it can be "rising"
+SKETCH_DIR = Path(
+    os.environ.get("CHECKMOYAN_SKETCH_DIR")
+    or Path(__file__).resolve().parent.parent / "snapshots" / "sketches"
+)
+PUBLISH_SECONDS = 30
+STALE_SECONDS = 600  # ignore files of replicas that stopped publishing
+MAX_EXPONENT = 500.0  # move the landmark before exp() overflows
+
+logger = logging.getLogger("checkmoyan.sketches")
+
+_LAMBDA_FAST = math.log(2) / FAST_HALF_LIFE_SECONDS
+_LAMBDA_SLOW = math.log(2) / SLOW_HALF_LIFE_SECONDS
+
+
+class DecayedSpaceSaving:
+    """Space-Saving top-k with forward-decayed counts. items: key -> [slow, fast, slow error]."""
+
+    def __init__(self, capacity: int = CAPACITY, landmark: float = None):
+        self.capacity = capacity
+        self.landmark = time.time() if landmark is None else landmark
+        self.items = {}
+
+    def _rebase(self, landmark: float) -> None:
+        """Express all weights relative to a later landmark."""
+        if landmark <= self.landmark:
+            return
+        ks = math.exp(-_LAMBDA_SLOW * (landmark - self.landmark))
+        kf = math.exp(-_LAMBDA_FAST * (landmark - self.landmark))
+        for entry in self.items.values():
+            entry[0] *= ks
+            entry[1] *= kf
+            entry[2] *= ks
+        self.landmark = landmark
+
+    def _floor(self) -> float:
+        """Smallest slow weight when full (what an unseen key may have had), else 0."""
+        if len(self.items) < self.capacity:
+            return 0.0
+        return min(entry[0] for entry in self.items.values())
+
+    def add(self, key: str, t: float = None, weight: float = 1.0) -> None:
+        t = time.time() if t is None else t
+        if _LAMBDA_FAST * (t - self.landmark) > MAX_EXPONENT:
+            self._rebase(t)
+        ws = weight * math.exp(_LAMBDA_SLOW * (t - self.landmark))
+        wf = weight * math.exp(_LAMBDA_FAST * (t - self.landmark))
+        entry = self.items.get(key)
+        if entry is not None:
+            entry[0] += ws
+            entry[1] += wf
+        elif len(self.items) < self.capacity:
+            self.items[key] = [ws, wf, 0.0]
+        else:
+            victim = min(self.items, key=lambda k: self.items[k][0])
+            floor = self.items.pop(victim)[0]
+            self.items[key] = [floor + ws, wf, floor]
+
+    def merge(self, other: "DecayedSpaceSaving") -> "DecayedSpaceSaving":
+        """A new sketch summarizing both streams (Space-Saving merge; keys absent from a full sketch get its floor)."""
+        a, b = self.copy(), other.copy()
+        landmark = max(a.landmark, b.landmark)
+        a._rebase(landmark)
+        b._rebase(landmark)
+        fa, fb = a._floor(), b._floor()
+        merged = {}
+        for key in set(a.items) | set(b.items):
+            ea, eb = a.items.get(key), b.items.get(key)
+            merged[key] = [
+                (ea[0] if ea else fa) + (eb[0] if eb else fb),
+                (ea[1] if ea else 0.0) + (eb[1] if eb else 0.0),
+                (ea[2] if ea else fa) + (eb[2] if eb else fb),
+            ]
+        out = DecayedSpaceSaving(max(a.capacity, b.capacity), landmark)
+        keep = sorted(merged, key=lambda k: merged[k][0], reverse=True)[:out.capacity]
+        out.items = {k: merged[k] for k in keep}
+        return out
+
+    def copy(self) -> "DecayedSpaceSaving":
+        out = DecayedSpaceSaving(self.capacity, self.landmark)
+        out.items = {k: list(v) for k, v in self.items.items()}
+        return out
+
+    def estimates(self, t: float = None) -> list:
+        """[{ key, count, recent, error }] at time t: decayed slow count, fast count, and the slow count's error bound."""
+        t = time.time() if t is None else t
+        ds = math.exp(-_LAMBDA_SLOW * (t - self.landmark))
+        df = math.exp(-_LAMBDA_FAST * (t - self.landmark))
+        return [
+            {"key": k, "count": s * ds, "recent": f * df, "error": e * ds}
+            for k, (s, f, e) in self.items.items()
+        ]
+
+    def to_dict(self) -> dict:
+        return {"capacity": self.capacity, "landmark": self.landmark, "items": self.items}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DecayedSpaceSaving":
+        out = cls(int(data["capacity"]), float(data["landmark"]))
+        out.items = {k: [float(x) for x in v] for k, v in data["items"].items()}
+        return out
+
+
+_state = {
+    "sketches": {d: DecayedSpaceSaving() for d in DIMENSIONS},
+    "labels": {},  # msg_hash -> "category · first red flag", for hashes the msg_hash sketch tracks
+    "dirty": False,
+    "published_at": 0.0,
+    "thread": None,
+}
+_lock = threading.Lock()
+_node = f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _normalize(value: str) -> str:
+    return " ".join(str(value).split()).strip().lower()[:120]
+
+
+def observe(verdict: str, category: str = "", red_flags: list = None, msg_hash: str = "", t: float = None) -> None:
+    """Feed one verdict. Only SCAM / SUSPICIOUS verdicts are counted."""
+    if verdict not in ("SCAM", "SUSPICIOUS"):
+        return
+    t = time.time() if t is None else t
+    with _lock:
+        sk = _state["sketches"]
+        if category and category not in ("Unknown", "Legitimate"):
+            sk["category"].add(category, t)
+        for flag in {_normalize(f) for f in (red_flags or []) if f}:
+            sk["red_flag"].add(flag, t)
+        if msg_hash:
+            sk["msg_hash"].add(msg_hash, t)
+            labels = _state["labels"]
+            flag = next((" ".join(str(f).split()) for f in red_flags or [] if f), "")
+            labels[msg_hash] = " · ".join(x for x in (category or "Unknown", flag[:80]) if x)
+            if len(labels) > 2 * CAPACITY:
+                _state["labels"] = {k: v for k, v in labels.items() if k in sk["msg_hash"].items}
+        _state["dirty"] = True
+    _start_publisher()
+
+
+def publish(directory: Path = SKETCH_DIR) -> None:
+    """Write this process' sketches for other replicas (atomic replace)."""
+    with _lock:
+        tracked = _state["sketches"]["msg_hash"].items
+        data = {
+            "node": _node,
+            "published_at": time.time(),
+            "sketches": {d: s.to_dict() for d, s in _state["sketches"].items()},
+            "labels": {k: v for k, v in _state["labels"].items() if k in tracked},
+        }
+        _state["dirty"] = False
+        _state["published_at"] = data["published_at"]
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{_node}.json"
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _publisher() -> None:
+    while True:
+        time.sleep(PUBLISH_SECONDS)
+        try:
+            if _state["dirty"] or time.time() - _state["published_at"] > STALE_SECONDS / 2:
+                publish()
+        except Exception:
+            # readers keep the last published file until it goes stale; retry next tick
+            logger.exception("sketch publish failed")
+
+
+def _start_publisher() -> None:
+    if _state["thread"] is not None:
+        return
+    with _lock:
+        if _state["thread"] is None:
+            _state["thread"] = threading.Thread(target=_publisher, name="sketch-publisher", daemon=True)
+            _state["thread"].start()
+
+
+def _replicas(directory: Path):
+    """Yield the published data of every other replica, deleting files that have gone stale."""
+    now = time.time()
+    try:
+        paths = list(directory.glob("*.json"))
+    except OSError:
+        paths = []
+    for path in paths:
+        if path.stem == _node:
+            continue
+        try:
+            if now - path.stat().st_mtime > STALE_SECONDS:
+                path.unlink(missing_ok=True)  # its process exited (a live one re-publishes sooner)
+                continue
+            with open(path, encoding="utf-8") as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def _merged(dimension: str, directory: Path = SKETCH_DIR) -> tuple:
+    """(sketch, msg_hash labels): this process' sketch for dimension merged with every other replica's."""
+    with _lock:
+        out = _state["sketches"][dimension].copy()
+        labels = dict(_state["labels"]) if dimension == "msg_hash" else {}
+    for data in _replicas(directory):
+        try:
+            out = out.merge(DecayedSpaceSaving.from_dict(data["sketches"][dimension]))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if dimension == "msg_hash":
+            for k, v in (data.get("labels") or {}).items():
+                labels.setdefault(k, v)
+    return out, labels
+
+
+def merged(dimension: str, directory: Path = SKETCH_DIR) -> DecayedSpaceSaving:
+    """This process' sketch for dimension merged with every other replica's recent one."""
+    return _merged(dimension, directory)[0]
+
+
+def heavy_hitters(dimension: str, limit: int = 10) -> list:
+    """Top keys by decayed count (half-life SLOW_HALF_LIFE_SECONDS): [{ key, count, error }]."""
+    rows = sorted(merged(dimension).estimates(), key=lambda r: r["count"], reverse=True)[:limit]
+    return [{"key": r["key"], "count": round(r["count"], 1), "error": round(r["error"], 1)} for r in rows]
+
+
+def rising(dimension: str, limit: int = 5) -> list:
+    """
+    Keys whose recent rate is at least RISING_RATIO times their usual rate, fastest first:
+    [{ key, label, rate_per_hour, usual_per_hour, ratio }]. Rates are decayed counts times the
+    decay rate. label is the key itself, except for msg_hash: its category and first red flag.
+    """
+    sketch, labels = _merged(dimension)
+    out = []
+    for r in sketch.estimates():
+        if r["recent"] < MIN_RECENT:
+            continue
+        rate = r["recent"] * _LAMBDA_FAST * 3600
+        usual = max(r["count"] - r["error"], 0.0) * _LAMBDA_SLOW * 3600
+        ratio = rate / usual if usual else float("inf")
+        if ratio >= RISING_RATIO:
+            out.append({
+                "key": r["key"],
+                "label": labels.get(r["key"], "Unknown") if dimension == "msg_hash" else r["key"],
+                "rate_per_hour": round(rate, 1),
+                "usual_per_hour": round(usual, 2),
+                "ratio": round(ratio, 1) if usual else None,
+            })
+    return sorted(out, key=lambda r: r["rate_per_hour"], reverse=True)[:limit]
@@ -0,0 +1,202 @@
+"""Canonical scam category taxonomy, and the fuzzy mapper from free-text (LLM) labels onto it.
+
+The LLM's category is free text, so one scam type used to arrive as "GCash phishing", "GCash
+Phishing Scam", "Gcash verification scam"... and trending split it into several rows. Every label
+is now mapped onto CATEGORIES at write time (analysis._parse_response and usage.record_check), so
+scans, the hourly rollup and the sketches only ever hold these names.
+
+Matching: the label's tokens (lowercased, hyphens joined, filler words such as "scam" dropped)
+are compared to every category name and synonym. A synonym scores by how much of it the label
+covers, plus a little for how much of the label it explains. Tokens of 5+ letters also match
+near-misspellings of a category's own name ("phising", "impersonaton"), never of a synonym:
+synonyms are short everyday words, and "shopping" is one letter from "shipping". The best category wins if it scores at least MIN_SCORE and no other category
+ties it; anything else is "Unknown". Results are cached per label.
+
+Ids are stable: never renumber or reuse one; add new categories at the end.
+
+Remap labels already stored:  python -m services.taxonomy remap [--dry-run]
+"""
+import argparse
+import difflib
+import re
+from functools import lru_cache
+
+MIN_SCORE = 0.6
+
+CATEGORIES = [
+    {
+        "id": 0,
+        "name": "Unknown",
+        "synonyms": ("other", "unclear", "uncategorized", "n/a", "none", "suspicious"),
+        "detail": "Other suspicious patterns. When in doubt, don’t click links or send money.",
+    },
+    {
+        "id": 1,
+        "name": "GCash phishing",
+        "synonyms": ("gcash", "gcash otp", "gcash verification", "gcash account"),
+        "detail": "Fake GCash links, OTP requests, or \"verify account\" messages. Never share OTP or click links from SMS.",
+    },
+    {
+        "id": 2,
+        "name": "Maya phishing",
+        "synonyms": ("maya", "paymaya"),
+        "detail": "Fake Maya app links or \"verify\" messages. Don’t click links; open the app directly.",
+    },
+    {
+        "id": 3,
+        "name": "Bank OTP scam",
+        "synonyms": ("bank", "bank phishing", "otp", "credit card", "card phishing", "bdo", "bpi", "metrobank", "landbank", "unionbank", "rcbc"),
+        "detail": "Calls or SMS pretending to be your bank asking for OTP or card details. Banks never ask for OTP.",
+    },
+    {
+        "id": 4,
+        "name": "Fake job offer",
+        "synonyms": ("job", "employment", "hiring", "recruitment", "task", "work from home", "online job"),
+        "detail": "Too-good job posts, upfront fees, or \"training\" payments. Real employers don’t ask for money.",
+    },
+    {
+        "id": 5,
+        "name": "Loan scam",
+        "synonyms": ("loan", "lending", "online loan", "loan app", "utang", "debt collection"),
+        "detail": "Instant loans with high fees, or \"processing\" charges before release. Use licensed lenders only.",
+    },
+    {
+        "id": 6,
+        "name": "Romance scam",
+        "synonyms": ("romance", "love", "dating", "catfish", "sweetheart"),
+        "detail": "Fake relationships leading to money requests or \"emergency\" help. Be wary of strangers asking for cash.",
+    },
+    {
+        "id": 7,
+        "name": "Investment scam",
+        "synonyms": ("investment", "crypto", "bitcoin", "ponzi", "pyramid", "trading", "double your money"),
+        "detail": "Guaranteed returns, crypto or \"exclusive\" deals. If it’s too good to be true, it usually is.",
+    },
+    {
+        "id": 8,
+        "name": "SSS/PhilHealth impersonation",
+        "synonyms": ("sss", "philhealth", "pagibig", "government impersonation", "government", "ayuda", "dswd"),
+        "detail": "Fake SSS/PhilHealth links or \"benefits\" forms. Use only official sites and hotlines.",
+    },
+    {
+        "id": 9,
+        "name": "E-wallet phishing",
+        "synonyms": ("ewallet", "wallet", "shopeepay", "grabpay", "coins ph"),
+        "detail": "Messages asking you to \"verify\" or \"unlock\" an e-wallet through a link. Open the wallet app directly instead.",
+    },
+    {
+        "id": 10,
+        "name": "Prize or raffle scam",
+        "synonyms": ("prize", "raffle", "lottery", "giveaway", "winner", "you won", "promo"),
+        "detail": "\"You won!\" messages that ask for a fee or your details to claim. Real promos never ask you to pay first.",
+    },
+    {
+        "id": 11,
+        "name": "Parcel delivery scam",
+        "synonyms": ("parcel", "delivery", "package", "courier", "shipping", "customs", "lbc", "jnt"),
+        "detail": "Fake \"failed delivery\" or customs fee messages with a payment link. Check with the courier’s official app.",
+    },
+    {
+        "id": 12,
+        "name": "Legitimate",
+        "synonyms": ("safe", "legit", "genuine", "not a scam"),
+        "detail": "Looks like a normal message. Still, never share OTPs or passwords.",
+    },
+]
+
+# Words that say nothing about the type ("GCash phishing scam attempt" is "GCash phishing")
+FILLER = frozenset({
+    "scam", "scams", "fraud", "fraudulent", "attempt", "message", "messages", "sms", "text", "type",
+    "possible", "potential", "likely", "suspected", "related", "a", "an", "the", "of", "and", "or", "via", "from",
+})
+
+_BY_ID = {c["id"]: c for c in CATEGORIES}
+_BY_NAME = {c["name"]: c for c in CATEGORIES}
+
+
+def _tokens(label: str) -> frozenset:
+    text = re.sub(r"(?<=\w)[-.&](?=\w)", "", (label or "").lower())  # e-wallet, pag-ibig, j&t, coins.ph
+    return frozenset(t for t in re.findall(r"[a-z0-9]+", text) if t not in FILLER)
+
+
+# (category id, name or synonym tokens, fuzzy) for every name (fuzzy) and synonym (exact only)
+_ENTRIES = [
+    (c["id"], _tokens(s), s == c["name"]) for c in CATEGORIES for s in (c["name"], *c["synonyms"]) if _tokens(s)
+]
+
+
+def _token_match(token: str, tokens: frozenset, fuzzy: bool) -> bool:
+    if token in tokens:
+        return True
+    return fuzzy and len(token) >= 5 and any(
+        len(t) >= 5 and difflib.SequenceMatcher(None, token, t).ratio() >= 0.85 for t in tokens
+    )
+
+
+def _score(label_tokens: frozenset, entry_tokens: frozenset, fuzzy: bool) -> float:
+    hits = sum(1 for t in entry_tokens if _token_match(t, label_tokens, fuzzy))
+    if not hits:
+        return 0.0
+    return 0.7 * hits / len(entry_tokens) + 0.3 * min(hits / len(label_tokens), 1.0)
+
+
+@lru_cache(maxsize=4096)
+def category_id(label: str) -> int:
+    """The taxonomy id for a free-text label (0, Unknown, when nothing matches clearly)."""
+    tokens = _tokens(label)
+    if not tokens:
+        return 0
+    best = {}
+    for cid, entry_tokens, fuzzy in _ENTRIES:
+        score = _score(tokens, entry_tokens, fuzzy)
+        if score > best.get(cid, 0.0):
+            best[cid] = score
+    ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)
+    if not ranked or ranked[0][1] < MIN_SCORE:
+        return 0
+    if len(ranked) > 1 and ranked[1][1] == ranked[0][1]:
+        return 0  # "phishing" alone: GCash or Maya? Don't guess
+    return ranked[0][0]
+
+
+def canonical_category(label: str) -> str:
+    """The taxonomy name for a free-text label."""
+    if label in _BY_NAME:
+        return label
+    return _BY_ID[category_id((label or "").strip())]["name"]
+
+
+def category_name(cid: int) -> str:
+    return _BY_ID.get(cid, _BY_ID[0])["name"]
+
+
+def category_detail(label: str) -> str:
+    """Short safety description for a label's category."""
+    return _BY_ID[category_id((label or "").strip())]["detail"]
+
+
+def remap_stored(dry_run: bool = False) -> dict:
+    """Map every category label already stored onto the taxonomy. Returns { old label: new name } for changed labels."""
+    from db.queries import list_stored_categories, rename_category
+    changes = {}
+    for label in list_stored_categories():
+        name = canonical_category(label)
+        if name != label:
+            changes[label] = name
+            if not dry_run:
+                rename_category(label, name)
+    return changes
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Map stored CheckMoYan scan categories onto the taxonomy.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("remap", help="Rewrite non-canonical labels in scans, category_hourly and community_alerts.")
+    r.add_argument("--dry-run", action="store_true", help="Only print what would change.")
+    args = parser.parse_args(argv)
+    for old, new in remap_stored(dry_run=args.dry_run).items():
+        print(f"{old!r} -> {new!r}")
+
+
+if __name__ == "__main__":
+    main()
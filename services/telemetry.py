@@ -0,0 +1,55 @@
+"""Analysis cost and latency rollups for Admin → AI cost, from the analysis_metrics table.
+
+analyze_message reports tokens, latency, retries and the answering tier (local or llm) per analysis; record_check (and the batch
+CLI) store them. Cost is computed here from MODEL_PRICES so a price change only needs an edit
+here, not a backfill.
+"""
+from db.queries import get_analysis_metrics_daily
+
+# USD per 1M tokens: (input, output, cached input). Unknown models fall back to DEFAULT_MODEL.
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+}
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """Cost of one call (or a sum of calls) on model. Cached prompt tokens are billed at the cached rate."""
+    prices = next((p for name, p in MODEL_PRICES.items() if (model or "").startswith(name)), MODEL_PRICES[DEFAULT_MODEL])
+    price_in, price_out, price_cached = prices
+    cached = min(cached_tokens or 0, prompt_tokens or 0)
+    return ((prompt_tokens - cached) * price_in + cached * price_cached + completion_tokens * price_out) / 1_000_000
+
+
+def daily_metrics(days: int = 14) -> list:
+    """get_analysis_metrics_daily rows with cost_usd added."""
+    rows = get_analysis_metrics_daily(days)
+    for r in rows:
+        r["cost_usd"] = round(
+            cost_usd(r["model"], r["prompt_tokens"] or 0, r["completion_tokens"] or 0, r["cached_tokens"] or 0), 4
+        )
+    return rows
+
+
+def summarize(rows: list) -> dict:
+    """
+    Totals over daily_metrics rows:
+    { calls, cost_usd, cost_per_call_usd, tokens, retries, error_rate, local_hit_rate, cache_hits }.
+    local_hit_rate is the share of live checks the local classifier answered without the LLM;
+    cache_hits counts batch analyses served from the verdict cache (source "cache").
+    """
+    calls = sum(r["calls"] for r in rows)
+    live = sum(r["calls"] for r in rows if r["source"] in ("local", "llm", "error"))
+    local = sum(r["calls"] for r in rows if r["source"] == "local")
+    cost = sum(r["cost_usd"] for r in rows)
+    errors = sum(r["calls"] for r in rows if r["source"] == "error")
+    return {
+        "calls": calls,
+        "cost_usd": round(cost, 4),
+        "cost_per_call_usd": round(cost / calls, 6) if calls else 0.0,
+        "tokens": sum((r["prompt_tokens"] or 0) + (r["completion_tokens"] or 0) for r in rows),
+        "retries": sum(r["retries"] or 0 for r in rows),
+        "error_rate": round(errors / calls, 3) if calls else 0.0,
+        "local_hit_rate": round(local / live, 3) if live else 0.0,
+        "cache_hits": sum(r["calls"] for r in rows if r["source"] == "cache"),
+    }
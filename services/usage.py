@@ -1,13 +1,26 @@
-"""Rate limits: free vs premium daily check limits (from Admin → Payment config, stored in DB)."""
+"""Rate limits: free vs premium daily check limits (from Admin → Payment config, stored in DB).
+
+Interactive checks reserve their slot up front (reserve_check: check the limit and count it
+under one lock), so several checks started at once in parallel sessions can't all pass the
+limit before any of them is counted. A check that never runs gives its slot back (release_check).
+"""
+import threading
+import zlib
+from datetime import datetime
+from services import sketches
+from services.signals import signal_entries
 from services.payments import get_payment_config
+from services.taxonomy import canonical_category
+from services.usage_counters import get_counters
 from db.queries import (
     ensure_user,
     get_user_plan,
-    get_usage_today,
-    record_usage,
     insert_scan,
+    insert_analysis_metrics,
 )
 
+_reserve_locks = [threading.Lock() for _ in range(16)]
+
 
 def _get_limits():
     """Daily limits from DB (Admin → Payment config)."""
@@ -20,27 +33,34 @@ def _get_limits():
         return 2, 9999
 
 
-def get_daily_limit(email: str) -> int:
-    """Return max checks per day for this user (free vs premium/pro)."""
-    if not email:
-        free, _ = _get_limits()
-        return free
-    ensure_user(email)
+def active_plan(email: str) -> str:
+    """Return "premium" or "pro" while the plan's premium_until has not passed, else "free"."""
     plan_info = get_user_plan(email)
     plan = (plan_info.get("plan") or "free").lower()
     premium_until = plan_info.get("premium_until")
     # If premium/pro but expired, treat as free
     if plan in ("premium", "pro") and premium_until:
-        from datetime import datetime
         try:
-            until = datetime.strptime(premium_until, "%Y-%m-%d").date()
+            until = datetime.strptime(str(premium_until)[:10], "%Y-%m-%d").date()
             if until >= datetime.utcnow().date():
-                _, premium = _get_limits()
-                return premium
+                return plan
         except Exception:
             pass
-    free, _ = _get_limits()
-    return free
+    return "free"
+
+
+def get_daily_limit(email: str) -> int:
+    """Return max checks per day for this user (free vs premium/pro)."""
+    free, premium = _get_limits()
+    if not email:
+        return free
+    ensure_user(email)
+    return premium if active_plan(email) in ("premium", "pro") else free
+
+
+def get_usage_today(email: str) -> int:
+    """Checks used today: the usage table plus this process' not yet flushed checks."""
+    return get_counters().used_today(email or "anonymous")
 
 
 def can_user_check(email: str) -> tuple[bool, str]:
@@ -54,6 +74,32 @@ def can_user_check(email: str) -> tuple[bool, str]:
     return True, ""
 
 
+def count_check(email: str, n: int = 1, date: str = None) -> None:
+    """Count n checks against email's daily limit (services.usage_counters); negative n gives them back."""
+    get_counters().increment(email or "anonymous", n, date)
+
+
+def reserve_check(email: str) -> tuple[str, str]:
+    """
+    Count one check now if the user is under today's limit. Returns (reservation, "") on
+    success, to pass to release_check if the check never runs, else ("", reason).
+    """
+    key = (email or "anonymous").strip().lower()
+    with _reserve_locks[zlib.crc32(key.encode("utf-8")) % len(_reserve_locks)]:
+        ok, err = can_user_check(email)
+        if not ok:
+            return "", err
+        day = datetime.utcnow().strftime("%Y-%m-%d")
+        count_check(email, 1, day)
+    return day, ""
+
+
+def release_check(email: str, reservation: str) -> None:
+    """Give back a check reserved with reserve_check (on the day it was reserved)."""
+    if reservation:
+        count_check(email, -1, reservation)
+
+
 def record_check(
     email: str,
     verdict: str,
@@ -61,14 +107,32 @@ def record_check(
     category: str,
     signals_json: str,
     msg_hash: str,
+    metrics: dict = None,
+    red_flags: list = None,
+    reasons: list = None,
+    count_usage: bool = True,
 ) -> None:
-    """Record usage and insert scan row (no raw message)."""
-    record_usage(email or "anonymous")
-    insert_scan(
+    """
+    Count the check (services.usage_counters), feed the streaming sketches (services.sketches),
+    insert scan row (no raw message) with its red flags and reasons linked (services.signals) and
+    the analysis' metrics if any. The category is stored as its services.taxonomy name, whatever
+    label the result carries. count_usage=False when the check was already counted (reserve_check).
+    """
+    category = canonical_category(category) if category else ""
+    if count_usage:
+        count_check(email)
+    try:
+        sketches.observe(verdict, category, red_flags, msg_hash)
+    except Exception:
+        pass  # trend analytics never fail a check
+    scan_id = insert_scan(
         email=(email or "anonymous"),
         verdict=verdict,
         confidence=confidence,
         category=category or "",
         signals_json=signals_json or "[]",
         msg_hash=msg_hash or "",
+        signals=signal_entries(red_flags, reasons),
     )
+    if metrics:
+        insert_analysis_metrics(scan_id=scan_id, **metrics)  # scan_id is None under Snowflake bulk ingest
@@ -0,0 +1,167 @@
+"""In-process striped usage counters, flushed to the usage table in batches.
+
+Usage used to be one UPSERT (Snowflake: MERGE) one row per check, and every anonymous check
+hit the same ("anonymous", today) row, which serialized writers under a viral spike. Checks
+are now counted in memory, in STRIPES independently locked dicts keyed by (email, date), and
+a flusher thread writes the accumulated deltas with one batched db.queries.add_usage every
+FLUSH_SECONDS (sooner when MAX_PENDING checks are waiting). A crash loses at most the
+unflushed deltas of that window; a clean exit flushes them (atexit). While flushes fail (DB
+down), deltas stay pending and the failure is logged every FAILURE_LOG_SECONDS with the number
+of checks waiting.
+
+Limits are enforced from the local view: the row count last read from the DB (refreshed after
+BASE_TTL_SECONDS) plus this process' unflushed checks. Replicas only ever add deltas, so the
+table stays the exact sum across replicas; each replica sees the others' checks on its next
+refresh, so a user can overshoot a limit by at most what other replicas counted in that window.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+
+STRIPES = 16
+FLUSH_SECONDS = float(os.environ.get("CHECKMOYAN_USAGE_FLUSH_SECONDS", "2"))
+BASE_TTL_SECONDS = float(os.environ.get("CHECKMOYAN_USAGE_BASE_TTL_SECONDS", "10"))
+MAX_PENDING = int(os.environ.get("CHECKMOYAN_USAGE_MAX_PENDING", "1000"))
+FAILURE_LOG_SECONDS = 60
+
+logger = logging.getLogger("checkmoyan.usage_counters")
+
+
+def _today() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+class _Stripe:
+    __slots__ = ("lock", "pending", "base")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}  # (email, date) -> checks not yet written
+        self.base = {}  # (email, date) -> (checks_count in the DB when read or flushed, read at)
+
+
+class UsageCounters:
+    def __init__(self, stripes: int = STRIPES, flush_seconds: float = FLUSH_SECONDS, base_ttl: float = BASE_TTL_SECONDS):
+        self._stripes = [_Stripe() for _ in range(max(1, stripes))]
+        self.flush_seconds = flush_seconds
+        self.base_ttl = base_ttl
+        self._pending_total = 0
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _stripe(self, email: str) -> _Stripe:
+        return self._stripes[zlib.crc32(email.encode("utf-8")) % len(self._stripes)]
+
+    def increment(self, email: str, n: int = 1, date: str = None) -> None:
+        """Count n checks for email on date (default today; written to the DB by the next flush)."""
+        key = ((email or "anonymous").strip().lower(), date or _today())
+        stripe = self._stripe(key[0])
+        with stripe.lock:
+            stripe.pending[key] = stripe.pending.get(key, 0) + n
+        self._pending_total += n  # approximate (unlocked); only decides when to flush early
+        self._start()
+        if self._pending_total >= MAX_PENDING:
+            self._wake.set()
+
+    def used_today(self, email: str) -> int:
+        """The DB count (at most base_ttl old) plus this process' unflushed checks."""
+        from db.queries import get_usage_today
+        key = ((email or "anonymous").strip().lower(), _today())
+        stripe = self._stripe(key[0])
+        with stripe.lock:
+            base = stripe.base.get(key)
+            pending = stripe.pending.get(key, 0)
+        if base is None or time.monotonic() - base[1] > self.base_ttl:
+            # Under _flush_lock no delta is in flight, so the DB count and pending don't overlap
+            with self._flush_lock:
+                count = get_usage_today(key[0])
+                with stripe.lock:
+                    base = stripe.base[key] = (count, time.monotonic())
+                    pending = stripe.pending.get(key, 0)
+        return base[0] + pending
+
+    def flush(self) -> int:
+        """Write all unflushed deltas in one batch. Returns the number of checks written."""
+        with self._flush_lock:
+            taken = []
+            for stripe in self._stripes:
+                with stripe.lock:
+                    if stripe.pending:
+                        taken.append((stripe, dict(stripe.pending)))
+            deltas = [(email, date, n) for _, pending in taken for (email, date), n in pending.items()]
+            if not deltas:
+                return 0
+            from db.queries import add_usage
+            add_usage(deltas)  # on error nothing was taken out of pending; the next flush retries
+            # Move the written deltas from pending into base, so used_today never counts them twice or zero times
+            today = _today()
+            for stripe, pending in taken:
+                with stripe.lock:
+                    for key, n in pending.items():
+                        left = stripe.pending.get(key, 0) - n
+                        if left > 0:
+                            stripe.pending[key] = left
+                        else:
+                            stripe.pending.pop(key, None)
+                        if key in stripe.base:
+                            count, read_at = stripe.base[key]
+                            stripe.base[key] = (count + n, read_at)
+                    for key in [k for k in stripe.base if k[1] != today]:
+                        del stripe.base[key]
+            written = sum(n for _, _, n in deltas)
+            self._pending_total = max(0, self._pending_total - written)
+            return written
+
+    def _run(self) -> None:
+        failing_since, logged_at = None, 0.0
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Deltas stay pending; retry next tick
+                now = time.monotonic()
+                failing_since = failing_since or now
+                if now - logged_at >= FAILURE_LOG_SECONDS:
+                    logged_at = now
+                    logger.exception(
+                        "usage flush failing for %.0f s; %d checks pending", now - failing_since, self._pending_total
+                    )
+                continue
+            if failing_since is not None:
+                logger.warning("usage flush recovered after %.0f s", time.monotonic() - failing_since)
+                failing_since, logged_at = None, 0.0
+
+    def _start(self) -> None:
+        """Start the flusher thread once per process."""
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="usage-flusher", daemon=True)
+                self._thread.start()
+                atexit.register(self._flush_at_exit)
+
+    def _flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("usage flush at exit failed; %d checks lost", self._pending_total)
+
+
+_instance = {"counters": None}
+_instance_lock = threading.Lock()
+
+
+def get_counters() -> UsageCounters:
+    with _instance_lock:
+        if _instance["counters"] is None:
+            _instance["counters"] = UsageCounters()
+        return _instance["counters"]
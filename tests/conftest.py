@@ -0,0 +1,15 @@
+"""The repo root has an __init__.py (the UI components), so pytest would collect it as a package
+and import it, pulling in Streamlit. Collect it as a plain directory: the tests import db and
+services as top-level packages (pytest.ini puts the root on sys.path)."""
+import pytest
+
+
+class _RootDirectory:
+    @staticmethod
+    def pytest_collect_directory(path, parent):
+        if path == parent.config.rootpath:
+            return pytest.Dir.from_parent(parent, path=path)
+
+
+def pytest_configure(config):
+    config.pluginmanager.register(_RootDirectory(), "checkmoyan-root-directory")
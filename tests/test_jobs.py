@@ -0,0 +1,107 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from services import jobs, scheduler
+
+
+class Aborts:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+
+
+def _finished(job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get_job(job_id)
+        if job["status"] not in (jobs.PENDING, jobs.RUNNING):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def _fail():
+    raise RuntimeError("openai down")
+
+
+def _raise(result):
+    raise RuntimeError("database is locked")
+
+
+def test_done_job_never_aborts():
+    on_abort, delivered = Aborts(), []
+    job_id = jobs.submit(lambda: "verdict", on_result=delivered.append, on_abort=on_abort)
+
+    job = _finished(job_id)
+    assert (job["status"], job["result"], delivered, on_abort.calls) == (jobs.DONE, "verdict", ["verdict"], 0)
+    assert jobs.cancel(job_id) is False
+    assert on_abort.calls == 0
+
+
+def test_failed_job_aborts_once():
+    on_abort, delivered = Aborts(), []
+    job_id = jobs.submit(_fail, on_result=delivered.append, on_abort=on_abort)
+
+    job = _finished(job_id)
+    assert (job["status"], job["error"], delivered, on_abort.calls) == (jobs.FAILED, "openai down", [], 1)
+    assert jobs.cancel(job_id) is False
+    assert on_abort.calls == 1
+
+
+def test_failed_on_result_aborts():
+    on_abort = Aborts()
+    job_id = jobs.submit(lambda: "verdict", on_result=_raise, on_abort=on_abort)
+
+    job = _finished(job_id)
+    assert (job["status"], job["result"], on_abort.calls) == (jobs.FAILED, None, 1)
+
+
+def test_cancelled_running_job_aborts_once_and_drops_its_result():
+    on_abort, delivered = Aborts(), []
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "verdict"
+
+    job_id = jobs.submit(slow, on_result=delivered.append, on_abort=on_abort)
+    assert started.wait(5)
+    assert jobs.cancel(job_id) is True
+    assert jobs.cancel(job_id) is False
+    release.set()
+    time.sleep(0.1)
+
+    assert jobs.get_job(job_id)["status"] == jobs.CANCELLED
+    assert (delivered, on_abort.calls) == ([], 1)
+
+
+def test_shed_job_aborts_once(monkeypatch):
+    future = Future()
+    monkeypatch.setattr(scheduler, "submit", lambda *args, **kwargs: future)
+    on_abort = Aborts()
+    job_id = jobs.submit(lambda: "verdict", on_abort=on_abort, priority=scheduler.FREE)
+
+    assert future.set_running_or_notify_cancel()
+    future.set_exception(scheduler.Overloaded("Shed under load"))
+
+    job = jobs.get_job(job_id)
+    assert (job["status"], job["error"], on_abort.calls) == (jobs.FAILED, "Shed under load", 1)
+    assert jobs.cancel(job_id) is False
+    assert on_abort.calls == 1
+
+
+def test_rejected_job_does_not_abort(monkeypatch):
+    def overloaded(*args, **kwargs):
+        raise scheduler.Overloaded("Too many checks in progress.")
+
+    monkeypatch.setattr(scheduler, "submit", overloaded)
+    on_abort = Aborts()
+    with pytest.raises(jobs.JobQueueFull):
+        jobs.submit(lambda: "verdict", on_abort=on_abort, priority=scheduler.FREE)
+    assert on_abort.calls == 0  # the caller still holds its reservation and releases it itself
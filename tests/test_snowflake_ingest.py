@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from db import _sqlite_schema, snowflake_ingest
+from db.snowflake_ingest import LocalStage, flush, spool_scan
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(_sqlite_schema, "DB_PATH", tmp_path / "checkmoyan.db")
+    _sqlite_schema.init_db()
+    conn = _sqlite_schema.get_conn()
+    yield conn
+    conn.close()
+
+
+def _counter(conn, name):
+    row = conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+    return row["value"] if row else 0
+
+
+def _later():
+    return datetime.utcnow() + timedelta(minutes=2)  # every spooled minute is sealed
+
+
+def test_local_stage_loads_spooled_scans(conn, tmp_path):
+    spool, stage = tmp_path / "spool", LocalStage(tmp_path / "stage")
+    scans_before = _counter(conn, "scans")
+    spool_scan("A@Example.com", "SCAM", 95, "GCash phishing", '["Asks for OTP"]', "v2:a",
+               [("red_flag", "asks for otp", "Asks for OTP")], spool_dir=spool)
+    spool_scan("b@example.com", "SAFE", 80, "", "[]", "v2:b", spool_dir=spool)
+    spool_scan("c@example.com", "SCAM", 90, "Loan scam", "[]", "v2:c", spool_dir=spool)
+
+    assert flush(stage, spool, now=_later()) == 1
+
+    rows = conn.execute(
+        "SELECT id, email, verdict, category, msg_hash FROM scans WHERE email LIKE '%@example.com' ORDER BY id"
+    ).fetchall()
+    assert [(r["email"], r["verdict"], r["category"], r["msg_hash"]) for r in rows] == [
+        ("a@example.com", "SCAM", "GCash phishing", "v2:a"),
+        ("b@example.com", "SAFE", "", "v2:b"),
+        ("c@example.com", "SCAM", "Loan scam", "v2:c"),
+    ]
+    assert all(r["id"] for r in rows)  # ids from the column default
+    assert _counter(conn, "scans") == scans_before + 3
+    linked = conn.execute(
+        "SELECT ss.scan_id, s.text FROM scan_signals ss JOIN signals s ON s.id = ss.signal_id"
+    ).fetchall()
+    assert [(r["scan_id"], r["text"]) for r in linked] == [(rows[0]["id"], "Asks for OTP")]
+
+    assert list(spool.iterdir()) == []
+    assert list((tmp_path / "stage").iterdir()) == []  # PURGE = TRUE
+    assert flush(stage, spool, now=_later()) == 0
+
+
+def test_local_stage_skips_batches_it_already_loaded(conn, tmp_path):
+    spool, stage = tmp_path / "spool", LocalStage(tmp_path / "stage")
+    spool_scan("d@example.com", "SCAM", 90, "", "[]", "v2:d", spool_dir=spool)
+    batches = snowflake_ingest.seal(spool, _later())
+
+    stage.load(batches)
+    stage.load(batches)  # a crash between COPY and cleanup: the retry must not duplicate rows
+
+    n = conn.execute("SELECT COUNT(*) AS n FROM scans WHERE email = 'd@example.com'").fetchone()["n"]
+    assert n == 1
+
+
+def test_unsealed_minute_stays_in_the_spool(conn, tmp_path):
+    spool = tmp_path / "spool"
+    spool_scan("e@example.com", "SCAM", 90, "", "[]", "v2:e", spool_dir=spool)
+
+    assert flush(LocalStage(tmp_path / "stage"), spool, now=datetime.utcnow()) == 0
+    assert [p.suffix for p in spool.iterdir()] == [".csv"]
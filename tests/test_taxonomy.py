@@ -0,0 +1,39 @@
+import pytest
+
+from services.analysis import SYSTEM_PROMPT
+from services.taxonomy import CATEGORIES, canonical_category
+
+
+@pytest.mark.parametrize(
+    "label, expected",
+    [
+        ("GCash phishing", "GCash phishing"),
+        ("GCash Phishing Scam", "GCash phishing"),
+        ("Gcash verification scam", "GCash phishing"),
+        ("GCash phising attempt", "GCash phishing"),
+        ("PayMaya phishing", "Maya phishing"),
+        ("BDO OTP scam", "Bank OTP scam"),
+        ("Work-from-home job scam", "Fake job offer"),
+        ("Online lending app scam", "Loan scam"),
+        ("Crypto investment fraud", "Investment scam"),
+        ("SSS impersonaton", "SSS/PhilHealth impersonation"),
+        ("E-wallet phishing", "E-wallet phishing"),
+        ("LBC parcel delivery scam", "Parcel delivery scam"),
+        ("Shipping fee scam", "Parcel delivery scam"),
+        ("Not a scam", "Legitimate"),
+        ("phishing", "Unknown"),  # GCash or Maya: don't guess
+        ("", "Unknown"),
+    ],
+)
+def test_canonical_category(label, expected):
+    assert canonical_category(label) == expected
+
+
+@pytest.mark.parametrize("label", ["Shopping scam", "Online shopping scam", "Fake online shop"])
+def test_shopping_is_not_shipping(label):
+    assert canonical_category(label) != "Parcel delivery scam"
+
+
+def test_prompt_lists_every_category():
+    for c in CATEGORIES:
+        assert c["name"] in SYSTEM_PROMPT
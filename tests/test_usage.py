@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from db import _sqlite_schema
+from services import usage, usage_counters
+from services.usage_counters import UsageCounters
+
+EMAIL = "free@example.com"
+
+
+@pytest.fixture(autouse=True)
+def counters(tmp_path, monkeypatch):
+    monkeypatch.setattr(_sqlite_schema, "DB_PATH", tmp_path / "checkmoyan.db")
+    _sqlite_schema.init_db()
+    monkeypatch.setattr(UsageCounters, "_start", lambda self: None)
+    monkeypatch.setitem(usage_counters._instance, "counters", UsageCounters())
+    monkeypatch.setattr(usage, "_get_limits", lambda: (2, 9999))
+    return usage_counters._instance["counters"]
+
+
+def test_parallel_reservations_stop_at_the_limit():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: usage.reserve_check(EMAIL), range(8)))
+
+    reserved = [r for r, _ in results if r]
+    assert len(reserved) == 2
+    assert all(reason for r, reason in results if not r)
+    assert usage.get_usage_today(EMAIL) == 2
+
+
+def test_release_gives_the_check_back(counters):
+    reservation, reason = usage.reserve_check(EMAIL)
+    assert (bool(reservation), reason) == (True, "")
+    assert usage.get_usage_today(EMAIL) == 1
+
+    usage.release_check(EMAIL, reservation)
+    assert usage.get_usage_today(EMAIL) == 0
+    usage.release_check(EMAIL, "")  # no reservation: nothing to give back
+    counters.flush()
+    assert usage.get_usage_today(EMAIL) == 0
+
+
+def test_release_goes_to_the_day_of_the_reservation(counters):
+    usage.release_check(EMAIL, "2000-01-01")  # reserved before midnight, released after
+    assert usage.get_usage_today(EMAIL) == 0
+    assert counters._stripe(EMAIL).pending == {(EMAIL, "2000-01-01"): -1}
+
+
+def test_recorded_check_is_not_counted_twice():
+    usage.reserve_check(EMAIL)
+    usage.record_check(EMAIL, "SAFE", 80, "", "[]", "v2:a", count_usage=False)
+    assert usage.get_usage_today(EMAIL) == 1
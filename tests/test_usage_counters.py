@@ -0,0 +1,106 @@
+import pytest
+
+import db.queries
+from db import _sqlite_schema
+from services import usage_counters
+from services.usage_counters import UsageCounters
+
+EMAIL = "user@example.com"
+
+
+@pytest.fixture
+def counters(tmp_path, monkeypatch):
+    monkeypatch.setattr(_sqlite_schema, "DB_PATH", tmp_path / "checkmoyan.db")
+    _sqlite_schema.init_db()
+    monkeypatch.setattr(UsageCounters, "_start", lambda self: None)  # the tests flush by hand
+    return UsageCounters(stripes=4, flush_seconds=3600, base_ttl=3600)
+
+
+def _stored(email=EMAIL, date=None):
+    conn = _sqlite_schema.get_conn()
+    row = conn.execute(
+        "SELECT checks_count FROM usage WHERE email = ? AND date = ?", (email, date or usage_counters._today())
+    ).fetchone()
+    conn.close()
+    return row["checks_count"] if row else 0
+
+
+def test_flush_moves_pending_into_base(counters):
+    assert counters.used_today(EMAIL) == 0  # reads and caches the base
+    counters.increment(EMAIL)
+    counters.increment(EMAIL.upper(), 2)
+    assert counters.used_today(EMAIL) == 3
+
+    assert counters.flush() == 3
+    assert _stored() == 3
+    assert counters.used_today(EMAIL) == 3  # from the base, nothing pending
+    assert counters.flush() == 0
+
+    counters.base_ttl = 0
+    assert counters.used_today(EMAIL) == 3  # re-read from the DB
+
+
+def test_check_counted_during_a_flush_stays_pending(counters, monkeypatch):
+    counters.used_today(EMAIL)
+    counters.increment(EMAIL, 2)
+    add_usage = db.queries.add_usage
+
+    def add_usage_while_a_check_arrives(deltas):
+        counters.increment(EMAIL)
+        add_usage(deltas)
+
+    monkeypatch.setattr(db.queries, "add_usage", add_usage_while_a_check_arrives)
+    assert counters.flush() == 2
+    assert _stored() == 2
+    assert counters.used_today(EMAIL) == 3
+
+    monkeypatch.setattr(db.queries, "add_usage", add_usage)
+    assert counters.flush() == 1
+    assert _stored() == counters.used_today(EMAIL) == 3
+
+
+def test_failed_flush_keeps_deltas_for_the_retry(counters, monkeypatch):
+    counters.used_today(EMAIL)
+    counters.increment(EMAIL, 2)
+    add_usage = db.queries.add_usage
+
+    def db_down(deltas):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(db.queries, "add_usage", db_down)
+    with pytest.raises(RuntimeError):
+        counters.flush()
+    assert counters.used_today(EMAIL) == 2
+    assert _stored() == 0
+
+    monkeypatch.setattr(db.queries, "add_usage", add_usage)
+    assert counters.flush() == 2
+    assert _stored() == counters.used_today(EMAIL) == 2
+
+
+def test_release_gives_a_check_back(counters):
+    counters.increment(EMAIL)
+    counters.flush()
+    counters.increment(EMAIL)
+    counters.increment(EMAIL, -1)  # reserved, then released before the flush
+    assert counters.used_today(EMAIL) == 1
+
+    counters.increment(EMAIL, -1)  # released after its reservation was flushed
+    assert counters.used_today(EMAIL) == 0
+    counters.flush()
+    assert _stored() == counters.used_today(EMAIL) == 0
+
+
+def test_flush_drops_bases_of_past_days(counters, monkeypatch):
+    today = usage_counters._today()
+    monkeypatch.setattr(usage_counters, "_today", lambda: "2000-01-01")
+    counters.used_today(EMAIL)
+    counters.increment(EMAIL, 1)  # a check from yesterday, flushed after midnight
+    monkeypatch.setattr(usage_counters, "_today", lambda: today)
+    counters.increment(EMAIL, 1)
+
+    assert counters.flush() == 2
+    assert _stored(date="2000-01-01") == 1
+    assert _stored() == 1
+    assert all(date == today for stripe in counters._stripes for _, date in stripe.base)
+    assert counters.used_today(EMAIL) == 1